@@ -1,3 +1,5 @@
+import logging
+import os
 from flask import Flask
 from flask_cors import CORS
 from extensions import db, bcrypt, jwt, mail
@@ -71,6 +73,18 @@ def create_app():
     app.register_blueprint(telegram_bp)
     app.register_blueprint(web_bp)
 
+    # Con un servidor que carga la app antes del fork de los workers
+    # (gunicorn --preload, uWSGI sin lazy-apps), PRECARGAR_MODELOS=1 deja
+    # los modelos v2 en memoria ya aquí y los workers los comparten por
+    # copy-on-write en vez de cargarlos cada uno en su primera petición
+    if os.getenv('PRECARGAR_MODELOS') == '1':
+        try:
+            from services.ml_v2.servidor import precargar
+            precargar()
+        except Exception as e:
+            # Sin modelos la app arranca igual: se cargan bajo demanda
+            logging.getLogger(__name__).warning(f"No se pudieron precargar los modelos v2: {e}")
+
     return app
 
 if __name__ == '__main__':
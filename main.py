@@ -141,8 +141,9 @@ def realizar_predicciones():
 
 
     partidos_10_dias = obtener_partidos_a_predecir_10(partidos_predecir)
-    predecir_lista_partidos(partidos_10_dias, optimos)
-    logger.info('Predicciones hechas')
+    recalculados = predecir_lista_partidos(partidos_10_dias, optimos)
+    logger.info(f'Predicciones hechas ({recalculados} de {len(partidos_10_dias)} '
+                f'recalculadas, el resto sin cambios)')
 
     partidos_predecidos = cargar_partidos_predecidos(date.today())
     logger.info('Partidos predecidos cargados')
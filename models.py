@@ -166,7 +166,11 @@ class Partido(db.Model):
     cuotas = db.Column(db.JSON) # { "1": 1.5, "X": 3.0... }
     prediccion = db.Column(db.JSON) # Snapshot de la predicción
     info_extra = db.Column(db.JSON) # { "estadio": "Bernabeu", "arbitro": "..." }
-    
+
+    # Última modificación (la usa el libro de ROI para recalcular solo lo que cambió)
+    updated_at = db.Column(db.DateTime, index=True, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+
     # Relaciones
     equipo_local = db.relationship('Equipo', foreign_keys=[id_local, id_liga], lazy='joined',
                                   primaryjoin="and_(Partido.id_local==Equipo.id, Partido.id_liga==Equipo.id_liga)",
@@ -329,3 +333,19 @@ class Reporte(db.Model):
 
     def to_dict(self):
         return self.contenido
+
+class LibroRoi(db.Model):
+    """
+    Agregados diarios de las recomendaciones ya resueltas, por mercado y
+    estrategia. Lo mantiene comprobar_precision.actualizar_libro_roi y
+    analizar_resultados solo suma sus filas.
+    """
+    __tablename__ = "libro_roi"
+    fecha = db.Column(db.Date, primary_key=True)
+    mercado = db.Column(db.String(20), primary_key=True)     # 'resultado', 'btts', 'over25'
+    estrategia = db.Column(db.String(20), primary_key=True)  # 'moderada', 'conservadora', 'agresiva'
+    partidos = db.Column(db.Integer, nullable=False, default=0)  # Partidos FT del día
+    apuestas = db.Column(db.Integer, nullable=False, default=0)
+    aciertos = db.Column(db.Integer, nullable=False, default=0)
+    beneficio = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
@@ -4,6 +4,7 @@ from flask import Blueprint, jsonify, request
 from utils.errors import ErrorCode, api_error
 from flask_jwt_extended import jwt_required
 from datetime import datetime
+from extensions import db
 from models import Partido, Liga
 from config import BASE_DIR
 from services.analysis.comprobar_precision import cargar_resumen, cargar_resumen_tipo_apuesta
@@ -141,3 +142,33 @@ def get_historial_cuotas_calientes():
         print(f"Error historial cuotas: {e}")
         return api_error(ErrorCode.DATA_FETCH_ERROR, "Error al obtener historial.", 500)
     return jsonify({"historial": historial}), 200
+
+# --- ENDPOINT DE PREDICCIÓN BAJO DEMANDA ---
+
+@api_v1_bp.route("/predecir/<int:id_partido>", methods=["GET"])
+@jwt_required()
+def get_prediccion(id_partido):
+    """
+    Predice un partido con las cuotas actuales de la BD, usando los
+    modelos v2 cargados en memoria (ver services/ml_v2/servidor.py).
+    """
+    from services.ml_v2.servidor import obtener_servidor, cuotas_desde_sql
+
+    partido = db.session.get(Partido, id_partido)
+    if partido is None:
+        return api_error(ErrorCode.DATA_NOT_FOUND, "Partido no encontrado", 404)
+
+    servidor = obtener_servidor()
+    try:
+        prediccion = servidor.predecir(id_partido, cuotas_desde_sql(partido.cuotas))
+    except KeyError:
+        return api_error(ErrorCode.DATA_NOT_FOUND, "Partido no disponible para predecir", 404)
+    except Exception as e:
+        print(f"Error en predecir: {e}")
+        return api_error(ErrorCode.SERVER_INTERNAL_ERROR, "Error al generar la predicción", 500)
+
+    return jsonify({
+        "id_partido": id_partido,
+        "prediccion": prediccion,
+        "version_modelos": servidor.version
+    }), 200
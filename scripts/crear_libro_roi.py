@@ -0,0 +1,32 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from datetime import datetime, timezone
+from sqlalchemy import inspect, text
+from app import create_app
+from extensions import db
+from models import LibroRoi, Partido
+from services.analysis.comprobar_precision import actualizar_libro_roi
+
+app = create_app()
+
+# Preparar el libro de ROI (una sola vez, al desplegar): columna
+# partidos.updated_at, tabla libro_roi y primera pasada completa desde
+# PRIMER_DIA; después lo mantiene comprobar_partidos() cada noche
+def crear_libro_roi():
+    with app.app_context():
+        columnas = {c['name'] for c in inspect(db.engine).get_columns(Partido.__tablename__)}
+        if 'updated_at' not in columnas:
+            with db.engine.begin() as con:
+                con.execute(text("ALTER TABLE partidos ADD COLUMN updated_at DATETIME NULL"))
+                con.execute(text("CREATE INDEX ix_partidos_updated_at ON partidos (updated_at)"))
+                con.execute(text("UPDATE partidos SET updated_at = :ahora"),
+                            {'ahora': datetime.now(timezone.utc).replace(tzinfo=None)})
+            print("Columna partidos.updated_at creada")
+
+        LibroRoi.__table__.create(db.engine, checkfirst=True)
+        n = actualizar_libro_roi(reconstruir=True)
+        print(f"libro_roi listo: {n} partidos procesados")
+
+if __name__ == "__main__":
+    crear_libro_roi()
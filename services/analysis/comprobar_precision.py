@@ -1,8 +1,10 @@
 from datetime import datetime
+import logging
 import os
 from flask import current_app
+from sqlalchemy import inspect
 from extensions import db
-from models import Partido, Reporte
+from models import LibroRoi, Partido, Reporte
 from config import BASE_DIR
 
 
@@ -10,6 +12,8 @@ from config import BASE_DIR
 PRIMER_DIA = "2026-02-13"  # Primer día con todos los datos limpios version V2 - actual
 APUESTA_POR_PARTIDO = 1.0  # 1 Euro
 
+logger = logging.getLogger(__name__)
+
 
 ################################################################
 # Funciones varias
@@ -67,278 +71,236 @@ def cuotas_validas(cuotas):
             return False
     return True
 
+################################################################
+# Libro de ROI
+#
+# En vez de recorrer cada noche todos los partidos FT desde PRIMER_DIA,
+# se guardan en la tabla libro_roi (models.LibroRoi) las apuestas,
+# aciertos y beneficio de cada (día, mercado, estrategia). Cada pasada
+# solo recalcula los días con algún partido modificado (Partido.updated_at)
+# desde la anterior, sea cual sea su antigüedad: partidos que pasan a FT
+# tarde, resultados corregidos o predicciones reescritas. La marca de la
+# última pasada se guarda en reportes, en la misma transacción.
+
+CLAVE_MARCA_LIBRO = 'libro_roi_marca'
+
+# (estrategia en el libro, clave en `recomendacion`)
+ESTRATEGIAS_LIBRO = (('moderada', 'moderada'),
+                     ('conservadora', 'conservadora'),
+                     ('agresiva', 'arriesgada'))
+
+# mercado: (clave en `prediccion`, {predicción: (valor real, clave de la cuota)},
+#           clave de la cuota si la predicción no es ninguna de ellas)
+MERCADOS_LIBRO = {
+    'resultado': ('resultado_1x2', {'Local': (1, '1'), 'Empate': (0, 'X'), 'Visitante': (2, '2')}, '2'),
+    'btts': ('btts', {'Sí': (1, 'BTTS'), 'No': (0, 'BTTS_NO')}, 'BTTS_NO'),
+    'over25': ('over25', {'Over': (1, 'O25'), 'Under': (0, 'U25')}, 'U25'),
+}
+
+
+def _valor_real(columna, info_extra, clave):
+    """Como Partido.to_dict: columna explícita, si no info_extra, si no -1."""
+    if columna is not None:
+        return columna
+    return (info_extra or {}).get(clave, -1)
+
+
+def apuestas_partido(resultado, ambos_marcan, mas_2_5, cuotas, prediccion, info_extra=None):
+    """
+    Apuestas recomendadas de un partido terminado.
+
+    Returns:
+        Lista de (mercado, estrategia, acierto, beneficio) con
+        APUESTA_POR_PARTIDO por apuesta
+    """
+    cuotas = cuotas or {}
+    prediccion = prediccion if isinstance(prediccion, dict) else {}
+    reales = {
+        'resultado': resultado if resultado is not None else -1,
+        'btts': _valor_real(ambos_marcan, info_extra, 'ambos_marcan'),
+        'over25': _valor_real(mas_2_5, info_extra, 'mas_2_5'),
+    }
+
+    apuestas = []
+    for mercado, (clave, opciones, cuota_defecto) in MERCADOS_LIBRO.items():
+        # Comprobar si tiene cuotas válidas (None en el JSON = sin cuota)
+        if not cuotas_validas([-1 if cuotas.get(c) is None else cuotas[c]
+                               for _, c in opciones.values()]):
+            continue
+
+        pred = prediccion.get(clave) or {}
+        recomendacion = pred.get('recomendacion') or {}
+        valor, clave_cuota = opciones.get(pred.get('prediccion'), (-1, cuota_defecto))
+        acierto = valor == reales[mercado]
+        for estrategia, clave_rec in ESTRATEGIAS_LIBRO:
+            if recomendacion.get(clave_rec) != 1:
+                continue
+            beneficio = (float(cuotas[clave_cuota]) - 1) * APUESTA_POR_PARTIDO if acierto \
+                else -APUESTA_POR_PARTIDO
+            apuestas.append((mercado, estrategia, acierto, beneficio))
+    return apuestas
+
+
+def _filas_libro(partidos):
+    """
+    Agrega (fecha, resultado, ambos_marcan, mas_2_5, cuotas, prediccion,
+    info_extra) de partidos FT en {(fecha, mercado, estrategia): [apuestas,
+    aciertos, beneficio]} y {fecha: partidos}. Cada día con partidos tiene
+    sus nueve filas, aunque no haya apuestas.
+    """
+    libro, partidos_dia = {}, {}
+    for fecha, *datos in partidos:
+        if fecha not in partidos_dia:
+            partidos_dia[fecha] = 0
+            for mercado in MERCADOS_LIBRO:
+                for estrategia, _ in ESTRATEGIAS_LIBRO:
+                    libro[(fecha, mercado, estrategia)] = [0, 0, 0.0]
+        partidos_dia[fecha] += 1
+        for mercado, estrategia, acierto, beneficio in apuestas_partido(*datos):
+            fila = libro[(fecha, mercado, estrategia)]
+            fila[0] += 1
+            fila[1] += int(acierto)
+            fila[2] += beneficio
+    return libro, partidos_dia
+
+
+def libro_disponible():
+    """La tabla libro_roi y la columna partidos.updated_at existen (scripts/crear_libro_roi.py)."""
+    inspector = inspect(db.engine)
+    if not inspector.has_table(LibroRoi.__tablename__):
+        return False
+    return 'updated_at' in {c['name'] for c in inspector.get_columns(Partido.__tablename__)}
+
+
+def _partidos_libro(filtro):
+    """(fecha, resultado, ambos_marcan, mas_2_5, cuotas, prediccion, info_extra) de los FT."""
+    return db.session.query(
+        Partido.fecha, Partido.resultado, Partido.ambos_marcan, Partido.mas_2_5,
+        Partido.cuotas, Partido.prediccion, Partido.info_extra
+    ).filter(filtro, Partido.estado == 'FT').all()
+
+
+def actualizar_libro_roi(reconstruir=False):
+    """
+    Recalcula en libro_roi los días desde PRIMER_DIA con algún partido
+    modificado después de la marca de la pasada anterior (todos si no hay
+    marca o `reconstruir`). Solo lee las columnas necesarias de esos
+    partidos, sin to_dict(). La tabla y la columna partidos.updated_at se
+    crean una vez con scripts/crear_libro_roi.py.
+
+    Returns:
+        Nº de partidos procesados
+    """
+    if not current_app:
+        return 0
+
+    primer_dia = datetime.strptime(PRIMER_DIA, "%Y-%m-%d").date()
+    marca = None if reconstruir else (cargar_reporte_sql(CLAVE_MARCA_LIBRO) or {}).get('updated_at')
+    ultima = db.session.query(db.func.max(Partido.updated_at)).scalar()
+
+    if marca is None:
+        fechas = None
+        partidos = _partidos_libro(Partido.fecha >= primer_dia)
+    else:
+        # >= y no >: DATETIME en MySQL va en segundos y un partido puede
+        # cambiar en el mismo segundo que la marca; recalcular es idempotente
+        fechas = [f for (f,) in db.session.query(Partido.fecha).filter(
+            Partido.updated_at >= datetime.fromisoformat(marca),
+            Partido.fecha >= primer_dia
+        ).distinct()]
+        if not fechas:
+            return 0
+        partidos = _partidos_libro(Partido.fecha.in_(fechas))
+    libro, partidos_dia = _filas_libro(partidos)
+
+    try:
+        borrar = LibroRoi.query
+        if fechas is not None:
+            borrar = borrar.filter(LibroRoi.fecha.in_(fechas))
+        borrar.delete(synchronize_session=False)
+        db.session.add_all(
+            LibroRoi(fecha=fecha, mercado=mercado, estrategia=estrategia,
+                     partidos=partidos_dia[fecha], apuestas=apuestas,
+                     aciertos=aciertos, beneficio=beneficio)
+            for (fecha, mercado, estrategia), (apuestas, aciertos, beneficio) in libro.items()
+        )
+        if ultima is not None:
+            reporte = Reporte.query.get(CLAVE_MARCA_LIBRO) or Reporte(clave=CLAVE_MARCA_LIBRO)
+            reporte.contenido = {'updated_at': ultima.isoformat()}
+            db.session.add(reporte)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(partidos)
+
+
+def _agregados_libro(libro, partidos_dia):
+    """
+    Suma de las filas de _filas_libro por (mercado, estrategia), como la
+    consulta agrupada sobre libro_roi: (mercado, estrategia, partidos,
+    apuestas, aciertos, beneficio).
+    """
+    totales = {}
+    for (fecha, mercado, estrategia), (apuestas, aciertos, beneficio) in libro.items():
+        fila = totales.setdefault((mercado, estrategia), [0, 0, 0, 0.0])
+        fila[0] += partidos_dia[fecha]
+        fila[1] += apuestas
+        fila[2] += aciertos
+        fila[3] += beneficio
+    return [(mercado, estrategia, *fila) for (mercado, estrategia), fila in totales.items()]
+
+
+def _resultados_libro(agregados):
+    """Dict de comprobar_partidos a partir de las filas agregadas del libro."""
+    resultados = {
+        "partidos_jugados": 0,
+        "beneficio": {mercado: {e: 0.0 for e, _ in ESTRATEGIAS_LIBRO} for mercado in MERCADOS_LIBRO},
+    }
+    for mercado in MERCADOS_LIBRO:
+        resultados[mercado] = {}
+        for estrategia, _ in ESTRATEGIAS_LIBRO:
+            resultados[mercado][estrategia] = 0
+        for estrategia, _ in ESTRATEGIAS_LIBRO:
+            resultados[mercado][f"aciertos_{estrategia}"] = 0
+
+    for mercado, estrategia, partidos, apuestas, aciertos, beneficio in agregados:
+        if mercado not in MERCADOS_LIBRO:
+            continue
+        # Todas las filas de un día llevan los mismos partidos: se cuentan una vez
+        if (mercado, estrategia) == ('resultado', 'moderada'):
+            resultados["partidos_jugados"] = int(partidos or 0)
+        resultados["beneficio"][mercado][estrategia] = round(float(beneficio or 0.0), 3)
+        resultados[mercado][estrategia] = int(apuestas or 0)
+        resultados[mercado][f"aciertos_{estrategia}"] = int(aciertos or 0)
+
+    return resultados
+
+
 # Comprobar partidos simplificado
 def comprobar_partidos():
     if not current_app:
         return {} # No podemos analizar sin contexto de app
-        
+
     primer_dia_obj = datetime.strptime(PRIMER_DIA, "%Y-%m-%d").date()
-    
-    # Cargar historial de SQL filtrando por fecha y estado terminado
-    historial = Partido.query.filter(
-        Partido.fecha >= primer_dia_obj,
-        Partido.estado == 'FT'
-    ).all()
-
-    partidos_totales = 0
-    partidos_apuesta_moderada_resultado = 0
-    partidos_apuesta_moderada_btts = 0
-    partidos_apuesta_moderada_over25 = 0
-    partidos_apuesta_conservadora_resultado = 0
-    partidos_apuesta_conservadora_btts = 0
-    partidos_apuesta_conservadora_over25 = 0
-    partidos_apuesta_agresiva_resultado = 0
-    partidos_apuesta_agresiva_btts = 0
-    partidos_apuesta_agresiva_over25 = 0
-    aciertos_moderada_resultado = 0
-    aciertos_moderada_btts = 0
-    aciertos_moderada_over25 = 0
-    aciertos_conservadora_resultado = 0
-    aciertos_conservadora_btts = 0
-    aciertos_conservadora_over25 = 0
-    aciertos_agresiva_resultado = 0
-    aciertos_agresiva_btts = 0
-    aciertos_agresiva_over25 = 0
-
-    beneficio_moderada_resultado = 0.0
-    beneficio_conservadora_resultado = 0.0
-    beneficio_agresiva_resultado = 0.0
-
-    beneficio_moderada_btts = 0.0
-    beneficio_conservadora_btts = 0.0
-    beneficio_agresiva_btts = 0.0
-
-    beneficio_moderada_over25 = 0.0
-    beneficio_conservadora_over25 = 0.0
-    beneficio_agresiva_over25 = 0.0
-
-    for partido in historial:
-        p = partido.to_dict()
-
-        # Aumentar partidos totales
-        partidos_totales += 1
-
-        # Obtener los datos del partido ya jugado
-        resultado = p['resultado']
-        btts = p['ambos_marcan']
-        over25 = p['mas_2_5']
-
-        # Obtener los datos del partido predecido
-        prediccion = p['prediccion']
-
-        #########################################################
-        # RESULTADO #
-        #########################################################
-        # Comprobar si tiene cuotas válidas
-        cuotas = [p['cuota_local'],
-                  p['cuota_empate'],
-                  p['cuota_visitante']]
-
-        if cuotas_validas(cuotas):
-            rec_mod_res = prediccion.get('resultado_1x2')\
-                .get('recomendacion').get('moderada')
-            if rec_mod_res == 1:
-                partidos_apuesta_moderada_resultado += 1
-            rec_con_res = prediccion.get('resultado_1x2')\
-                .get('recomendacion').get('conservadora')
-            if rec_con_res == 1:
-                partidos_apuesta_conservadora_resultado += 1
-            rec_agr_res = prediccion.get('resultado_1x2')\
-                .get('recomendacion').get('arriesgada')
-            if rec_agr_res == 1:
-                partidos_apuesta_agresiva_resultado += 1
-            pred_resultado = prediccion.get('resultado_1x2')\
-                .get('prediccion')
-            p_resultado = -1
-            if pred_resultado == 'Local':
-                p_resultado = 1
-            elif pred_resultado == 'Empate':
-                p_resultado = 0
-            elif pred_resultado == 'Visitante':
-                p_resultado = 2
-
-            # Hacer las comprobaciones
-            cuota = p['cuota_local'] if p_resultado == 1 \
-                else p['cuota_empate'] if p_resultado == 0 \
-                else p['cuota_visitante']
-
-            if p_resultado == resultado:
-                # GANASTE
-                if rec_mod_res == 1:
-                    aciertos_moderada_resultado += 1
-                    beneficio_moderada_resultado += \
-                        (float(cuota) - 1) * APUESTA_POR_PARTIDO
-                if rec_con_res == 1:
-                    aciertos_conservadora_resultado += 1
-                    beneficio_conservadora_resultado += \
-                        (float(cuota) - 1) * APUESTA_POR_PARTIDO
-                if rec_agr_res == 1:
-                    aciertos_agresiva_resultado += 1
-                    beneficio_agresiva_resultado += \
-                        (float(cuota) - 1) * APUESTA_POR_PARTIDO
-            else:
-                # PERDISTE
-                if rec_mod_res == 1:
-                    beneficio_moderada_resultado -= \
-                        APUESTA_POR_PARTIDO
-                if rec_con_res == 1:
-                    beneficio_conservadora_resultado -= \
-                        APUESTA_POR_PARTIDO
-                if rec_agr_res == 1:
-                    beneficio_agresiva_resultado -= \
-                        APUESTA_POR_PARTIDO
-
-        #########################################################
-        # AMBOS MARCAN #
-        #########################################################
-        # Comprobar si tiene cuotas válidas
-        cuotas = [p['cuota_btts'], p['cuota_btts_no']]
-
-        if cuotas_validas(cuotas):
-            rec_mod_btts = prediccion.get('btts').get('recomendacion')\
-                .get('moderada')
-            if rec_mod_btts == 1:
-                partidos_apuesta_moderada_btts += 1
-            rec_con_btts = prediccion.get('btts').get('recomendacion')\
-                .get('conservadora')
-            if rec_con_btts == 1:
-                partidos_apuesta_conservadora_btts += 1
-            rec_agr_btts = prediccion.get('btts').get('recomendacion')\
-                .get('arriesgada')
-            if rec_agr_btts == 1:
-                partidos_apuesta_agresiva_btts += 1
-            pred_btts = prediccion.get('btts').get('prediccion')
-            p_btts = -1
-            if pred_btts == 'Sí':
-                p_btts = 1
-            elif pred_btts == 'No':
-                p_btts = 0
-
-            # Hacer las comprobaciones
-            cuota = p['cuota_btts'] if p_btts == 1 \
-                else p['cuota_btts_no']
-            if p_btts == btts:
-                if rec_mod_btts == 1:
-                    aciertos_moderada_btts += 1
-                    beneficio_moderada_btts += \
-                        (float(cuota) - 1) * APUESTA_POR_PARTIDO
-                if rec_con_btts == 1:
-                    aciertos_conservadora_btts += 1
-                    beneficio_conservadora_btts += \
-                        (float(cuota) - 1) * APUESTA_POR_PARTIDO
-                if rec_agr_btts == 1:
-                    aciertos_agresiva_btts += 1
-                    beneficio_agresiva_btts += \
-                        (float(cuota) - 1) * APUESTA_POR_PARTIDO
-            else:
-                if rec_mod_btts == 1:
-                    beneficio_moderada_btts -= \
-                        APUESTA_POR_PARTIDO
-                if rec_con_btts == 1:
-                    beneficio_conservadora_btts -= \
-                        APUESTA_POR_PARTIDO
-                if rec_agr_btts == 1:
-                    beneficio_agresiva_btts -= \
-                        APUESTA_POR_PARTIDO
-
-        #########################################################
-        # OVER 2.5 #
-        #########################################################
-        # Comprobar si tiene cuotas válidas
-        cuotas = [p['cuota_over'], p['cuota_under']]
-
-        if cuotas_validas(cuotas):
-            rec_mod_2_5 = prediccion.get('over25')\
-                .get('recomendacion').get('moderada')
-            if rec_mod_2_5 == 1:
-                partidos_apuesta_moderada_over25 += 1
-            rec_con_2_5 = prediccion.get('over25')\
-                .get('recomendacion').get('conservadora')
-            if rec_con_2_5 == 1:
-                partidos_apuesta_conservadora_over25 += 1
-            rec_agr_2_5 = prediccion.get('over25')\
-                .get('recomendacion').get('arriesgada')
-            if rec_agr_2_5 == 1:
-                partidos_apuesta_agresiva_over25 += 1
-            pred_over_2_5 = prediccion.get('over25').get('prediccion')
-            p_over_2_5 = -1
-            if pred_over_2_5 == 'Over':
-                p_over_2_5 = 1
-            elif pred_over_2_5 == 'Under':
-                p_over_2_5 = 0
-
-            # Hacer las comprobaciones
-            cuota = p['cuota_over'] if p_over_2_5 == 1 \
-                else p['cuota_under']
-            if p_over_2_5 == over25:
-                if rec_mod_2_5 == 1:
-                    aciertos_moderada_over25 += 1
-                    beneficio_moderada_over25 += \
-                        (float(cuota) - 1) * APUESTA_POR_PARTIDO
-                if rec_con_2_5 == 1:
-                    aciertos_conservadora_over25 += 1
-                    beneficio_conservadora_over25 += \
-                        (float(cuota) - 1) * APUESTA_POR_PARTIDO
-                if rec_agr_2_5 == 1:
-                    aciertos_agresiva_over25 += 1
-                    beneficio_agresiva_over25 += \
-                        (float(cuota) - 1) * APUESTA_POR_PARTIDO
-            else:
-                if rec_mod_2_5 == 1:
-                    beneficio_moderada_over25 -= \
-                        APUESTA_POR_PARTIDO
-                if rec_con_2_5 == 1:
-                    beneficio_conservadora_over25 -= \
-                        APUESTA_POR_PARTIDO
-                if rec_agr_2_5 == 1:
-                    beneficio_agresiva_over25 -= \
-                        APUESTA_POR_PARTIDO
-
-    # Devolver los resultados
-    return {
-        "partidos_jugados": partidos_totales,
-        "beneficio": {
-            "resultado": {
-                "moderada": round(beneficio_moderada_resultado, 3),
-                "conservadora": round(beneficio_conservadora_resultado, 3),
-                "agresiva": round(beneficio_agresiva_resultado, 3),
-            },
-            "btts": {
-                "moderada": round(beneficio_moderada_btts, 3),
-                "conservadora": round(beneficio_conservadora_btts, 3),
-                "agresiva": round(beneficio_agresiva_btts, 3),
-            },
-            "over25": {
-                "moderada": round(beneficio_moderada_over25, 3),
-                "conservadora": round(beneficio_conservadora_over25, 3),
-                "agresiva": round(beneficio_agresiva_over25, 3),
-            }
-        },
-        "resultado": {
-            "moderada": partidos_apuesta_moderada_resultado,
-            "conservadora": partidos_apuesta_conservadora_resultado,
-            "agresiva": partidos_apuesta_agresiva_resultado,
-            "aciertos_moderada": aciertos_moderada_resultado,
-            "aciertos_conservadora": aciertos_conservadora_resultado,
-            "aciertos_agresiva": aciertos_agresiva_resultado
-        },
-        "btts": {
-            "moderada": partidos_apuesta_moderada_btts,
-            "conservadora": partidos_apuesta_conservadora_btts,
-            "agresiva": partidos_apuesta_agresiva_btts,
-            "aciertos_moderada": aciertos_moderada_btts,
-            "aciertos_conservadora": aciertos_conservadora_btts,
-            "aciertos_agresiva": aciertos_agresiva_btts
-        },
-        "over25": {
-            "moderada": partidos_apuesta_moderada_over25,
-            "conservadora": partidos_apuesta_conservadora_over25,
-            "agresiva": partidos_apuesta_agresiva_over25,
-            "aciertos_moderada": aciertos_moderada_over25,
-            "aciertos_conservadora": aciertos_conservadora_over25,
-            "aciertos_agresiva": aciertos_agresiva_over25
-        }
-    }
+
+    if not libro_disponible():
+        # Sin libro: se agrega en memoria todo el historial, como antes
+        logger.error("libro_roi no está creado: se recorren todos los partidos FT. "
+                     "Ejecutar una vez scripts/crear_libro_roi.py")
+        libro, partidos_dia = _filas_libro(_partidos_libro(Partido.fecha >= primer_dia_obj))
+        return _resultados_libro(_agregados_libro(libro, partidos_dia))
+
+    actualizar_libro_roi()
+
+    agregados = db.session.query(
+        LibroRoi.mercado, LibroRoi.estrategia,
+        db.func.sum(LibroRoi.partidos), db.func.sum(LibroRoi.apuestas),
+        db.func.sum(LibroRoi.aciertos), db.func.sum(LibroRoi.beneficio)
+    ).filter(
+        LibroRoi.fecha >= primer_dia_obj
+    ).group_by(LibroRoi.mercado, LibroRoi.estrategia).all()
+    return _resultados_libro(agregados)
 
 
 # Analizar resultados y ponerlo bonito
@@ -1,5 +1,5 @@
 from services.data_fetching.obtener_historial import cargar_historial
-import numpy as np
+from services.ml_v2 import motor_umbrales
 
 
 def normalizar_cuota(cuota):
@@ -74,82 +74,57 @@ def extraer_apuestas():
     return apuestas
 
 
+# Ventanas de búsqueda: ((prob. desde, hasta), (margen desde, hasta), divisor del mínimo de apuestas)
+ESTRATEGIAS = {
+    "agresivo": ((0.50, 0.62), (0.00, 0.08), 1),       # más volumen, ROI positivo aunque bajo
+    "moderado": ((0.53, 0.68), (0.01, 0.12), 1),       # equilibrio
+    "conservador": ((0.60, 0.80), (0.06, 0.20), 2),    # alta calidad, ROI alto aunque pocas apuestas
+}
+
+DEFAULTS = {
+    "resultado": {"umbral_prob": 0.54, "margen": 0.03},
+    "btts":      {"umbral_prob": 0.56, "margen": 0.03},
+    "over":      {"umbral_prob": 0.62, "margen": 0.03},
+}
+
+
+def get_default(mercado):
+    return {
+        "roi": 0.0,
+        "umbral_prob": DEFAULTS[mercado]["umbral_prob"],
+        "margen": DEFAULTS[mercado]["margen"],
+        "apuestas": 0
+    }
+
+
 def optimizar_umbrales(apuestas, min_apuestas_base=30):
+    """
+    Óptimo exacto de cada estrategia: se prueban todos los puntos de corte
+    (prob. y value observados dentro de la ventana, redondeados a
+    motor_umbrales.DECIMALES), no una rejilla fija.
+    """
     resultados = {
         "agresivo": {},
         "moderado": {},
         "conservador": {}
     }
 
+    estrategias = {e: (u, m, min_apuestas_base // d) for e, (u, m, d) in ESTRATEGIAS.items()}
+
     for mercado in apuestas:
         datos = apuestas[mercado]
-
-        # === AGRESIVO: más volumen, ROI positivo aunque bajo ===
-        mejor_agresivo = {"roi": -999, "umbral_prob": None, "margen": None, "apuestas": 0}
-        for umbral_prob in np.arange(0.50, 0.62, 0.01):      # umbrales más bajos
-            for margen in np.arange(0.00, 0.08, 0.01):       # margen muy permisivo
-                ganancias, n = simular_apuestas(datos, umbral_prob, margen)
-                if n >= min_apuestas_base:
-                    roi = sum(ganancias) / n if n > 0 else -999
-                    if roi > mejor_agresivo["roi"]:
-                        mejor_agresivo = {"roi": round(roi, 4), "umbral_prob": round(umbral_prob, 2),
-                                          "margen": round(margen, 2), "apuestas": n}
-
-        # === MODERADO: equilibrio (tu optimización actual, pero más amplio) ===
-        mejor_moderado = {"roi": -999, "umbral_prob": None, "margen": None, "apuestas": 0}
-        for umbral_prob in np.arange(0.53, 0.68, 0.01):
-            for margen in np.arange(0.01, 0.12, 0.01):
-                ganancias, n = simular_apuestas(datos, umbral_prob, margen)
-                if n >= min_apuestas_base:
-                    roi = sum(ganancias) / n if n > 0 else -999
-                    if roi > mejor_moderado["roi"]:
-                        mejor_moderado = {"roi": round(roi, 4), "umbral_prob": round(umbral_prob, 2),
-                                          "margen": round(margen, 2), "apuestas": n}
-
-        # === CONSERVADOR: alta calidad, ROI alto aunque pocas apuestas ===
-        mejor_conservador = {"roi": -999, "umbral_prob": None, "margen": None, "apuestas": 0}
-        for umbral_prob in np.arange(0.60, 0.80, 0.01):     # umbrales altos
-            for margen in np.arange(0.06, 0.20, 0.02):      # margen exigente
-                ganancias, n = simular_apuestas(datos, umbral_prob, margen)
-                if n >= min_apuestas_base // 2:
-                    roi = sum(ganancias) / n if n > 0 else -999
-                    if roi > mejor_conservador["roi"]:
-                        mejor_conservador = {"roi": round(roi, 4), "umbral_prob": round(umbral_prob, 2),
-                                             "margen": round(margen, 2), "apuestas": n}
-
-        DEFAULTS = {
-            "resultado": {"umbral_prob": 0.54, "margen": 0.03},
-            "btts":      {"umbral_prob": 0.56, "margen": 0.03},
-            "over":      {"umbral_prob": 0.62, "margen": 0.03},
-        }
-
-        # Luego dentro del bucle:
-        def get_default(mercado):
-            return {
-                "roi": 0.0,
-                "umbral_prob": DEFAULTS[mercado]["umbral_prob"],
-                "margen": DEFAULTS[mercado]["margen"],
-                "apuestas": 0
-            }
-
-        resultados["agresivo"][mercado] = mejor_agresivo if mejor_agresivo["apuestas"] > 0 else get_default(mercado)
-
-        resultados["moderado"][mercado] = mejor_moderado if mejor_moderado["apuestas"] > 0 else get_default(mercado)
-
-        resultados["conservador"][mercado] = mejor_conservador if mejor_conservador["apuestas"] > 0 else get_default(mercado)
-
+        optimos = motor_umbrales.optimizar_estrategias(*motor_umbrales.arrays(datos), estrategias) if datos else {}
+
+        for estrategia in resultados:
+            mejor = optimos.get(estrategia)
+            if mejor and mejor["apuestas"] > 0:
+                resultados[estrategia][mercado] = {
+                    "roi": round(mejor["roi"] / 100, 4),
+                    "umbral_prob": mejor["umbral_prob"],
+                    "margen": mejor["margen"],
+                    "apuestas": mejor["apuestas"]
+                }
+            else:
+                resultados[estrategia][mercado] = get_default(mercado)
 
     return resultados
-
-
-# Función auxiliar para no repetir código
-def simular_apuestas(datos, umbral_prob, margen):
-    ganancias = []
-    for a in datos:
-        prob = a["prob"]
-        cuota = a["cuota"]
-        acierto = a["acierto"]
-        value = prob - (1 / cuota)
-        if prob >= umbral_prob and value >= margen:
-            ganancias.append(cuota - 1 if acierto else -1)
-    return ganancias, len(ganancias)
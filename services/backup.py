@@ -9,6 +9,7 @@ from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
 from config import DB_USER, DB_PASS, DB_HOST, DB_NAME, BASE_DIR
+from services.ml_v2 import registro
 
 logger = logging.getLogger(__name__)
 
@@ -62,8 +63,29 @@ def subir_a_google_drive(file_path, folder_id, service):
         logger.error(f"Error al subir {file_path} a Drive: {e}")
         return False
 
+def _ignorar_registro(directorio, nombres):
+    """
+    De modelos_v2 se omiten el symlink `actual` (el ZIP no guarda
+    symlinks) y, del registro, todas las versiones salvo la activa.
+    """
+    if os.path.abspath(directorio) == os.path.abspath(registro.MODELOS_DIR):
+        return {n for n in nombres if n.startswith(os.path.basename(registro.ACTUAL))}
+    if os.path.abspath(directorio) == os.path.abspath(registro.REGISTRO_DIR):
+        activa = registro.version_actual()
+        return {n for n in nombres
+                if n != activa and os.path.isdir(os.path.join(directorio, n))}
+    return set()
+
 def crear_backup_datos():
-    """Comprime las carpetas de datos en un ZIP."""
+    """
+    Comprime las carpetas de datos en un ZIP.
+
+    Del registro de modelos v2 solo entra la versión activa, sin el
+    symlink `actual`. Para restaurar: descomprimir en BASE_DIR y volver a
+    apuntar `actual` a esa versión (la única en modelos_v2/registro/):
+
+        python -m services.ml_v2.registro promote <versión>
+    """
     fecha_hoy = datetime.date.today().strftime("%Y-%m-%d")
     zip_filename = f"server_{fecha_hoy}.zip"
     
@@ -80,7 +102,8 @@ def crear_backup_datos():
         for folder in DIRS_TO_BACKUP:
             folder_path = os.path.join(BASE_DIR, folder)
             if os.path.exists(folder_path):
-                shutil.copytree(folder_path, os.path.join(temp_dir, folder))
+                shutil.copytree(folder_path, os.path.join(temp_dir, folder),
+                                symlinks=True, ignore=_ignorar_registro)
         
         # Comprimir
         zip_path = os.path.join(BASE_DIR, zip_filename.replace('.zip', ''))
@@ -4,8 +4,17 @@ from services.data_fetching.obtener_partidos import obtener_partidos_jugados
 from datetime import date, timedelta, datetime
 from config import BASE_DIR
 
-def cargar_partidos_predecidos_string(fecha):
-    import os
+def cargar_partidos_predecidos_string(fecha, fecha_partido=None):
+    """
+    Predicciones archivadas el día `fecha` (AAAA_MM_DD), opcionalmente
+    solo las de los partidos del día `fecha_partido` (date). Lee el
+    snapshot columnar; los días antiguos, el pickle de Partido completos.
+    """
+    from services.ml_v2 import archivo_predicciones
+    archivadas = archivo_predicciones.predicciones(fecha, fecha_partido)
+    if archivadas is not None:
+        return archivadas
+
     # Crear la ruta del archivo
     ruta = os.path.join(BASE_DIR, 'datos', 'archivo', f'{fecha}__partidos_predecidos.pkl')
     # Guardar los datos en el archivo
@@ -81,8 +90,9 @@ def get_precision_admin(fecha):
     # Formatearlo al nuevo formato
     nueva_fecha_str = fecha_obj.strftime("%d/%m/%Y")
 
-    # Obtener los partidos del dia (contiene desde ese día a 10 días en adelante)
-    partidos = cargar_partidos_predecidos_string(fecha)
+    # Obtener los partidos del dia (contiene desde ese día a 10 días en
+    # adelante; del archivo columnar se lee solo el día elegido)
+    partidos = cargar_partidos_predecidos_string(fecha, fecha_obj.date())
 
     # Obtener los partidos del día elegido solamente
     partidos_dia = [p for p in partidos if p.fecha == nueva_fecha_str]
@@ -0,0 +1,259 @@
+"""
+Archivo diario de predicciones v2 en formato columnar.
+
+Sustituye a datos/archivo/AAAA_MM_DD__partidos_predecidos.pkl (objetos
+Partido completos con sus Equipo) por un npz por día con solo lo que se
+predijo, particionado por año/mes y con un índice:
+
+    datos/archivo/predicciones/
+        indice.json                 {"AAAA_MM_DD": {ruta, n, version, ...}}
+        2026/03/2026_03_01.npz
+
+Columnas (una fila por partido):
+    ids, fechas (ordinal de la fecha del partido), goles (n, 2),
+    prob_res (n, 3: empate/local/visitante), prob_max, pred_res,
+    btts_si, prob_btts, over_si, prob_over,
+    rec (n, mercado, estrategia; orden de recomendaciones.MERCADOS/ESTRATEGIAS),
+    cuotas (n, 7; orden de recomendaciones.CUOTAS)
+
+A partir de las columnas se reconstruyen exactamente los dicts
+`prediccion`. Leer un día (o un solo día de partidos dentro de él) no
+deserializa ningún objeto.
+"""
+
+import copy
+import json
+import logging
+import os
+from datetime import date, datetime
+
+import numpy as np
+
+from config import BASE_DIR
+from services.ml_v2.features import _parse_fecha
+from services.ml_v2.recomendaciones import CUOTAS, ESTRATEGIAS, MERCADOS, _rec_dict
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_DIR = os.path.join(BASE_DIR, 'datos', 'archivo', 'predicciones')
+RUTA_INDICE = os.path.join(ARCHIVO_DIR, 'indice.json')
+
+NOMBRES_RES = ['Empate', 'Local', 'Visitante']
+CLAVES_MERCADO = {'resultado': 'resultado_1x2', 'btts': 'btts', 'over': 'over25'}
+
+
+def _clave(fecha):
+    """date o 'AAAA_MM_DD' → 'AAAA_MM_DD'."""
+    return fecha if isinstance(fecha, str) else fecha.strftime("%Y_%m_%d")
+
+
+def _ordinal(fecha_str):
+    """Fecha del partido ('dd/mm/AAAA' o 'AAAA-mm-dd') como ordinal; None si no se puede leer."""
+    fecha = _parse_fecha(fecha_str)
+    if fecha is None:
+        try:
+            fecha = date.fromisoformat(fecha_str)
+        except (TypeError, ValueError):
+            return None
+    return fecha.toordinal()
+
+
+def _ruta_relativa(clave):
+    return os.path.join(clave[:4], clave[5:7], f'{clave}.npz')
+
+
+# =====================================================================
+# ÍNDICE
+# =====================================================================
+
+def indice():
+    try:
+        with open(RUTA_INDICE, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _guardar_indice(datos):
+    tmp = RUTA_INDICE + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(datos, f, indent=1, sort_keys=True)
+    os.replace(tmp, RUTA_INDICE)
+
+
+def existe(fecha):
+    return _clave(fecha) in indice()
+
+
+# =====================================================================
+# ESCRITURA
+# =====================================================================
+
+def _columnas(partidos):
+    n = len(partidos)
+    col = {
+        'ids': np.array([int(p.id_partido) for p in partidos], dtype=np.int64),
+        'fechas': np.array([_ordinal(p.fecha) for p in partidos],
+                           dtype=np.int32),
+        'goles': np.zeros((n, 2)),
+        'prob_res': np.zeros((n, 3)),
+        'prob_max': np.zeros(n),
+        'pred_res': np.zeros(n, dtype=np.int8),
+        'btts_si': np.zeros(n, dtype=np.int8),
+        'prob_btts': np.zeros(n),
+        'over_si': np.zeros(n, dtype=np.int8),
+        'prob_over': np.zeros(n),
+        'rec': np.zeros((n, len(MERCADOS), len(ESTRATEGIAS)), dtype=np.int8),
+        'cuotas': np.array([[float(getattr(p, c)) for c in CUOTAS] for p in partidos],
+                           dtype=np.float64).reshape(n, len(CUOTAS)),
+    }
+    for i, p in enumerate(partidos):
+        pr = p.prediccion
+        res = pr['resultado_1x2']
+        col['goles'][i] = (pr['goles_esperados']['local'], pr['goles_esperados']['visitante'])
+        probs = res['probabilidades']
+        col['prob_res'][i] = (probs['empate'], probs['local'], probs['visitante'])
+        col['prob_max'][i] = res['probabilidad_max']
+        col['pred_res'][i] = NOMBRES_RES.index(res['prediccion'])
+        col['btts_si'][i] = pr['btts']['prediccion'] == 'Sí'
+        col['prob_btts'][i] = pr['btts']['probabilidad']
+        col['over_si'][i] = pr['over25']['prediccion'] == 'Over'
+        col['prob_over'][i] = pr['over25']['probabilidad']
+        for m, mercado in enumerate(MERCADOS):
+            rec = pr[CLAVES_MERCADO[mercado]]['recomendacion']
+            for e, (_, clave) in enumerate(ESTRATEGIAS):
+                col['rec'][i, m, e] = rec[clave]
+    return col
+
+
+def guardar(partidos, fecha=None, version=None):
+    """
+    Archiva las predicciones de `partidos` (con `prediccion` dict) como
+    snapshot del día `fecha` (por defecto hoy). Los partidos sin
+    predicción o con una fecha que no se puede leer no se archivan (los
+    segundos se avisan en el log).
+    """
+    clave = _clave(fecha or date.today())
+    partidos = [p for p in partidos if isinstance(getattr(p, 'prediccion', None), dict)]
+    sin_fecha = [p.id_partido for p in partidos if _ordinal(p.fecha) is None]
+    if sin_fecha:
+        logger.warning(f"Archivo {clave}: {len(sin_fecha)} partidos con fecha ilegible "
+                       f"no se archivan (ids: {sin_fecha[:20]})")
+        partidos = [p for p in partidos if _ordinal(p.fecha) is not None]
+    col = _columnas(partidos)
+
+    relativa = _ruta_relativa(clave)
+    ruta = os.path.join(ARCHIVO_DIR, relativa)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    tmp = ruta + '.tmp.npz'
+    np.savez_compressed(tmp, version=np.array(version or ''), **col)
+    os.replace(tmp, ruta)
+
+    datos = indice()
+    datos[clave] = {
+        'ruta': relativa,
+        'n': len(partidos),
+        'version': version,
+        'fechas_partido': sorted({date.fromordinal(int(o)).isoformat()
+                                  for o in col['fechas'].tolist()}),
+        'creado': datetime.now().isoformat(timespec='seconds'),
+    }
+    _guardar_indice(datos)
+
+
+# =====================================================================
+# LECTURA
+# =====================================================================
+
+def cargar(fecha, fecha_partido=None):
+    """
+    Columnas del snapshot de `fecha`, opcionalmente solo las filas de los
+    partidos jugados en `fecha_partido` (date). None si no hay snapshot.
+    """
+    entrada = indice().get(_clave(fecha))
+    if entrada is None:
+        return None
+    with np.load(os.path.join(ARCHIVO_DIR, entrada['ruta'])) as d:
+        col = {k: d[k] for k in d.files}
+    if fecha_partido is not None:
+        filas = col['fechas'] == fecha_partido.toordinal()
+        col = {k: (v if v.ndim == 0 else v[filas]) for k, v in col.items()}
+    return col
+
+
+def prediccion(col, i):
+    """Dict `prediccion` (formato v1) de la fila i."""
+    rec = col['rec'][i]
+    return {
+        'goles_esperados': {'local': float(col['goles'][i, 0]),
+                            'visitante': float(col['goles'][i, 1])},
+        'resultado_1x2': {
+            'prediccion': NOMBRES_RES[col['pred_res'][i]],
+            'probabilidades': {
+                'local': float(col['prob_res'][i, 1]),
+                'empate': float(col['prob_res'][i, 0]),
+                'visitante': float(col['prob_res'][i, 2])
+            },
+            'probabilidad_max': float(col['prob_max'][i]),
+            'recomendacion': _rec_dict(rec[0])
+        },
+        'btts': {
+            'prediccion': 'Sí' if col['btts_si'][i] else 'No',
+            'probabilidad': float(col['prob_btts'][i]),
+            'recomendacion': _rec_dict(rec[1])
+        },
+        'over25': {
+            'prediccion': 'Over' if col['over_si'][i] else 'Under',
+            'probabilidad': float(col['prob_over'][i]),
+            'recomendacion': _rec_dict(rec[2])
+        }
+    }
+
+
+class PrediccionArchivada:
+    """Fila del archivo con la interfaz mínima de Partido (id, fecha, cuotas, prediccion)."""
+
+    def __init__(self, col, i):
+        self.id_partido = int(col['ids'][i])
+        self.fecha = date.fromordinal(int(col['fechas'][i])).strftime("%d/%m/%Y")
+        for k, c in enumerate(CUOTAS):
+            setattr(self, c, float(col['cuotas'][i, k]))
+        self.prediccion = prediccion(col, i)
+
+
+def predicciones(fecha, fecha_partido=None):
+    """
+    Predicciones archivadas el día `fecha` (opcionalmente solo las de
+    partidos del día `fecha_partido`), como PrediccionArchivada.
+    None si no hay snapshot de ese día.
+    """
+    col = cargar(fecha, fecha_partido)
+    if col is None:
+        return None
+    return [PrediccionArchivada(col, i) for i in range(len(col['ids']))]
+
+
+def hidratar(archivadas, partidos):
+    """
+    Partido completos (copias de `partidos`, p.ej. partidos.pkl) con la
+    fecha, las cuotas y la predicción archivadas, en el orden del archivo.
+    Equipos y resultado son los actuales. Los archivados que ya no están
+    en `partidos` se descartan y se avisa en el log de cuántos son.
+    """
+    por_id = {int(p.id_partido): p for p in partidos}
+    salida, perdidos = [], []
+    for a in archivadas:
+        original = por_id.get(a.id_partido)
+        if original is None:
+            perdidos.append(a.id_partido)
+            continue
+        p = copy.copy(original)
+        p.fecha = a.fecha
+        for c in CUOTAS:
+            setattr(p, c, getattr(a, c))
+        p.prediccion = a.prediccion
+        salida.append(p)
+    if perdidos:
+        logger.warning(f"{len(perdidos)} de {len(archivadas)} predicciones archivadas sin "
+                       f"partido en el historial actual; se descartan (ids: {perdidos[:20]})")
+    return salida
@@ -0,0 +1,195 @@
+"""
+Artefactos nativos de los modelos base v2.
+
+En lugar de depender solo del pickle de Pipeline/CalibratedClassifierCV
+(lento de cargar, grande y frágil entre versiones de sklearn), cada
+modelo se exporta como:
+
+- <nombre>.ubj          booster XGBoost (UBJSON), recortado a la mejor ronda
+- <nombre>.lgb.txt      booster LightGBM (texto), recortado a la mejor ronda
+- <nombre>.json         manifiesto: scaler (mean/scale), tablas de
+                        calibración isotónica, clases y versiones
+
+Los predictores cargados reproducen exactamente predict / predict_proba
+de los objetos sklearn originales, sin deserializar ningún wrapper.
+"""
+
+import json
+import os
+import numpy as np
+from scipy import interpolate
+
+import xgboost as xgb
+import lightgbm as lgb
+import sklearn
+
+FORMATO = 1
+
+
+# =====================================================================
+# EXPORTACIÓN
+# =====================================================================
+
+def _tabla_isotonica(calibrador):
+    return {
+        'x': calibrador.X_thresholds_.tolist(),
+        'y': calibrador.y_thresholds_.tolist(),
+        'dtype': str(calibrador.X_thresholds_.dtype),
+    }
+
+
+def exportar(modelo, nombre, directorio):
+    """
+    Exporta un modelo base entrenado (Pipeline scaler + XGBRegressor, o
+    CalibratedClassifierCV isotónico sobre Pipeline scaler + LGBMClassifier).
+    """
+    manifiesto = {
+        'formato': FORMATO,
+        'versiones': {'xgboost': xgb.__version__, 'lightgbm': lgb.__version__,
+                      'sklearn': sklearn.__version__},
+    }
+
+    if hasattr(modelo, 'calibrated_classifiers_'):
+        cc = modelo.calibrated_classifiers_
+        if len(cc) != 1 or cc[0].method != 'isotonic':
+            raise ValueError(f"{nombre}: solo se exporta calibración isotónica de un pliegue")
+        base = cc[0].estimator
+        base = getattr(base, 'estimator', base)  # FrozenEstimator
+        m = base.named_steps['model']
+
+        archivo = f'{nombre}.lgb.txt'
+        m.booster_.save_model(os.path.join(directorio, archivo),
+                              num_iteration=m.best_iteration_ or None)
+        manifiesto.update(
+            tipo='clasificador',
+            # sklearn calibra sobre decision_function si el estimador la
+            # tiene (margen, LightGBM >= 4.7) y si no sobre predict_proba
+            respuesta='margen' if hasattr(base, 'decision_function') else 'probabilidad',
+            clases=[int(c) for c in modelo.classes_],
+            calibracion=[_tabla_isotonica(c) for c in cc[0].calibrators],
+        )
+    else:
+        base = modelo
+        m = base.named_steps['model']
+        booster = m.get_booster()
+        try:
+            booster = booster[:m.best_iteration + 1]
+        except AttributeError:
+            pass  # Sin parada temprana: todas las rondas
+
+        archivo = f'{nombre}.ubj'
+        booster.save_model(os.path.join(directorio, archivo))
+        manifiesto['tipo'] = 'regresor'
+
+    scaler = base.named_steps['scaler']
+    manifiesto.update(
+        booster=archivo,
+        scaler={'mean': scaler.mean_.tolist(), 'scale': scaler.scale_.tolist()},
+    )
+
+    ruta = os.path.join(directorio, f'{nombre}.json')
+    tmp = ruta + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifiesto, f)
+    os.replace(tmp, ruta)
+
+
+# =====================================================================
+# PREDICTORES
+# =====================================================================
+
+class _Escalador:
+    """StandardScaler.transform con la misma aritmética (y dtype) que sklearn."""
+
+    def __init__(self, datos):
+        self.mean = np.array(datos['mean'], dtype=np.float64)
+        self.scale = np.array(datos['scale'], dtype=np.float64)
+
+    def __call__(self, X):
+        X = np.asarray(X)
+        dtype = X.dtype if X.dtype in (np.float32, np.float64) else np.float64
+        X = np.array(X, dtype=dtype)
+        X -= self.mean.astype(dtype)
+        X /= self.scale.astype(dtype)
+        return X
+
+
+class _Isotonica:
+    """IsotonicRegression.predict (out_of_bounds='clip') desde su tabla."""
+
+    def __init__(self, tabla):
+        self.x = np.array(tabla['x'], dtype=tabla['dtype'])
+        self.y = np.array(tabla['y'], dtype=tabla['dtype'])
+        if len(self.y) > 1:
+            self.f = interpolate.interp1d(self.x, self.y, kind='linear', bounds_error=False)
+
+    def __call__(self, T):
+        T = np.asarray(T, dtype=self.x.dtype)
+        if len(self.y) == 1:
+            return self.y.repeat(T.shape)
+        T = np.clip(T, self.x[0], self.x[-1])
+        return self.f(T).astype(T.dtype)
+
+
+class RegresorNativo:
+    """Sustituto de Pipeline(scaler, XGBRegressor) con `predict`."""
+
+    def __init__(self, manifiesto, directorio):
+        self.escalar = _Escalador(manifiesto['scaler'])
+        self.booster = xgb.Booster()
+        self.booster.load_model(os.path.join(directorio, manifiesto['booster']))
+
+    def predict(self, X):
+        return self.booster.inplace_predict(self.escalar(X))
+
+
+class ClasificadorNativo:
+    """Sustituto de CalibratedClassifierCV(isotónica) con `predict_proba`."""
+
+    def __init__(self, manifiesto, directorio):
+        self.escalar = _Escalador(manifiesto['scaler'])
+        self.booster = lgb.Booster(model_file=os.path.join(directorio, manifiesto['booster']))
+        self.classes_ = np.array(manifiesto['clases'])
+        self.calibradores = [_Isotonica(t) for t in manifiesto['calibracion']]
+        self.margen = manifiesto['respuesta'] == 'margen'
+
+    def predict_proba(self, X):
+        pred = self.booster.predict(self.escalar(X), raw_score=self.margen)
+        n_clases = len(self.classes_)
+        proba = np.zeros((len(pred), n_clases))
+
+        if n_clases == 2:
+            proba[:, 1] = self.calibradores[0](pred)
+            proba[:, 0] = 1.0 - proba[:, 1]
+        else:
+            for k, calibrar in enumerate(self.calibradores):
+                proba[:, k] = calibrar(pred[:, k])
+            denominador = np.sum(proba, axis=1)[:, np.newaxis]
+            # Si todos los calibradores dan 0, distribución uniforme (como sklearn)
+            uniforme = np.full_like(proba, 1 / n_clases)
+            proba = np.divide(proba, denominador, out=uniforme, where=denominador != 0)
+
+        proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+# =====================================================================
+# CARGA
+# =====================================================================
+
+def existe(nombre, directorio):
+    return os.path.exists(os.path.join(directorio, f'{nombre}.json'))
+
+
+def cargar(nombre, directorio):
+    """Carga el predictor nativo de `nombre`; lanza FileNotFoundError si no existe."""
+    with open(os.path.join(directorio, f'{nombre}.json'), 'r') as f:
+        manifiesto = json.load(f)
+    if manifiesto.get('formato') != FORMATO:
+        raise ValueError(f"{nombre}: formato de artefacto no soportado")
+    if manifiesto['tipo'] == 'regresor':
+        return RegresorNativo(manifiesto, directorio)
+    return ClasificadorNativo(manifiesto, directorio)
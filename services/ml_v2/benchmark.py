@@ -29,7 +29,7 @@ from services.data_fetching.obtener_partidos import (
     obtener_partidos_jugados,
     cargar_partidos
 )
-from services.ml_v2.features import FeatureExtractor, _parse_fecha
+from services.ml_v2.features import FeatureExtractor
 from services.ml_v2.evaluar import (
     calcular_metricas_clasificacion,
     calcular_metricas_multiclase,
@@ -172,21 +172,18 @@ def run():
     # 1. Obtener datos y hacer split (determinista)
     partidos = obtener_partidos_jugados()
     
-    # Ordenar y split 80/20 igual que en entrenar.py
-    partidos_con_fecha = [(p, _parse_fecha(p.fecha)) for p in partidos]
-    partidos_con_fecha = [(p, f) for p, f in partidos_con_fecha if f is not None]
-    partidos_con_fecha.sort(key=lambda x: x[1])
-
-    split_idx = int(len(partidos_con_fecha) * 0.80)
-    partidos_train = [p for p, _ in partidos_con_fecha[:split_idx]]
-    partidos_val = [p for p, _ in partidos_con_fecha[split_idx:]]
+    # Mismo split temporal que entrenar.py: v2 mide sus métricas sobre
+    # prueba, así que v1 (que calibra con CV sobre train) entrena con
+    # train + ajuste y se evalúa sobre la misma prueba
+    from services.ml_v2.entrenar import crear_modelos, split_temporal
+    partidos_train, partidos_ajuste, partidos_val = split_temporal(partidos)
+    partidos_train = partidos_train + partidos_ajuste
     
-    print(f"\n[DATOS] Total: {len(partidos_con_fecha)} | Train: {len(partidos_train)} | Val: {len(partidos_val)}")
+    print(f"\n[DATOS] Total: {len(partidos_train) + len(partidos_val)} | Train: {len(partidos_train)} | Val: {len(partidos_val)}")
 
     # 2. Entrenar y evaluar v2 (CLEAN)
     print("\n>>> Paso 1: Entrenando v2 (Features Históricos ONLY)...")
-    from services.ml_v2.entrenar import crear_modelos
-    met_v2 = crear_modelos(partidos, logger)
+    met_v2 = crear_modelos(partidos, logger, modo='completo', forzar=True)
 
     # 3. Entrenar y evaluar v1 (RETRAINED)
     print("\n>>> Paso 2: Entrenando v1 (Arquitectura original, sin memorización)...")
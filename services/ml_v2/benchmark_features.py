@@ -0,0 +1,253 @@
+"""
+Microbenchmark y comprobación de paridad del FeatureExtractor v2.
+
+Genera ligas sintéticas (calendario de ida y vuelta, varias temporadas)
+con las clases reales Partido/Equipo y mide, para cada tamaño:
+
+- _build_indices (construcción del FeatureExtractor)
+- extraer (un partido, media por llamada)
+- extraer_lote / extraer_lote_paralelo (matriz completa)
+- actualizar (incorporar la última jornada a los índices)
+- FeatureStore en frío y en caliente
+
+Además comprueba que las rutas optimizadas devuelven exactamente los
+mismos bits que `extraer` partido a partido, para poder optimizar sin
+miedo a cambiar los features.
+
+Uso:
+    python services/ml_v2/benchmark_features.py              # 10k, 50k, 200k
+    python services/ml_v2/benchmark_features.py 10000 50000
+"""
+
+import os
+import sys
+import copy
+import random
+import tempfile
+import time
+import numpy as np
+from datetime import date, datetime, timedelta
+
+# Asegurar que el path raíz esté en sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from clases.partido import Partido
+from clases.equipo import Equipo
+from services.ml_v2.features import FeatureExtractor
+from services.ml_v2.feature_store import FeatureStore
+
+TAMANOS = (10_000, 50_000, 200_000)
+EQUIPOS_POR_LIGA = 20
+TEMPORADAS = 5
+N_MUESTRA_EXTRAER = 2000   # Partidos para medir `extraer` uno a uno
+
+
+class BenchmarkLogger:
+    """Logger simple que imprime con timestamp."""
+    def info(self, msg, end="\n"):
+        ts = datetime.now().strftime("%H:%M:%S")
+        print(f"[{ts}] {msg}", end=end)
+
+
+logger = BenchmarkLogger()
+
+
+# =====================================================================
+# GENERADOR SINTÉTICO
+# =====================================================================
+
+def _equipo(id_equipo, id_liga, temporada):
+    return Equipo(id_equipo, f"Equipo {id_equipo}", "", 0, 0, "",
+                  0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
+                  temporada, 0, 0, 0, 0, 0, 0,
+                  id_liga, f"Liga {id_liga}", "", "", "")
+
+
+def _poisson(rnd, lam):
+    """Muestra Poisson (Knuth) con `rnd`: reproducible con la semilla."""
+    limite, k, prod = np.exp(-lam), 0, rnd.random()
+    while prod > limite:
+        k += 1
+        prod *= rnd.random()
+    return k
+
+
+def _calendario(n_equipos):
+    """Jornadas de ida y vuelta por el método del círculo."""
+    equipos = list(range(n_equipos))
+    ida = []
+    for _ in range(n_equipos - 1):
+        jornada = [(equipos[i], equipos[-1 - i]) for i in range(n_equipos // 2)]
+        ida.append(jornada)
+        equipos = [equipos[0], equipos[-1]] + equipos[1:-1]
+    vuelta = [[(v, l) for l, v in jornada] for jornada in ida]
+    return ida + vuelta
+
+
+def generar_partidos(n_partidos, semilla=0, jornadas_pendientes=1):
+    """
+    Genera ~n_partidos partidos repartidos en ligas de 20 equipos y
+    TEMPORADAS temporadas, una jornada por semana. Las últimas
+    `jornadas_pendientes` jornadas de cada liga quedan en estado NS.
+
+    Returns:
+        Lista de Partido ordenada por fecha
+    """
+    rnd = random.Random(semilla)
+    calendario = _calendario(EQUIPOS_POR_LIGA)
+    por_temporada = len(calendario) * len(calendario[0])
+    n_ligas = max(1, round(n_partidos / (por_temporada * TEMPORADAS)))
+
+    partidos = []
+    id_partido = 1
+    for l in range(n_ligas):
+        id_liga = 100 + l
+        fuerza = [rnd.gauss(0, 0.3) for _ in range(EQUIPOS_POR_LIGA)]
+        for t in range(TEMPORADAS):
+            temporada = 2020 + t
+            equipos = [_equipo(10_000 * (l + 1) + k, id_liga, temporada)
+                       for k in range(EQUIPOS_POR_LIGA)]
+            inicio = date(temporada, 8, 10) + timedelta(days=l % 3)
+            ultima = len(calendario) - jornadas_pendientes if t == TEMPORADAS - 1 else None
+
+            for j, jornada in enumerate(calendario):
+                fecha = (inicio + timedelta(weeks=j)).strftime("%d/%m/%Y")
+                jugado = ultima is None or j < ultima
+                for a, b in jornada:
+                    gl = gv = None
+                    if jugado:
+                        gl = _poisson(rnd, np.exp(0.35 + fuerza[a] - fuerza[b]))
+                        gv = _poisson(rnd, np.exp(0.10 + fuerza[b] - fuerza[a]))
+                    partidos.append(Partido(
+                        id_partido, "FT" if jugado else "NS", id_liga, temporada,
+                        f"Regular Season - {j + 1}", equipos[a], equipos[b],
+                        fecha, "20:00", "", "", "",
+                        round(rnd.uniform(1.3, 5.0), 2), round(rnd.uniform(2.8, 4.2), 2),
+                        round(rnd.uniform(1.3, 6.0), 2), round(rnd.uniform(1.5, 2.4), 2),
+                        round(rnd.uniform(1.5, 2.4), 2), round(rnd.uniform(1.5, 2.2), 2),
+                        round(rnd.uniform(1.6, 2.4), 2),
+                        gl, gv))
+                    id_partido += 1
+
+    partidos.sort(key=lambda p: (datetime.strptime(p.fecha, "%d/%m/%Y"), p.id_partido))
+    return partidos
+
+
+# =====================================================================
+# UTILIDADES
+# =====================================================================
+
+def _cronometrar(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    res = fn(*args, **kwargs)
+    return res, time.perf_counter() - t0
+
+
+def _identicos(a, b):
+    """Igualdad bit a bit (NaN incluidos)."""
+    a = np.ascontiguousarray(a)
+    b = np.ascontiguousarray(b)
+    return a.shape == b.shape and a.dtype == b.dtype and a.tobytes() == b.tobytes()
+
+
+# =====================================================================
+# BENCHMARK
+# =====================================================================
+
+def benchmark_tamano(n_partidos, n_procesos=None):
+    """Mide y comprueba paridad para un tamaño. Devuelve dict de resultados."""
+    logger.info(f"=== {n_partidos:,} partidos ===")
+    todos = generar_partidos(n_partidos)
+    logger.info(f"  Generados {len(todos):,} partidos "
+                f"({sum(p.estado == 'FT' for p in todos):,} FT)")
+    res = {'n': len(todos)}
+    paridad = {}
+
+    # 1. Construcción de índices
+    extractor, res['build_indices'] = _cronometrar(FeatureExtractor, todos)
+
+    # 2. extraer() uno a uno sobre una muestra
+    muestra = random.Random(1).sample(todos, min(N_MUESTRA_EXTRAER, len(todos)))
+    t0 = time.perf_counter()
+    filas = [extractor.extraer(p)[0] for p in muestra]
+    res['extraer_us'] = (time.perf_counter() - t0) / len(muestra) * 1e6
+    X_ref = np.vstack(filas)
+
+    # 3. Matriz completa serie / paralela
+    (X64, _), _ = _cronometrar(extractor.extraer_lote, muestra, dtype=np.float64)
+    paridad['extraer_lote == extraer'] = _identicos(X64, X_ref)
+
+    (X, ids), res['lote'] = _cronometrar(extractor.extraer_lote, todos)
+    (X_par, ids_par), res['lote_paralelo'] = _cronometrar(
+        extractor.extraer_lote_paralelo, todos, n_procesos=n_procesos)
+    posicion = {id(p): i for i, p in enumerate(todos)}
+    paridad['float32 == float64 redondeado'] = _identicos(
+        X[[posicion[id(p)] for p in muestra]], X_ref.astype(np.float32))
+    paridad['paralelo == serie'] = _identicos(X_par, X) and _identicos(ids_par, ids)
+
+    # 4. Actualización incremental: última jornada jugada llega "hoy"
+    ultima_fecha = max((p for p in todos if p.estado == "FT"),
+                       key=lambda p: datetime.strptime(p.fecha, "%d/%m/%Y")).fecha
+    ayer = copy.copy(todos)
+    nuevos = []
+    for i, p in enumerate(ayer):
+        if p.estado == "FT" and p.fecha == ultima_fecha:
+            pendiente = copy.copy(p)
+            pendiente.estado = "NS"
+            ayer[i] = pendiente
+            nuevos.append(p)
+    incremental = FeatureExtractor(ayer)
+    _, res['actualizar'] = _cronometrar(incremental.actualizar, nuevos)
+    res['actualizar_n'] = len(nuevos)
+    X_inc, _ = incremental.extraer_lote(todos)
+    paridad['actualizar == reconstruir'] = (
+        _identicos(X_inc, X) and incremental.firmas_ft == extractor.firmas_ft)
+
+    # 5. Feature store en frío y en caliente
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'features.npz')
+        X_frio, res['store_frio'] = _cronometrar(
+            FeatureStore(ruta).matriz, extractor, todos, n_procesos=n_procesos)
+        store, t_carga = _cronometrar(FeatureStore, ruta)
+        X_caliente, t_matriz = _cronometrar(store.matriz, extractor, todos)
+        res['store_caliente'] = t_carga + t_matriz
+    paridad['store == lote'] = _identicos(X_frio, X) and _identicos(X_caliente, X)
+
+    res['paridad'] = paridad
+    return res
+
+
+def imprimir(resultados):
+    print("\n--- FEATURE EXTRACTION ---")
+    print(f"{'PARTIDOS':>10} | {'INDICES':>8} | {'EXTRAER':>10} | {'LOTE':>8} | "
+          f"{'PARALELO':>8} | {'ACTUALIZAR':>14} | {'STORE FRIO':>10} | {'CALIENTE':>8}")
+    print("-" * 100)
+    for r in resultados:
+        act = f"{r['actualizar'] * 1e3:.1f}ms ({r['actualizar_n']})"
+        print(f"{r['n']:>10,} | {r['build_indices']:>7.2f}s | {r['extraer_us']:>8.0f}us | "
+              f"{r['lote']:>7.2f}s | {r['lote_paralelo']:>7.2f}s | {act:>14} | "
+              f"{r['store_frio']:>9.2f}s | {r['store_caliente']:>7.2f}s")
+
+    print("\n--- PARIDAD (bit a bit) ---")
+    ok = True
+    for r in resultados:
+        for nombre, igual in r['paridad'].items():
+            ok &= igual
+            print(f"{r['n']:>10,} | {nombre:<32} | {'OK' if igual else 'FALLO'}")
+    return ok
+
+
+def run(tamanos=TAMANOS, n_procesos=None):
+    print("======================================================")
+    print("  RDScore -- Benchmark FeatureExtractor v2            ")
+    print("======================================================\n")
+
+    resultados = [benchmark_tamano(n, n_procesos=n_procesos) for n in tamanos]
+    ok = imprimir(resultados)
+    logger.info("Paridad OK" if ok else "¡Paridad rota! Revisar las rutas optimizadas")
+    return ok
+
+
+if __name__ == "__main__":
+    tamanos = tuple(int(a) for a in sys.argv[1:]) or TAMANOS
+    sys.exit(0 if run(tamanos) else 1)
@@ -21,7 +21,7 @@ from copy import deepcopy
 
 from config import BASE_DIR
 from services.data_fetching.obtener_historial import cargar_historial
-from services.ml_v2.meta_modelo import _asignar_predicciones_v2, cargar, aplicar_filtro_meta
+from services.ml_v2.meta_modelo import _asignar_predicciones_v2, cargar, aplicar_filtro_meta_lote
 
 logger = logging.getLogger("benchmark_full")
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s", datefmt="%H:%M:%S")
@@ -201,8 +201,7 @@ def run():
     n_before = sum(1 for p in historial_v2 if p.prediccion['btts']['recomendacion'].get('arriesgada') == 1)
     logger.info(f"  BTTS Arriesgada antes de filtro: {n_before}")
 
-    for p in historial_v2:
-        aplicar_filtro_meta(p, meta_res, meta_btts, meta_over)
+    aplicar_filtro_meta_lote(historial_v2, meta_res, meta_btts, meta_over)
         
     n_after = sum(1 for p in historial_v2 if p.prediccion['btts']['recomendacion'].get('arriesgada') == 1)
     logger.info(f"  BTTS Arriesgada despues de filtro: {n_after}")
@@ -0,0 +1,183 @@
+"""
+Búsqueda de hiperparámetros v2 por successive halving.
+
+Para cada modelo base (goles local/visitante, BTTS, Over 2.5, resultado)
+lanza un HalvingRandomSearchCV sobre la matriz de features del feature
+store, con pliegues temporales (TimeSeriesSplit) y candidatos evaluados
+en paralelo en todos los núcleos. Solo usa la parte de train del split
+temporal de crear_modelos (split_temporal), para que sus métricas de
+ajuste y prueba sigan siendo out-of-sample.
+
+Los ganadores se guardan en modelos_v2/hiperparametros.json, que
+crear_modelos lee en el siguiente entrenamiento (sin tocar código).
+
+Uso:
+  python -c "from services.ml_v2.buscar_hiperparametros import run; run()"
+"""
+
+import json
+import logging
+import os
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+from scipy.stats import loguniform, uniform
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingRandomSearchCV, TimeSeriesSplit
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+import xgboost as xgb
+import lightgbm as lgb
+
+from services.data_fetching.obtener_partidos import obtener_partidos_jugados, cargar_partidos
+from services.ml_v2.feature_store import FeatureStore, cargar_extractor
+from services.ml_v2.entrenar import (
+    PARAMS_REGRESOR,
+    PARAMS_CLASIFICADOR,
+    RUTA_HIPERPARAMETROS,
+    extraer_targets,
+    split_temporal,
+)
+
+logger = logging.getLogger("hiperparametros_v2")
+logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s", datefmt="%H:%M:%S")
+warnings.filterwarnings("ignore")
+
+N_CANDIDATOS = 64
+N_PLIEGUES = 4
+FACTOR = 3
+
+ESPACIO_REGRESOR = {
+    'n_estimators': [200, 400, 600],
+    'max_depth': [3, 4, 5, 6, 8],
+    'learning_rate': loguniform(0.01, 0.2),
+    'min_child_weight': [1, 3, 5, 10],
+    'subsample': uniform(0.6, 0.4),
+    'colsample_bytree': uniform(0.5, 0.5),
+    'reg_lambda': loguniform(0.1, 10),
+}
+
+ESPACIO_CLASIFICADOR = {
+    'n_estimators': [200, 500, 800],
+    'num_leaves': [15, 31, 63],
+    'max_depth': [-1, 4, 6, 8],
+    'learning_rate': loguniform(0.01, 0.2),
+    'min_child_samples': [10, 20, 50, 100],
+    'subsample': uniform(0.6, 0.4),
+    'subsample_freq': [0, 1],
+    'colsample_bytree': uniform(0.5, 0.5),
+    'reg_lambda': loguniform(1e-3, 10),
+}
+
+# (nombre, tipo, índice del target en extraer_targets)
+MODELOS = [
+    ("modelo_goles_local", 'reg', 0),
+    ("modelo_goles_visitante", 'reg', 1),
+    ("modelo_btts", 'clf', 2),
+    ("modelo_over25", 'clf', 3),
+    ("modelo_resultado", 'clf', 4),
+]
+
+
+def _estimador(tipo):
+    """Pipeline con los parámetros por defecto y un hilo (el paralelismo es por candidato)."""
+    if tipo == 'reg':
+        modelo = xgb.XGBRegressor(**PARAMS_REGRESOR, random_state=42, n_jobs=1,
+                                  tree_method='hist')
+    else:
+        modelo = lgb.LGBMClassifier(**PARAMS_CLASIFICADOR, random_state=42, n_jobs=1,
+                                    verbose=-1)
+    return Pipeline([('scaler', StandardScaler()), ('model', modelo)])
+
+
+def _a_python(valor):
+    return valor.item() if isinstance(valor, np.generic) else valor
+
+
+def buscar(X, y, tipo, n_candidatos=N_CANDIDATOS, n_pliegues=N_PLIEGUES,
+           n_nucleos=-1, semilla=42):
+    """
+    Successive halving sobre (X, y) con pliegues temporales: muchos
+    candidatos con pocas filas, y solo el mejor 1/FACTOR pasa a la
+    siguiente ronda con FACTOR veces más filas.
+
+    Returns:
+        (params ganadores sin prefijo, score medio en CV, nº de rondas)
+    """
+    espacio = ESPACIO_REGRESOR if tipo == 'reg' else ESPACIO_CLASIFICADOR
+    busqueda = HalvingRandomSearchCV(
+        _estimador(tipo),
+        {f'model__{k}': v for k, v in espacio.items()},
+        n_candidates=n_candidatos,
+        factor=FACTOR,
+        resource='n_samples',
+        cv=TimeSeriesSplit(n_splits=n_pliegues),
+        scoring='neg_mean_squared_error' if tipo == 'reg' else 'neg_log_loss',
+        refit=False,
+        n_jobs=n_nucleos,
+        random_state=semilla,
+    )
+    busqueda.fit(X, y)
+
+    params = {k.split('__', 1)[1]: _a_python(v) for k, v in busqueda.best_params_.items()}
+    return params, float(busqueda.best_score_), int(busqueda.n_iterations_)
+
+
+def _cargar_datos():
+    """Matriz de train (mismo split temporal que crear_modelos) y targets."""
+    partidos = obtener_partidos_jugados()
+    extractor = cargar_extractor(cargar_partidos())
+    partidos_train, _, _ = split_temporal(partidos)
+
+    X = FeatureStore().matriz(extractor, partidos_train)
+    targets = np.array([extraer_targets(p) for p in partidos_train])
+    return X, targets
+
+
+def guardar(resultados, n_filas):
+    datos = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'n_filas': n_filas,
+        'pliegues': N_PLIEGUES,
+        'modelos': resultados,
+    }
+    os.makedirs(os.path.dirname(RUTA_HIPERPARAMETROS), exist_ok=True)
+    tmp = RUTA_HIPERPARAMETROS + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(datos, f, indent=2)
+    os.replace(tmp, RUTA_HIPERPARAMETROS)
+
+
+def run(n_candidatos=N_CANDIDATOS, modelos=None, n_nucleos=-1):
+    """
+    Busca hiperparámetros para `modelos` (nombres; None = los cinco) y
+    actualiza modelos_v2/hiperparametros.json conservando los demás.
+    """
+    logger.info("=== Búsqueda de hiperparámetros v2 (successive halving) ===")
+    X, targets = _cargar_datos()
+    logger.info(f"  Matriz de train: {X.shape}, {N_PLIEGUES} pliegues temporales")
+
+    resultados = {}
+    if os.path.exists(RUTA_HIPERPARAMETROS):
+        with open(RUTA_HIPERPARAMETROS, 'r') as f:
+            resultados = json.load(f).get('modelos', {})
+
+    for nombre, tipo, idx in MODELOS:
+        if modelos and nombre not in modelos:
+            continue
+        t0 = time.perf_counter()
+        params, score, rondas = buscar(X, targets[:, idx], tipo,
+                                       n_candidatos=n_candidatos, n_nucleos=n_nucleos)
+        logger.info(f"  {nombre}: score={score:.4f} ({rondas} rondas, "
+                    f"{time.perf_counter() - t0:.0f}s) → {params}")
+        resultados[nombre] = {'params': params, 'score': score}
+
+    guardar(resultados, len(X))
+    logger.info(f"✓ Hiperparámetros guardados en {RUTA_HIPERPARAMETROS}")
+    return resultados
+
+
+if __name__ == "__main__":
+    run()
@@ -2,7 +2,8 @@
 Pipeline de entrenamiento y predicción v2 para RDScore.
 
 Mejoras sobre v1:
-- Split temporal 80/20 (no entrena con datos de validación)
+- Split temporal 80/10/10: train, ajuste (parada temprana y calibración)
+  y prueba (métricas), sin solaparse
 - Calibración sobre hold-out (no sobre training data)
 - Feature engineering mejorado (52 features)
 - Métricas de evaluación honestas (out-of-sample)
@@ -12,11 +13,18 @@ Exporta las mismas funciones que crear_modelo.py para un swap limpio.
 """
 
 from datetime import date, datetime, timedelta
+import hashlib
+import json
 import pickle
 import os
+import tempfile
+import time
 import numpy as np
 import warnings
+from joblib import Parallel, delayed
+from sklearn.base import BaseEstimator, ClassifierMixin
 from sklearn.calibration import CalibratedClassifierCV
+from sklearn.metrics import log_loss
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 import xgboost as xgb
@@ -27,7 +35,9 @@ from services.data_fetching.obtener_partidos import (
     obtener_partidos_a_predecir,
     cargar_partidos
 )
-from services.ml_v2.features import FeatureExtractor, _parse_fecha
+from services.ml_v2 import archivo_predicciones, artefactos, recomendaciones, registro
+from services.ml_v2.features import VERSION_FEATURES, _parse_fecha
+from services.ml_v2.feature_store import FeatureStore, cargar_extractor
 from services.ml_v2.evaluar import (
     calcular_metricas_clasificacion,
     calcular_metricas_multiclase,
@@ -44,15 +54,39 @@ def _asegurar_dir():
     os.makedirs(MODELOS_DIR, exist_ok=True)
 
 
-def guardar_modelo(modelo, nombre):
-    _asegurar_dir()
-    ruta = os.path.join(MODELOS_DIR, f'{nombre}.pkl')
+def directorio_modelos():
+    """
+    Directorio del juego de modelos activo en el registro (ver
+    registro.py); si aún no hay registro, el directorio plano heredado.
+    """
+    return registro.directorio_actual() or MODELOS_DIR
+
+
+def guardar_modelo(modelo, nombre, directorio=None):
+    """
+    Guarda el modelo sklearn (pickle, necesario para reentrenar) y su
+    artefacto nativo (booster + manifiesto, usado para predecir).
+    """
+    directorio = directorio or MODELOS_DIR
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, f'{nombre}.pkl')
     with open(ruta, 'wb') as f:
         pickle.dump(modelo, f)
+    artefactos.exportar(modelo, nombre, directorio)
+
 
+def cargar_modelo(nombre, nativo=True, directorio=None):
+    """
+    Carga un modelo base. Con nativo=True (predicción) usa el artefacto
+    nativo si existe; si no, o con nativo=False (reentrenamiento), el pickle.
 
-def cargar_modelo(nombre):
-    ruta = os.path.join(MODELOS_DIR, f'{nombre}.pkl')
+    Para cargar varios modelos del mismo juego, resolver antes
+    `directorio_modelos()` y pasarlo a todas las llamadas.
+    """
+    directorio = directorio or directorio_modelos()
+    if nativo and artefactos.existe(nombre, directorio):
+        return artefactos.cargar(nombre, directorio)
+    ruta = os.path.join(directorio, f'{nombre}.pkl')
     with open(ruta, 'rb') as f:
         return pickle.load(f)
 
@@ -72,40 +106,566 @@ def extraer_targets(partido):
 # ENTRENAMIENTO
 # =================================================================
 
-def crear_modelos(partidos, logger):
+PARADA_TEMPRANA = 50   # Rondas sin mejorar en validación antes de parar
+
+# Split temporal train | ajuste | prueba. El ajuste (parada temprana y
+# calibración) ya condiciona el modelo: las métricas y la referencia de
+# drift se miden solo sobre prueba, los partidos más recientes.
+FRACCION_TRAIN = 0.80
+FRACCION_AJUSTE = 0.10
+
+
+def split_temporal(partidos):
+    """
+    Ordena por fecha (descarta los que no la tienen) y parte en
+    (train, ajuste, prueba) según FRACCION_TRAIN y FRACCION_AJUSTE.
+    """
+    con_fecha = [(p, _parse_fecha(p.fecha)) for p in partidos]
+    con_fecha = [(p, f) for p, f in con_fecha if f is not None]
+    con_fecha.sort(key=lambda x: x[1])
+    ordenados = [p for p, _ in con_fecha]
+    i = int(len(ordenados) * FRACCION_TRAIN)
+    j = int(len(ordenados) * (FRACCION_TRAIN + FRACCION_AJUSTE))
+    return ordenados[:i], ordenados[i:j], ordenados[j:]
+
+
+# Hiperparámetros por defecto; los ganadores de buscar_hiperparametros
+# (modelos_v2/hiperparametros.json) los sustituyen modelo a modelo.
+PARAMS_REGRESOR = dict(
+    n_estimators=400, max_depth=6, learning_rate=0.05,
+    subsample=0.8, colsample_bytree=0.8,
+)
+PARAMS_CLASIFICADOR = dict(
+    n_estimators=500, max_depth=8, learning_rate=0.05,
+    subsample=0.8, colsample_bytree=0.8,
+)
+
+RUTA_HIPERPARAMETROS = os.path.join(MODELOS_DIR, 'hiperparametros.json')
+
+
+def cargar_hiperparametros():
+    """Dict nombre_modelo -> hiperparámetros buscados ({} si no hay búsqueda)."""
+    if not os.path.exists(RUTA_HIPERPARAMETROS):
+        return {}
+    try:
+        with open(RUTA_HIPERPARAMETROS, 'r') as f:
+            datos = json.load(f)
+        return {nombre: d['params'] for nombre, d in datos['modelos'].items()}
+    except Exception:
+        return {}
+
+
+def _modelo_regresor(n_hilos, params=None):
+    return xgb.XGBRegressor(
+        **{**PARAMS_REGRESOR, **(params or {})},
+        random_state=42, n_jobs=n_hilos, tree_method='hist',
+        early_stopping_rounds=PARADA_TEMPRANA
+    )
+
+
+def _modelo_clasificador(n_hilos, params=None):
+    return lgb.LGBMClassifier(
+        **{**PARAMS_CLASIFICADOR, **(params or {})},
+        random_state=42, n_jobs=n_hilos, verbose=-1
+    )
+
+
+class _PresupuestoXGB(xgb.callback.TrainingCallback):
+    """Corta el boosting de XGBoost al agotar el presupuesto de tiempo."""
+
+    def __init__(self, segundos):
+        super().__init__()
+        self.segundos = segundos
+
+    def before_training(self, model):
+        self.t0 = time.perf_counter()
+        return model
+
+    def after_iteration(self, model, epoch, evals_log):
+        return time.perf_counter() - self.t0 > self.segundos
+
+
+def _presupuesto_lgb(segundos):
+    """Callback de LightGBM que corta el boosting al agotar el presupuesto."""
+    t0 = time.perf_counter()
+
+    def _callback(env):
+        if time.perf_counter() - t0 > segundos:
+            raise lgb.callback.EarlyStopException(env.iteration, env.evaluation_result_list)
+
+    return _callback
+
+
+class ClasificadorBooster(ClassifierMixin, BaseEstimator):
+    """
+    Clasificador LightGBM entrenado con lgb.train sobre un Dataset ya
+    binado (compartido entre targets), con la interfaz de LGBMClassifier
+    que usan la calibración, los artefactos y el reentrenamiento:
+    classes_, booster_, best_iteration_, params, decision_function y
+    predict_proba.
+    """
+
+    def __init__(self, params=None):
+        self.params = params
+
+    def _ajustar(self, booster, clases):
+        self.booster_ = booster
+        self.classes_ = np.asarray(clases)
+        self.best_iteration_ = booster.best_iteration
+        self.n_features_in_ = booster.num_feature()
+        return self
+
+    def fit(self, X, y):
+        clases = np.unique(y)
+        params, rondas = _params_lgb(self.params, len(clases), -1)
+        booster = lgb.train(params, lgb.Dataset(X, np.searchsorted(clases, y), params=params),
+                            num_boost_round=rondas)
+        return self._ajustar(booster, clases)
+
+    def decision_function(self, X):
+        return self.booster_.predict(X, raw_score=True)
+
+    def predict_proba(self, X):
+        p = self.booster_.predict(X)
+        return np.column_stack([1.0 - p, p]) if p.ndim == 1 else p
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+# Parámetros que afectan al binado: iguales para todos los targets
+PARAMS_DATASET = {'feature_pre_filter': False, 'verbose': -1}
+
+
+def _params_lgb(params, n_clases, n_hilos):
+    """Hiperparámetros estilo LGBMClassifier → (params de lgb.train, nº de rondas)."""
+    p = {**PARAMS_CLASIFICADOR, **(params or {})}
+    rondas = p.pop('n_estimators')
+    p.update(PARAMS_DATASET, seed=42, num_threads=n_hilos)
+    if n_clases > 2:
+        p.update(objective='multiclass', num_class=n_clases)
+    else:
+        p['objective'] = 'binary'
+    return p, rondas
+
+
+def _datasets_lgb(Xs_train, Xs_val, directorio):
+    """
+    Bina una sola vez la matriz de train (y la de validación con sus
+    mismos cortes) y la guarda en formato binario de LightGBM, para que
+    cada clasificador solo cambie la etiqueta.
+
+    Returns:
+        (ruta_train, ruta_val)
+    """
+    rutas = (os.path.join(directorio, 'train.bin'), os.path.join(directorio, 'val.bin'))
+    ds = lgb.Dataset(Xs_train, params=PARAMS_DATASET)
+    ds.save_binary(rutas[0])
+    lgb.Dataset(Xs_val, reference=ds, params=PARAMS_DATASET).save_binary(rutas[1])
+    return rutas
+
+
+def _entrenar_modelo(tipo, scaler, Xs_train, y_train, X_val, Xs_val, y_val, n_hilos,
+                     presupuesto=None, params=None, datasets=None):
+    """
+    Entrena un modelo base (se ejecuta en un worker de joblib) con parada
+    temprana sobre el set de validación.
+
+    - 'reg': scaler + XGBRegressor.
+    - 'clf': scaler + LightGBM sobre el Dataset binado compartido,
+             calibrado (isotónica) sobre validación.
+
+    Args:
+        scaler: StandardScaler ya ajustado sobre train (común a los modelos)
+        Xs_train, Xs_val: Matrices ya escaladas
+        presupuesto: Segundos máximos de boosting (None = sin límite)
+        params: Hiperparámetros que sustituyen a los por defecto
+        datasets: (ruta_train, ruta_val) de _datasets_lgb
+
+    Returns:
+        (modelo, segundos de entrenamiento)
+    """
+    t0 = time.perf_counter()
+
+    if tipo == 'reg':
+        m = _modelo_regresor(n_hilos, params)
+        if presupuesto:
+            m.set_params(callbacks=[_PresupuestoXGB(presupuesto)])
+        m.fit(Xs_train, y_train, eval_set=[(Xs_val, y_val)], verbose=False)
+        m.set_params(callbacks=None)
+        return Pipeline([('scaler', scaler), ('model', m)]), time.perf_counter() - t0
+
+    clases = np.unique(y_train)
+    params_lgb, rondas = _params_lgb(params, len(clases), n_hilos)
+    ds = lgb.Dataset(datasets[0], label=np.searchsorted(clases, y_train), params=PARAMS_DATASET)
+    ds_val = lgb.Dataset(datasets[1], label=np.searchsorted(clases, y_val),
+                         reference=ds, params=PARAMS_DATASET)
+
+    callbacks = [lgb.early_stopping(PARADA_TEMPRANA, verbose=False)]
+    if presupuesto:
+        callbacks.append(_presupuesto_lgb(presupuesto))
+    booster = lgb.train(params_lgb, ds, num_boost_round=rondas,
+                        valid_sets=[ds_val], callbacks=callbacks)
+    m = ClasificadorBooster(params)._ajustar(booster, clases)
+
+    # El clasificador solo ha visto train: calibrar sobre validación
+    calibrado = _calibrar_prefit(Pipeline([('scaler', scaler), ('model', m)]), X_val, y_val)
+    return calibrado, time.perf_counter() - t0
+
+
+def rondas_modelo(modelo):
+    """Nº de rondas de boosting que usa el modelo al predecir."""
+    if isinstance(modelo, CalibratedClassifierCV):
+        modelo = _estimador_base(modelo)
+    m = modelo.named_steps['model']
+    if isinstance(m, xgb.XGBModel):
+        try:
+            return int(m.best_iteration) + 1
+        except AttributeError:
+            return int(m.get_booster().num_boosted_rounds())
+    return int(m.best_iteration_ or m.booster_.current_iteration())
+
+
+def entrenar_en_paralelo(tareas, X_train, X_val, logger, n_nucleos=None,
+                         presupuesto=None):
+    """
+    Entrena varios modelos a la vez repartiendo los núcleos entre ellos,
+    en lugar de encadenarlos con n_jobs=-1 cada uno (sobresuscripción).
+
+    El scaler se ajusta una vez (es el mismo para todos los modelos) y
+    las matrices escaladas, en float32, se comparten en solo lectura:
+    joblib las pasa a los workers loky como memmap en vez de copiarlas.
+    Los clasificadores LightGBM comparten además un único Dataset binado.
+
+    Args:
+        tareas: Lista de (nombre, 'reg'|'clf', y_train, y_val)
+        n_nucleos: Núcleos totales a usar (None = todos)
+        presupuesto: Segundos máximos de boosting por modelo (None = sin límite)
+
+    Returns:
+        Dict nombre -> modelo entrenado
+    """
+    n_nucleos = n_nucleos or os.cpu_count() or 1
+    n_paralelo = max(1, min(len(tareas), n_nucleos))
+    n_hilos = max(1, n_nucleos // n_paralelo)
+    logger.info(f"  Entrenando {len(tareas)} modelos: {n_paralelo} en paralelo "
+                f"x {n_hilos} hilos ({n_nucleos} núcleos)")
+    hiperparametros = cargar_hiperparametros()
+    if hiperparametros:
+        logger.info(f"  Hiperparámetros buscados para: {', '.join(sorted(hiperparametros))}")
+
+    X_train = np.asarray(X_train, dtype=np.float32)
+    X_val = np.asarray(X_val, dtype=np.float32)
+    scaler = StandardScaler().fit(X_train)
+    Xs_train = scaler.transform(X_train)
+    Xs_val = scaler.transform(X_val)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datasets = None
+        if any(tipo == 'clf' for _, tipo, _, _ in tareas):
+            t0 = time.perf_counter()
+            datasets = _datasets_lgb(Xs_train, Xs_val, tmp)
+            logger.info(f"  Dataset LightGBM binado una vez: {time.perf_counter() - t0:.1f}s")
+
+        resultados = Parallel(n_jobs=n_paralelo, backend='loky',
+                              max_nbytes='1M', mmap_mode='r')(
+            delayed(_entrenar_modelo)(tipo, scaler, Xs_train, y_train, X_val, Xs_val, y_val,
+                                      n_hilos, presupuesto, hiperparametros.get(nombre),
+                                      datasets)
+            for nombre, tipo, y_train, y_val in tareas
+        )
+
+    modelos = {}
+    for (nombre, tipo, _, _), (m, segundos) in zip(tareas, resultados):
+        descripcion = ("XGBRegressor" if tipo == 'reg'
+                       else "LightGBM + calibración isotónica")
+        logger.info(f"  → {nombre} ({descripcion}): {segundos:.1f}s, "
+                    f"{rondas_modelo(m)} rondas")
+        modelos[nombre] = m
+    return modelos
+
+
+# =================================================================
+# REENTRENAMIENTO INCREMENTAL
+# =================================================================
+
+RUTA_ESTADO = os.path.join(MODELOS_DIR, 'estado_entrenamiento.json')
+RUTA_IDS_ENTRENADOS = os.path.join(MODELOS_DIR, 'ids_entrenados.npy')
+
+DIAS_RECONSTRUCCION = 7         # Reconstrucción completa semanal
+UMBRAL_DRIFT = 0.05             # +5% de logloss sobre la referencia → reconstruir
+RONDAS_INCREMENTALES = {'reg': 40, 'clf': 50}   # Máximo; para antes sobre ajuste
+VERSION_MODELOS = 3             # Subir si cambia el tipo o el split de los modelos guardados
+
+
+def _cargar_estado():
+    if not os.path.exists(RUTA_ESTADO) or not os.path.exists(RUTA_IDS_ENTRENADOS):
+        return None
+    try:
+        with open(RUTA_ESTADO, 'r') as f:
+            estado = json.load(f)
+        estado['ids_entrenados'] = set(np.load(RUTA_IDS_ENTRENADOS).tolist())
+        return estado
+    except Exception:
+        return None  # Estado corrupto → reconstrucción completa
+
+
+def _guardar_estado(estado, ids_entrenados):
+    _asegurar_dir()
+    np.save(RUTA_IDS_ENTRENADOS, np.array(sorted(ids_entrenados), dtype=np.int64))
+    with open(RUTA_ESTADO, 'w') as f:
+        json.dump(estado, f, indent=2)
+
+
+# Junto a cada juego de modelos del registro
+ARCHIVO_IDS_VISTOS = 'ids_vistos.npy'
+
+
+def ids_vistos(directorio=None):
+    """
+    Ids de todos los partidos que vio el juego de modelos de `directorio`
+    (por defecto el activo): train y ajuste (parada temprana y
+    calibración), y en incremental también los de las versiones de las
+    que parte. None si no consta.
+    """
+    ruta = os.path.join(directorio or directorio_modelos(), ARCHIVO_IDS_VISTOS)
+    try:
+        return set(np.load(ruta).tolist())
+    except (OSError, ValueError):
+        return None
+
+
+def _estimador_base(calibrado):
+    """Pipeline (scaler + LightGBM) dentro de un CalibratedClassifierCV."""
+    est = calibrado.calibrated_classifiers_[0].estimator
+    return est if isinstance(est, Pipeline) else est.estimator  # FrozenEstimator
+
+
+def _calibrar_prefit(modelo, X_cal, y_cal):
+    """Calibración isotónica de un modelo ya entrenado (sin reentrenarlo)."""
+    try:
+        from sklearn.frozen import FrozenEstimator
+        calibrado = CalibratedClassifierCV(FrozenEstimator(modelo), method='isotonic')
+    except ImportError:  # scikit-learn < 1.6
+        calibrado = CalibratedClassifierCV(modelo, method='isotonic', cv='prefit')
+    return calibrado.fit(X_cal, y_cal)
+
+
+def _booster_recortado(m):
+    """Booster sin las rondas posteriores a la mejor (parada temprana)."""
+    if isinstance(m, xgb.XGBModel):
+        try:
+            return m.get_booster()[:m.best_iteration + 1]
+        except AttributeError:
+            return m.get_booster()
+    if m.best_iteration_:
+        return lgb.Booster(model_str=m.booster_.model_to_string(num_iteration=m.best_iteration_))
+    return m.booster_
+
+
+def _actualizar_modelo(tipo, modelo, X_nuevo, y_nuevo, X_cal, y_cal, n_hilos):
+    """
+    Continúa el boosting del modelo de ayer con las filas nuevas
+    (xgb_model / init_model) manteniendo su scaler, con parada temprana
+    sobre la ventana de ajuste actual (hasta RONDAS_INCREMENTALES rondas:
+    un lote pequeño no sobreajusta el booster), y recalibra los
+    clasificadores sobre esa misma ventana.
+
+    Returns:
+        (modelo, segundos)
+    """
+    t0 = time.perf_counter()
+    base = modelo if tipo == 'reg' else _estimador_base(modelo)
+    scaler = base.named_steps['scaler']
+    anterior = base.named_steps['model']
+
+    if len(X_nuevo):
+        Xs = scaler.transform(X_nuevo)
+        Xs_cal = scaler.transform(X_cal)
+        if tipo == 'reg':
+            params = anterior.get_params()
+            params.update(n_estimators=RONDAS_INCREMENTALES[tipo], n_jobs=n_hilos,
+                          early_stopping_rounds=PARADA_TEMPRANA, callbacks=None)
+            siguiente = xgb.XGBRegressor(**params)
+            siguiente.fit(Xs, y_nuevo, eval_set=[(Xs_cal, y_cal)], verbose=False,
+                          xgb_model=_booster_recortado(anterior))
+        else:
+            clases = anterior.classes_
+            params_lgb, _ = _params_lgb(anterior.params, len(clases), n_hilos)
+            ds = lgb.Dataset(Xs, np.searchsorted(clases, y_nuevo), params=PARAMS_DATASET)
+            ds_cal = lgb.Dataset(Xs_cal, np.searchsorted(clases, y_cal), reference=ds,
+                                 params=PARAMS_DATASET)
+            booster = lgb.train(params_lgb, ds, num_boost_round=RONDAS_INCREMENTALES[tipo],
+                                init_model=_booster_recortado(anterior), valid_sets=[ds_cal],
+                                callbacks=[lgb.early_stopping(PARADA_TEMPRANA, verbose=False)])
+            siguiente = ClasificadorBooster(anterior.params)._ajustar(booster, clases)
+        base = Pipeline([('scaler', scaler), ('model', siguiente)])
+
+    if tipo == 'clf':
+        return _calibrar_prefit(base, X_cal, y_cal), time.perf_counter() - t0
+    return base, time.perf_counter() - t0
+
+
+def _logloss_actual(nombres, X_prueba, ys_prueba):
+    """Logloss de los clasificadores guardados sobre la ventana de prueba actual."""
+    res = {}
+    directorio = directorio_modelos()
+    for nombre, y in zip(nombres, ys_prueba):
+        m = cargar_modelo(nombre, directorio=directorio)
+        res[nombre] = float(log_loss(y, m.predict_proba(X_prueba), labels=m.classes_))
+    return res
+
+
+def _decidir_modo(estado, hoy, X_prueba, ys_prueba, logger):
+    """
+    'completo' si no hay estado, cambió la versión de features, pasó
+    DIAS_RECONSTRUCCION desde la última reconstrucción o el logloss de
+    algún clasificador empeora más de UMBRAL_DRIFT sobre su referencia.
+    """
+    if estado is None:
+        return 'completo', "sin estado previo"
+    if estado.get('version_features') != VERSION_FEATURES:
+        return 'completo', "cambió VERSION_FEATURES"
+    if estado.get('version_modelos') != VERSION_MODELOS:
+        return 'completo', "cambió VERSION_MODELOS"
+    if estado.get('version_registro') != registro.version_actual():
+        return 'completo', "la versión activa no es la del último entrenamiento (rollback)"
+    dias = (hoy - date.fromisoformat(estado['fecha_reconstruccion'])).days
+    if dias >= DIAS_RECONSTRUCCION:
+        return 'completo', f"{dias} días desde la última reconstrucción"
+
+    try:
+        actual = _logloss_actual(list(estado['logloss_referencia']), X_prueba, ys_prueba)
+    except Exception as e:
+        return 'completo', f"no se pudieron evaluar los modelos actuales ({e})"
+    for nombre, ref in estado['logloss_referencia'].items():
+        logger.info(f"  Drift {nombre}: logloss {actual[nombre]:.4f} (ref {ref:.4f})")
+        if actual[nombre] > ref * (1 + UMBRAL_DRIFT):
+            return 'completo', f"drift en {nombre}"
+    return 'incremental', f"{dias} días desde la última reconstrucción, sin drift"
+
+
+# =================================================================
+# HUELLA DEL DATASET
+# =================================================================
+
+RUTA_HUELLA = os.path.join(MODELOS_DIR, 'huella_dataset.json')
+
+MODELOS_BASE = ["modelo_goles_local", "modelo_goles_visitante",
+                "modelo_btts", "modelo_over25", "modelo_resultado"]
+
+
+def huella_dataset(partidos):
+    """
+    Hash del dataset de entrenamiento: ids y goles de los partidos más la
+    versión de features. Si no cambia, los modelos entrenados siguen
+    siendo válidos.
+    """
+    filas = sorted(
+        (int(p.id_partido),
+         -1 if p.goles_local is None else int(p.goles_local),
+         -1 if p.goles_visitante is None else int(p.goles_visitante))
+        for p in partidos
+    )
+    h = hashlib.sha256(f"features_v{VERSION_FEATURES}".encode())
+    h.update(np.array(filas, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def _cargar_huella():
+    if not os.path.exists(RUTA_HUELLA):
+        return None
+    try:
+        with open(RUTA_HUELLA, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def _guardar_huella(huella, n_partidos, metricas):
+    _asegurar_dir()
+    datos = {
+        'huella': huella,
+        'hiperparametros': cargar_hiperparametros(),
+        'n_partidos': n_partidos,
+        'version_features': VERSION_FEATURES,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'metricas': metricas,
+    }
+    tmp = RUTA_HUELLA + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(datos, f, indent=2, default=float)
+    os.replace(tmp, RUTA_HUELLA)
+
+
+def _modelos_guardados(huella):
+    """Los modelos activos existen y se entrenaron con `huella` (no tras un rollback)."""
+    version = registro.version_actual()
+    if version and registro.leer_manifiesto(version).get('huella') != huella:
+        return False
+    directorio = directorio_modelos()
+    return all(os.path.exists(os.path.join(directorio, f'{n}.pkl')) for n in MODELOS_BASE)
+
+
+def crear_modelos(partidos, logger, n_nucleos=None, modo='auto', forzar=False,
+                  presupuesto=None):
     """
     Entrena modelos v2 con split temporal y features mejorados.
 
     Args:
         partidos: Lista de partidos jugados (estado="FT")
         logger: Logger compatible con logger.info()
+        n_nucleos: Núcleos para entrenar (None = todos)
+        modo: 'completo' (desde cero), 'incremental' (continuar el boosting
+              de ayer con las filas nuevas y recalibrar sobre la ventana de
+              ajuste) o 'auto' (incremental salvo reconstrucción semanal
+              o drift; ver _decidir_modo)
+        forzar: Entrenar aunque ni el dataset (ver huella_dataset) ni los
+                hiperparámetros hayan cambiado desde el último entrenamiento
+        presupuesto: Segundos máximos de boosting por modelo en la
+                     reconstrucción completa (None = solo parada temprana)
+
+    Returns:
+        Métricas sobre prueba (las del último entrenamiento si se omite)
     """
+    huella = huella_dataset(partidos)
+    previa = _cargar_huella()
+    if (not forzar and previa and previa.get('huella') == huella
+            and previa.get('hiperparametros', {}) == cargar_hiperparametros()
+            and _modelos_guardados(huella)):
+        logger.info(f"=== Pipeline v2: dataset sin cambios ({len(partidos)} partidos, "
+                    f"entrenado {previa['fecha']}); se omite el entrenamiento ===")
+        return previa.get('metricas')
+
     logger.info("=== Pipeline v2: Preparando datos ===")
 
     # 1. Cargar todos los partidos para el FeatureExtractor
     todos = cargar_partidos()
-    extractor = FeatureExtractor(todos)
+    extractor = cargar_extractor(todos)
     logger.info(f"  FeatureExtractor inicializado con {len(extractor.partidos_ft)} partidos FT")
 
-    # 2. Ordenar temporalmente y split 80/20
-    partidos_con_fecha = [(p, _parse_fecha(p.fecha)) for p in partidos]
-    partidos_con_fecha = [(p, f) for p, f in partidos_con_fecha if f is not None]
-    partidos_con_fecha.sort(key=lambda x: x[1])
-
-    split_idx = int(len(partidos_con_fecha) * 0.80)
-    partidos_train = [p for p, _ in partidos_con_fecha[:split_idx]]
-    partidos_val = [p for p, _ in partidos_con_fecha[split_idx:]]
+    # 2. Split temporal train / ajuste / prueba
+    partidos_train, partidos_ajuste, partidos_prueba = split_temporal(partidos)
+    split_idx = len(partidos_train)
+    ajuste_idx = split_idx + len(partidos_ajuste)
 
-    logger.info(f"  Split temporal: {len(partidos_train)} train / {len(partidos_val)} val")
+    logger.info(f"  Split temporal: {len(partidos_train)} train / {len(partidos_ajuste)} ajuste "
+                f"(parada temprana y calibración) / {len(partidos_prueba)} prueba")
 
-    # 3. Extraer features y targets
+    # 3. Extraer features (feature store: solo se calculan filas nuevas) y targets
     logger.info("  Extrayendo features v2 (50 features)...")
 
-    X_train = np.array([extractor.extraer(p).flatten() for p in partidos_train])
-    X_val = np.array([extractor.extraer(p).flatten() for p in partidos_val])
+    store = FeatureStore()
+    X = store.matriz(extractor, partidos_train + partidos_ajuste + partidos_prueba)
+    logger.info(f"  Feature store: {store.ultimas_calculadas} filas calculadas, "
+                f"{len(X) - store.ultimas_calculadas} desde caché")
+    X_train = X[:split_idx]
+    X_ajuste = X[split_idx:ajuste_idx]
+    X_prueba = X[ajuste_idx:]
 
     targets_train = [extraer_targets(p) for p in partidos_train]
-    targets_val = [extraer_targets(p) for p in partidos_val]
+    targets_ajuste = [extraer_targets(p) for p in partidos_ajuste]
+    targets_prueba = [extraer_targets(p) for p in partidos_prueba]
 
     y_gl_t = np.array([t[0] for t in targets_train])
     y_gv_t = np.array([t[1] for t in targets_train])
@@ -113,102 +673,150 @@ def crear_modelos(partidos, logger):
     y_over_t = np.array([t[3] for t in targets_train])
     y_res_t = np.array([t[4] for t in targets_train])
 
-    y_gl_v = np.array([t[0] for t in targets_val])
-    y_gv_v = np.array([t[1] for t in targets_val])
-    y_btts_v = np.array([t[2] for t in targets_val])
-    y_over_v = np.array([t[3] for t in targets_val])
-    y_res_v = np.array([t[4] for t in targets_val])
-
-    logger.info(f"  Features shape: train={X_train.shape}, val={X_val.shape}")
-
-    # 4. Definir modelos base
-    modelo_reg = Pipeline([
-        ('scaler', StandardScaler()),
-        ('model', xgb.XGBRegressor(
-            n_estimators=400, max_depth=6, learning_rate=0.05,
-            subsample=0.8, colsample_bytree=0.8,
-            random_state=42, n_jobs=-1, tree_method='hist'
-        ))
-    ])
-
-    modelo_clf = Pipeline([
-        ('scaler', StandardScaler()),
-        ('model', lgb.LGBMClassifier(
-            n_estimators=500, max_depth=8, learning_rate=0.05,
-            subsample=0.8, colsample_bytree=0.8,
-            random_state=42, n_jobs=-1, verbose=-1
-        ))
-    ])
-
-    # 5. Entrenar y calibrar cada modelo
-    def entrenar_regresor(y_train, nombre):
-        logger.info(f"  → Entrenando {nombre} (XGBRegressor)...")
-        from sklearn.base import clone
-        m = clone(modelo_reg)
-        m.fit(X_train, y_train)
-        guardar_modelo(m, nombre)
-        return m
-
-    def entrenar_clasificador(y_train, y_val, nombre):
-        logger.info(f"  → Entrenando {nombre} (LightGBM + calibración isotónica)...")
-        from sklearn.base import clone
-        m = clone(modelo_clf)
-        m.fit(X_train, y_train)
-
-        from sklearn.model_selection import PredefinedSplit
-
-        # Combinar train y val para que CalibratedClassifierCV use el slice correcto
-        X_combined = np.vstack([X_train, X_val])
-        y_combined = np.concatenate([y_train, y_val])
-
-        # -1 para train (no usar en calibración), 0 para val (usar en calibración)
-        test_fold = np.concatenate([-np.ones(len(X_train)), np.zeros(len(X_val))])
-        ps = PredefinedSplit(test_fold)
-
-        logger.info(f"    Calibrando {nombre} sobre set de validación (PredefinedSplit)...")
-        calibrated = CalibratedClassifierCV(m, method='isotonic', cv=ps)
-        calibrated.fit(X_combined, y_combined)
-
-        guardar_modelo(calibrated, nombre)
-        return calibrated
-
-    # Entrenar secuencialmente (más seguro para logs)
-    m_gl = entrenar_regresor(y_gl_t, "modelo_goles_local")
-    m_gv = entrenar_regresor(y_gv_t, "modelo_goles_visitante")
-    m_btts = entrenar_clasificador(y_btts_t, y_btts_v, "modelo_btts")
-    m_over = entrenar_clasificador(y_over_t, y_over_v, "modelo_over25")
-    m_res = entrenar_clasificador(y_res_t, y_res_v, "modelo_resultado")
-
-    # 6. Evaluar sobre validación (métricas honestas)
-
-    # Resultado
-    prob_res = m_res.predict_proba(X_val)
-    pred_res = prob_res.argmax(axis=1)
-    met_res = calcular_metricas_multiclase(y_res_v, prob_res, pred_res)
-
-    # Extraer cuotas para validación
-    cuotas_btts = [getattr(p, 'cuota_btts', -1) for p in partidos_val]
-    cuotas_over = [getattr(p, 'cuota_over', -1) for p in partidos_val]
-
-    # BTTS
-    prob_btts = m_btts.predict_proba(X_val)[:, 1]
-    pred_btts = (prob_btts >= 0.5).astype(int)
-    met_btts = calcular_metricas_clasificacion(y_btts_v, prob_btts, pred_btts,
-                                                cuotas_si=cuotas_btts)
-
-    # Over 2.5
-    prob_over = m_over.predict_proba(X_val)[:, 1]
-    pred_over = (prob_over >= 0.5).astype(int)
-    met_over = calcular_metricas_clasificacion(y_over_v, prob_over, pred_over,
-                                                cuotas_si=cuotas_over)
-
-    logger.info("✓ Modelos v2 entrenados y guardados.")
-
-    return {
-        'resultado': met_res,
-        'btts': met_btts,
-        'over': met_over,
-    }
+    y_gl_a = np.array([t[0] for t in targets_ajuste])
+    y_gv_a = np.array([t[1] for t in targets_ajuste])
+    y_btts_a = np.array([t[2] for t in targets_ajuste])
+    y_over_a = np.array([t[3] for t in targets_ajuste])
+    y_res_a = np.array([t[4] for t in targets_ajuste])
+
+    y_btts_p = np.array([t[2] for t in targets_prueba])
+    y_over_p = np.array([t[3] for t in targets_prueba])
+    y_res_p = np.array([t[4] for t in targets_prueba])
+
+    logger.info(f"  Features shape: train={X_train.shape}, ajuste={X_ajuste.shape}, "
+                f"prueba={X_prueba.shape}")
+
+    tareas = [
+        ("modelo_goles_local", 'reg', y_gl_t, y_gl_a),
+        ("modelo_goles_visitante", 'reg', y_gv_t, y_gv_a),
+        ("modelo_btts", 'clf', y_btts_t, y_btts_a),
+        ("modelo_over25", 'clf', y_over_t, y_over_a),
+        ("modelo_resultado", 'clf', y_res_t, y_res_a),
+    ]
+    ids_train = [int(p.id_partido) for p in partidos_train]
+    # Prueba queda fuera: ningún modelo la ve
+    vistos = set(ids_train) | {int(p.id_partido) for p in partidos_ajuste}
+    hoy = date.today()
+
+    # 4. Decidir entre reconstrucción completa y actualización incremental
+    estado = _cargar_estado()
+    if modo == 'auto':
+        modo, motivo = _decidir_modo(estado, hoy, X_prueba,
+                                     [y_btts_p, y_over_p, y_res_p], logger)
+        logger.info(f"  Modo de entrenamiento: {modo} ({motivo})")
+    elif modo == 'incremental' and (estado is None
+                                    or estado.get('version_modelos') != VERSION_MODELOS
+                                    or estado.get('version_registro') != registro.version_actual()):
+        logger.info("  Sin estado previo compatible: reconstrucción completa")
+        modo = 'completo'
+
+    # 5. Entrenar y calibrar los 5 modelos
+    if modo == 'completo':
+        # En paralelo con presupuesto de núcleos
+        modelos = entrenar_en_paralelo(tareas, X_train, X_ajuste, logger,
+                                       n_nucleos=n_nucleos, presupuesto=presupuesto)
+        estado = {
+            'fecha_reconstruccion': hoy.isoformat(),
+            'rondas': {nombre: rondas_modelo(m) for nombre, m in modelos.items()},
+        }
+    else:
+        # Filas de train que el booster de ayer no ha visto: resultados
+        # nuevos o partidos que han salido de la ventana de ajuste
+        nuevas = np.array([i not in estado['ids_entrenados'] for i in ids_train], dtype=bool)
+        logger.info(f"  Incremental: {int(nuevas.sum())} filas nuevas, "
+                    f"recalibrando sobre {len(X_ajuste)} de ajuste")
+        modelos = {}
+        directorio = directorio_modelos()
+        previos = ids_vistos(directorio)
+        vistos = None if previos is None else vistos | previos
+        for nombre, tipo, y_train, y_ajuste in tareas:
+            m, segundos = _actualizar_modelo(
+                tipo, cargar_modelo(nombre, nativo=False, directorio=directorio),
+                X_train[nuevas], y_train[nuevas],
+                X_ajuste, y_ajuste, n_nucleos or -1)
+            logger.info(f"  → {nombre}: {segundos:.1f}s")
+            modelos[nombre] = m
+
+    # Versión nueva en el registro: `actual` no cambia hasta que el juego
+    # completo esté escrito, evaluado y promovido; si algo falla antes, la
+    # versión se descarta y no queda en el registro sin promover
+    version, directorio = registro.nueva_version()
+    try:
+        for nombre, m in modelos.items():
+            guardar_modelo(m, nombre, directorio)
+        if vistos is not None:
+            np.save(os.path.join(directorio, ARCHIVO_IDS_VISTOS),
+                    np.array(sorted(vistos), dtype=np.int64))
+
+        m_btts = modelos["modelo_btts"]
+        m_over = modelos["modelo_over25"]
+        m_res = modelos["modelo_resultado"]
+
+        # 6. Evaluar sobre prueba (métricas honestas: ni parada temprana
+        # ni calibración la han visto)
+
+        # Resultado
+        prob_res = m_res.predict_proba(X_prueba)
+        pred_res = prob_res.argmax(axis=1)
+        met_res = calcular_metricas_multiclase(y_res_p, prob_res, pred_res)
+
+        # Extraer cuotas para prueba
+        cuotas_btts = [getattr(p, 'cuota_btts', -1) for p in partidos_prueba]
+        cuotas_over = [getattr(p, 'cuota_over', -1) for p in partidos_prueba]
+
+        # BTTS
+        prob_btts = m_btts.predict_proba(X_prueba)[:, 1]
+        pred_btts = (prob_btts >= 0.5).astype(int)
+        met_btts = calcular_metricas_clasificacion(y_btts_p, prob_btts, pred_btts,
+                                                    cuotas_si=cuotas_btts)
+
+        # Over 2.5
+        prob_over = m_over.predict_proba(X_prueba)[:, 1]
+        pred_over = (prob_over >= 0.5).astype(int)
+        met_over = calcular_metricas_clasificacion(y_over_p, prob_over, pred_over,
+                                                    cuotas_si=cuotas_over)
+
+        # 7. Estado para el próximo entrenamiento incremental. La referencia
+        # de drift es el logloss de la última reconstrucción completa.
+        if modo == 'completo':
+            estado['logloss_referencia'] = {
+                'modelo_btts': met_btts['logloss'],
+                'modelo_over25': met_over['logloss'],
+                'modelo_resultado': met_res['logloss'],
+            }
+        estado.pop('ids_entrenados', None)
+        estado.update(version_features=VERSION_FEATURES, version_modelos=VERSION_MODELOS,
+                      version_registro=version, ultimo_modo=modo,
+                      ultimo_entrenamiento=datetime.now().isoformat(timespec='seconds'))
+
+        metricas = {
+            'resultado': met_res,
+            'btts': met_btts,
+            'over': met_over,
+        }
+        registro.guardar_manifiesto(version, {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'modo': modo,
+            'huella': huella,
+            'n_partidos': len(partidos),
+            'version_features': VERSION_FEATURES,
+            'version_modelos': VERSION_MODELOS,
+            'hiperparametros': cargar_hiperparametros(),
+            'rondas': {nombre: rondas_modelo(m) for nombre, m in modelos.items()},
+            'metricas': metricas,
+        })
+        registro.promover(version, motivo=f"entrenamiento {modo}")
+    except Exception:
+        registro.descartar(version)
+        raise
+
+    _guardar_estado(estado, ids_train)
+    registro.limpiar()
+    _guardar_huella(huella, len(partidos), metricas)
+
+    logger.info(f"✓ Modelos v2 entrenados y promovidos (versión {version}).")
+
+    return metricas
 
 
 # =================================================================
@@ -217,205 +825,179 @@ def crear_modelos(partidos, logger):
 
 # Predecir partido único
 def predecir_partido(partido, optimos, extractor,
-                     m_gl, m_gv, m_btts, m_over, m_res):
+                     m_gl, m_gv, m_btts, m_over, m_res, X=None):
     """
     Predice un partido único usando modelos v2.
     Produce el mismo formato de prediccion dict que v1.
+
+    Si se pasa X (shape (1, 50), p.ej. desde el feature store) no se
+    vuelven a extraer los features.
     """
-    X = extractor.extraer(partido)
+    if X is None:
+        X = extractor.extraer(partido)
 
-    # --- Predicciones base ---
-    pred_gl = round(float(m_gl.predict(X)[0]), 2)
-    pred_gv = round(float(m_gv.predict(X)[0]), 2)
+    base = predecir_base(X, m_gl, m_gv, m_btts, m_over, m_res)
+    partido.prediccion = recomendaciones.predicciones(
+        *base, recomendaciones.matriz_cuotas([partido]), optimos)[0]
 
-    prob_res = m_res.predict_proba(X)[0].astype(float)
-    pred_res = int(prob_res.argmax())
-    prob_res_max = prob_res.max()
 
-    prob_btts = m_btts.predict_proba(X)[0].astype(float)
-    pred_btts_cls = int(prob_btts.argmax())
-    prob_btts_max = prob_btts.max()
+def predecir_base(X, m_gl, m_gv, m_btts, m_over, m_res):
+    """
+    Salidas de los 5 modelos base para todas las filas de X, con una
+    sola llamada por modelo.
 
-    prob_over = m_over.predict_proba(X)[0].astype(float)
-    pred_over_cls = int(prob_over.argmax())
-    prob_over_max = prob_over.max()
+    Returns:
+        (goles_local, goles_visitante, prob_res, prob_btts, prob_over)
+    """
+    return (m_gl.predict(X), m_gv.predict(X), m_res.predict_proba(X),
+            m_btts.predict_proba(X), m_over.predict_proba(X))
 
-    # --- Umbrales ---
-    def _u(strat, mercado):
-        return optimos[strat][mercado]['umbral_prob']
 
-    def _m(strat, mercado):
-        return optimos[strat][mercado]['margen']
+# Huella de entrada por partido: si no cambia, la predicción tampoco
+RUTA_HUELLAS_PREDICCION = os.path.join(BASE_DIR, 'datos', 'cache', 'huellas_prediccion.json')
 
-    def get_rec(prob, u_con, u_mod, u_agr):
-        return {
-            'conservadora': int(prob >= u_con) if u_con is not None else 0,
-            'moderada':     int(prob >= u_mod) if u_mod is not None else 0,
-            'arriesgada':   int(prob >= u_agr) if u_agr is not None else 0,
-        }
 
-    # --- Recomendaciones por probabilidad ---
-    cl = float(partido.cuota_local)
-    ce = float(partido.cuota_empate)
-    cv = float(partido.cuota_visitante)
-    cbtts = float(partido.cuota_btts)
-    cbtts_n = float(partido.cuota_btts_no)
-    co = float(partido.cuota_over)
-    cu = float(partido.cuota_under)
-
-    if cl <= 1.0 or ce <= 1.0 or cv <= 1.0:
-        rec_res = get_rec(0, 1, 1, 1)
-    else:
-        rec_res = get_rec(prob_res_max, _u('conservador', 'resultado'),
-                          _u('moderado', 'resultado'), _u('agresivo', 'resultado'))
+def _huella_optimos(optimos):
+    return hashlib.sha256(json.dumps(optimos, sort_keys=True).encode()).hexdigest()
 
-    if cbtts <= 1.0 or cbtts_n <= 1.0:
-        rec_btts = get_rec(0, 1, 1, 1)
-    else:
-        rec_btts = get_rec(prob_btts_max, _u('conservador', 'btts'),
-                           _u('moderado', 'btts'), _u('agresivo', 'btts'))
 
-    if co <= 1.0 or cu <= 1.0:
-        rec_over = get_rec(0, 1, 1, 1)
-    else:
-        rec_over = get_rec(prob_over_max, _u('conservador', 'over'),
-                           _u('moderado', 'over'), _u('agresivo', 'over'))
-
-    # --- Value Betting ---
-    def check_value(prob_modelo, cuota, tipo, strat):
-        if cuota <= 1.0:
-            return False
-        implied = 1.0 / cuota
-        margen = _m(strat, tipo)
-        if margen is None:
-            return False
-        return (prob_modelo - implied) >= margen
-
-    # Resultado value
-    cuotas_1x2 = [ce, cl, cv]  # 0=empate, 1=local, 2=visitante
-    cuota_pred_res = cuotas_1x2[pred_res] if all(c > 1 for c in cuotas_1x2) else 0
-
-    if cuota_pred_res > 1:
-        for strat, key in [('conservador', 'conservadora'),
-                           ('moderado', 'moderada'),
-                           ('agresivo', 'arriesgada')]:
-            if not check_value(prob_res[pred_res], cuota_pred_res, 'resultado', strat):
-                if cl != -1:
-                    rec_res[key] = 0
-
-    # BTTS value
-    cuota_pred_btts = cbtts if pred_btts_cls == 1 else cbtts_n
-    if cuota_pred_btts > 1:
-        for strat, key in [('conservador', 'conservadora'),
-                           ('moderado', 'moderada'),
-                           ('agresivo', 'arriesgada')]:
-            if not check_value(prob_btts[pred_btts_cls], cuota_pred_btts, 'btts', strat):
-                if cbtts != -1:
-                    rec_btts[key] = 0
-
-    # Over value
-    cuota_pred_over = co if pred_over_cls == 1 else cu
-    if cuota_pred_over > 1:
-        for strat, key in [('conservador', 'conservadora'),
-                           ('moderado', 'moderada'),
-                           ('agresivo', 'arriesgada')]:
-            if not check_value(prob_over[pred_over_cls], cuota_pred_over, 'over', strat):
-                if co != -1:
-                    rec_over[key] = 0
-
-    # --- Predicción final (mismo formato que v1) ---
-    prediccion = {
-        'goles_esperados': {'local': pred_gl, 'visitante': pred_gv},
-        'resultado_1x2': {
-            'prediccion': ['Empate', 'Local', 'Visitante'][pred_res],
-            'probabilidades': {
-                'local': float(prob_res[1]),
-                'empate': float(prob_res[0]),
-                'visitante': float(prob_res[2])
-            },
-            'probabilidad_max': float(prob_res_max),
-            'recomendacion': rec_res
-        },
-        'btts': {
-            'prediccion': 'Sí' if pred_btts_cls == 1 else 'No',
-            'probabilidad': float(prob_btts[pred_btts_cls]),
-            'recomendacion': rec_btts
-        },
-        'over25': {
-            'prediccion': 'Over' if pred_over_cls == 1 else 'Under',
-            'probabilidad': float(prob_over[pred_over_cls]),
-            'recomendacion': rec_over
-        }
-    }
+def huellas_prediccion(X, cuotas, version, h_optimos):
+    """
+    Huella de las entradas de cada partido: fila de features, cuotas,
+    versión de los modelos y umbrales (hash de umbrales_v2.json).
+    """
+    comun = f"{version}|{h_optimos}|".encode()
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    cuotas = np.ascontiguousarray(cuotas, dtype=np.float64)
+    return [hashlib.sha256(comun + X[i].tobytes() + cuotas[i].tobytes()).hexdigest()
+            for i in range(len(X))]
 
-    partido.prediccion = prediccion
 
+def _cargar_huellas_prediccion():
+    try:
+        with open(RUTA_HUELLAS_PREDICCION, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
 
-def predecir_lista_partidos(partidos, optimos):
+
+def _guardar_huellas_prediccion(datos):
+    os.makedirs(os.path.dirname(RUTA_HUELLAS_PREDICCION), exist_ok=True)
+    tmp = RUTA_HUELLAS_PREDICCION + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(datos, f)
+    os.replace(tmp, RUTA_HUELLAS_PREDICCION)
+
+
+def predecir_lista_partidos(partidos, optimos, forzar=False):
     """
     Predice todos los partidos usando modelos v2.
     Misma firma que v1 para swap limpio.
-    """
-    partidos_predecir = []
 
-    # Cargar modelos v2
-    m_gl = cargar_modelo("modelo_goles_local")
-    m_gv = cargar_modelo("modelo_goles_visitante")
-    m_btts = cargar_modelo("modelo_btts")
-    m_over = cargar_modelo("modelo_over25")
-    m_res = cargar_modelo("modelo_resultado")
+    Solo se recalculan (y se reescriben en SQL) los partidos cuya huella
+    de entrada (ver huellas_prediccion) cambió desde la última ejecución;
+    el resto reutiliza su predicción anterior. forzar=True recalcula todo.
 
-    # Crear FeatureExtractor
+    Returns:
+        Nº de partidos recalculados
+    """
+    # FeatureExtractor con índices persistidos y features desde el store
     todos = cargar_partidos()
-    extractor = FeatureExtractor(todos)
-
-    for p in partidos:
-        predecir_partido(p, optimos, extractor,
-                         m_gl, m_gv, m_btts, m_over, m_res)
-        partidos_predecir.append(p)
-
-    guardar_partidos_predecidos(partidos_predecir)
+    extractor = cargar_extractor(todos)
+    X = FeatureStore().matriz(extractor, partidos)
+    cuotas = recomendaciones.matriz_cuotas(partidos)
+
+    version = registro.version_actual() or 'sin_registro'
+    huellas = huellas_prediccion(X, cuotas, version, _huella_optimos(optimos))
+    previas = {} if forzar else _cargar_huellas_prediccion()
+
+    cambiados = []
+    for i, p in enumerate(partidos):
+        previa = previas.get(str(p.id_partido))
+        if previa is not None and previa['huella'] == huellas[i]:
+            p.prediccion = previa['prediccion']
+        else:
+            cambiados.append(i)
+
+    # Inferencia por lotes: una llamada por modelo para los partidos
+    # cambiados y recomendaciones vectorizadas sobre todos los mercados
+    if cambiados:
+        # Cargar modelos v2 (todos de la misma versión del registro)
+        directorio = directorio_modelos()
+        m_gl = cargar_modelo("modelo_goles_local", directorio=directorio)
+        m_gv = cargar_modelo("modelo_goles_visitante", directorio=directorio)
+        m_btts = cargar_modelo("modelo_btts", directorio=directorio)
+        m_over = cargar_modelo("modelo_over25", directorio=directorio)
+        m_res = cargar_modelo("modelo_resultado", directorio=directorio)
+
+        base = predecir_base(X[cambiados], m_gl, m_gv, m_btts, m_over, m_res)
+        preds = recomendaciones.predicciones(*base, cuotas[cambiados], optimos)
+        for i, prediccion in zip(cambiados, preds):
+            partidos[i].prediccion = prediccion
+
+    # Las huellas solo se guardan si SQL tiene ya estas predicciones: si
+    # la escritura falla, los cambiados se vuelven a enviar la próxima vez
+    if guardar_partidos_predecidos(partidos, [partidos[i] for i in cambiados]):
+        _guardar_huellas_prediccion({
+            str(p.id_partido): {'huella': huellas[i], 'prediccion': p.prediccion}
+            for i, p in enumerate(partidos)
+        })
+    return len(cambiados)
 
 
 # =================================================================
 # UTILIDADES (copiadas de v1 para independencia total)
 # =================================================================
 
-def guardar_partidos_predecidos(partidos):
-    """Guarda los partidos predecidos en pickle + SQL (dual write)."""
-    fecha_actual = date.today()
-    ruta = os.path.join(BASE_DIR, 'datos', 'archivo',
-                        f'{fecha_actual.strftime("%Y_%m_%d")}__partidos_predecidos.pkl')
-    with open(ruta, 'wb') as f:
-        pickle.dump(partidos, f)
+def guardar_partidos_predecidos(partidos, cambiados=None):
+    """
+    Archiva las predicciones del día (snapshot columnar, ver
+    archivo_predicciones) + SQL (dual write). En SQL solo se escriben
+    `cambiados` (None = todos).
+
+    Returns:
+        True si la escritura en SQL se ha confirmado
+    """
+    archivo_predicciones.guardar(partidos, date.today(), registro.version_actual())
 
     # Dual Write → SQL
     try:
         from services.persistence.db_persistence import guardar_predicciones_en_bd
-        guardar_predicciones_en_bd(partidos)
+        guardado = guardar_predicciones_en_bd(partidos if cambiados is None else cambiados)
     except Exception as e:
+        guardado = False
         import logging
         logging.getLogger(__name__).warning(f"Warning: Could not save predictions to SQL: {e}")
+    return bool(guardado)
+
+
+def _cargar_pickle_predecidos(fecha_str):
+    """Formato anterior: pickle con los Partido completos."""
+    ruta = os.path.join(BASE_DIR, 'datos', 'archivo',
+                        f'{fecha_str}__partidos_predecidos.pkl')
+    with open(ruta, 'rb') as f:
+        return pickle.load(f)
 
 
 def cargar_partidos_predecidos(fecha):
-    """Carga partidos predecidos desde pickle. Acepta date o string."""
+    """
+    Carga los partidos predecidos de un día (Partido completos con las
+    cuotas y la predicción archivadas). Acepta date o string AAAA_MM_DD.
+    Los días anteriores al archivo columnar se leen del pickle.
+    """
     if isinstance(fecha, str):
         fecha_str = fecha
     else:
         fecha_str = fecha.strftime("%Y_%m_%d")
-    ruta = os.path.join(BASE_DIR, 'datos', 'archivo',
-                        f'{fecha_str}__partidos_predecidos.pkl')
-    with open(ruta, 'rb') as f:
-        return pickle.load(f)
+    archivadas = archivo_predicciones.predicciones(fecha_str)
+    if archivadas is None:
+        return _cargar_pickle_predecidos(fecha_str)
+    return archivo_predicciones.hidratar(archivadas, cargar_partidos())
 
 
 def cargar_partidos_predecidos_string(fecha):
     """Carga partidos predecidos con fecha como string YYYY_mm_dd."""
-    ruta = os.path.join(BASE_DIR, 'datos', 'archivo',
-                        f'{fecha}__partidos_predecidos.pkl')
-    with open(ruta, 'rb') as f:
-        return pickle.load(f)
+    return cargar_partidos_predecidos(fecha)
 
 
 def obtener_partidos_a_predecir_10(partidos_a_predecir):
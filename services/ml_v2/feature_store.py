@@ -0,0 +1,208 @@
+"""
+Feature Store v2 para RDScore.
+
+Guarda en disco (npz) las filas de features ya calculadas, indexadas por
+id de partido y versión del FeatureExtractor, para que entrenamiento,
+predicción, meta-modelos, optimización de umbrales y benchmarks no
+recalculen los mismos 50 features desde cero en cada ejecución.
+
+Invalidación:
+- Si cambia VERSION_FEATURES se descarta todo el store.
+- Si cambia el conjunto de partidos FT (nuevos resultados, correcciones),
+  se invalidan solo las filas de partidos de los equipos afectados con
+  fecha posterior al cambio (los features solo miran fechas anteriores).
+- Si cambian fecha/equipos/liga/temporada de un partido, se recalcula su fila.
+"""
+
+import os
+import numpy as np
+
+from config import BASE_DIR
+from services.ml_v2.features import FeatureExtractor, VERSION_FEATURES, _parse_fecha
+
+RUTA_STORE = os.path.join(BASE_DIR, 'datos', 'cache', 'features_v2.npz')
+RUTA_INDICES = os.path.join(BASE_DIR, 'datos', 'cache', 'indices_features_v2.pkl')
+
+N_FEATURES = 50
+
+
+def _firma_fila(partido):
+    """Datos del propio partido de los que depende su vector de features."""
+    fecha = _parse_fecha(partido.fecha)
+    return (
+        fecha.toordinal() if fecha else 0,
+        int(partido.equipo_local.id),
+        int(partido.equipo_visitante.id),
+        int(partido.id_liga),
+        int(partido.temporada),
+    )
+
+
+class FeatureStore:
+    """
+    Caché persistente de vectores de features por partido.
+
+    Uso:
+        store = FeatureStore()
+        X = store.matriz(extractor, partidos)   # calcula solo lo que falta
+    """
+
+    def __init__(self, ruta=None, version=VERSION_FEATURES):
+        self.ruta = ruta or RUTA_STORE
+        self.version = version
+        self._cargar()
+
+    # =================================================================
+    # PERSISTENCIA
+    # =================================================================
+
+    def _vaciar(self):
+        self.filas = {}       # id_partido -> (firma_fila, vector)
+        self.firmas_ft = {}   # id_partido -> firma FT usada al calcular
+
+    def _cargar(self):
+        self._vaciar()
+        if not os.path.exists(self.ruta):
+            return
+        try:
+            with np.load(self.ruta) as d:
+                if int(d['version']) != self.version:
+                    return
+                ids = d['ids']
+                firmas = d['firmas_filas']
+                X = d['X'].astype(np.float32, copy=False)
+                ft_ids = d['ft_ids']
+                ft_firmas = d['ft_firmas']
+        except Exception:
+            return  # Store corrupto → se reconstruye
+
+        for i, id_p in enumerate(ids.tolist()):
+            self.filas[id_p] = (tuple(firmas[i].tolist()), X[i])
+        for i, id_p in enumerate(ft_ids.tolist()):
+            self.firmas_ft[id_p] = tuple(ft_firmas[i].tolist())
+
+    def guardar(self):
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        ids = list(self.filas.keys())
+        ft_ids = list(self.firmas_ft.keys())
+
+        if ids:
+            firmas = np.array([self.filas[i][0] for i in ids], dtype=np.int64)
+            X = np.vstack([self.filas[i][1] for i in ids])
+        else:
+            firmas = np.zeros((0, 5), dtype=np.int64)
+            X = np.zeros((0, N_FEATURES), dtype=np.float32)
+
+        ft_firmas = (np.array([self.firmas_ft[i] for i in ft_ids], dtype=np.int64)
+                     if ft_ids else np.zeros((0, 7), dtype=np.int64))
+
+        # Escritura atómica: nunca dejar un store a medio escribir
+        tmp = self.ruta + '.tmp.npz'
+        np.savez(tmp,
+                 version=np.array(self.version),
+                 ids=np.array(ids, dtype=np.int64),
+                 firmas_filas=firmas,
+                 X=X,
+                 ft_ids=np.array(ft_ids, dtype=np.int64),
+                 ft_firmas=ft_firmas)
+        os.replace(tmp, self.ruta)
+
+    # =================================================================
+    # INVALIDACIÓN
+    # =================================================================
+
+    def _sincronizar(self, extractor):
+        """
+        Compara el historial FT del extractor con el usado para calcular
+        el store e invalida las filas afectadas. Devuelve nº de filas borradas.
+        """
+        actuales = extractor.firmas_ft
+        if actuales == self.firmas_ft:
+            return 0
+
+        # Equipo → fecha más antigua con algún cambio
+        sucio = {}
+        for id_p in set(actuales) | set(self.firmas_ft):
+            antes = self.firmas_ft.get(id_p)
+            ahora = actuales.get(id_p)
+            if antes == ahora:
+                continue
+            for firma in (antes, ahora):
+                if firma is None:
+                    continue
+                fecha, id_l, id_v = firma[0], firma[1], firma[2]
+                for equipo in (id_l, id_v):
+                    if fecha < sucio.get(equipo, fecha + 1):
+                        sucio[equipo] = fecha
+
+        borrar = []
+        for id_p, (firma, _) in self.filas.items():
+            fecha, id_l, id_v = firma[0], firma[1], firma[2]
+            if id_l in sucio and fecha > sucio[id_l]:
+                borrar.append(id_p)
+            elif id_v in sucio and fecha > sucio[id_v]:
+                borrar.append(id_p)
+        for id_p in borrar:
+            del self.filas[id_p]
+
+        self.firmas_ft = dict(actuales)
+        return len(borrar)
+
+    # =================================================================
+    # CONSULTA
+    # =================================================================
+
+    def matriz(self, extractor, partidos, guardar=True, n_procesos=None):
+        """
+        Devuelve la matriz de features float32 (n, 50) de `partidos`, en el
+        mismo orden, calculando con `extractor` solo las filas que faltan o
+        han quedado invalidadas.
+
+        Args:
+            extractor: FeatureExtractor con el historial a usar
+            partidos: Lista de objetos Partido
+            guardar: Persistir el store si ha habido cambios
+            n_procesos: Procesos para calcular las filas pendientes
+                        (ver FeatureExtractor.extraer_lote_paralelo)
+        """
+        invalidadas = self._sincronizar(extractor)
+
+        X = np.empty((len(partidos), N_FEATURES), dtype=np.float32)
+        pendientes = []   # (fila en X, partido, firma)
+        for i, p in enumerate(partidos):
+            id_p = int(p.id_partido)
+            firma = _firma_fila(p)
+            cache = self.filas.get(id_p) if id_p > 0 else None
+            if cache is not None and cache[0] == firma:
+                X[i] = cache[1]
+            else:
+                pendientes.append((i, p, firma))
+
+        nuevas = 0
+        if pendientes:
+            X_nuevas, ids = extractor.extraer_lote_paralelo(
+                [p for _, p, _ in pendientes], n_procesos=n_procesos)
+            for k, (i, _, firma) in enumerate(pendientes):
+                X[i] = X_nuevas[k]
+                if ids[k] > 0:
+                    self.filas[int(ids[k])] = (firma, X_nuevas[k])
+                    nuevas += 1
+
+        self.ultimas_calculadas = nuevas
+        if guardar and (nuevas or invalidadas):
+            self.guardar()
+        return X
+
+
+def obtener_matriz(extractor, partidos, ruta=None):
+    """Atajo: matriz de features de `partidos` servida desde el store."""
+    return FeatureStore(ruta).matriz(extractor, partidos)
+
+
+def cargar_extractor(todos, ruta=None, guardar=True):
+    """
+    FeatureExtractor con índices persistidos entre ejecuciones: solo se
+    procesan los partidos nuevos o modificados desde la última vez.
+    Con guardar=False no escribe nunca el estado (p.ej. procesos web).
+    """
+    return FeatureExtractor.desde_estado(todos, ruta or RUTA_INDICES, guardar=guardar)
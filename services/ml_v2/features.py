@@ -11,8 +11,28 @@ Total: 52 features (vs 30 en v1)
 
 from datetime import datetime
 from collections import defaultdict
+from bisect import bisect_left, insort
+from functools import lru_cache
+import multiprocessing as mp
+import os
+import pickle
+import tempfile
 import numpy as np
 
+# Subir cuando cambie el cálculo de cualquier feature: invalida las
+# cachés (feature store, índices persistidos) de la versión anterior.
+VERSION_FEATURES = 2
+
+# Formato del estado persistido por guardar_estado (solo ids, sin objetos)
+FORMATO_ESTADO = 2
+
+# Por debajo de este nº de partidos no compensa arrancar procesos
+MIN_PARTIDOS_PARALELO = 2000
+
+# Estado que heredan los procesos hijo al hacer fork (copy-on-write):
+# el extractor con sus índices ya construidos y la lista de partidos.
+_COMPARTIDO = {}
+
 
 def _safe(x):
     """Convierte a float seguro."""
@@ -24,14 +44,49 @@ def _safe(x):
         return 0.0
 
 
+@lru_cache(maxsize=8192)
 def _parse_fecha(fecha_str):
-    """Convierte 'dd/mm/YYYY' a datetime.date."""
+    """Convierte 'dd/mm/YYYY' a datetime.date (cacheado: las fechas se repiten)."""
     try:
         return datetime.strptime(fecha_str, "%d/%m/%Y").date()
     except (ValueError, TypeError):
         return None
 
 
+def _firma_ft(p, fecha):
+    """
+    Datos de un partido FT que entran en los índices:
+    (fecha, local, visitante, liga, temporada, goles_local, goles_visitante).
+    """
+    return (
+        fecha.toordinal(),
+        int(p.equipo_local.id),
+        int(p.equipo_visitante.id),
+        int(p.id_liga),
+        int(p.temporada),
+        int(p.goles_local),
+        int(p.goles_visitante),
+    )
+
+
+def _orden_entrada(entrada):
+    """
+    Orden de las entradas de los índices: fecha y, a igualdad de fecha,
+    id de partido. Así el orden no depende del orden de llegada y
+    `actualizar` deja los índices igual que una construcción completa.
+    """
+    return (entrada[0], int(entrada[1].id_partido))
+
+
+def _extraer_trozo(tarea):
+    """Worker: extrae un rango [inicio, fin) de la lista compartida."""
+    inicio, fin, columnas, dtype = tarea
+    extractor = _COMPARTIDO['extractor']
+    partidos = _COMPARTIDO['partidos']
+    X, _ = extractor.extraer_lote(partidos[inicio:fin], columnas, dtype)
+    return inicio, X
+
+
 class FeatureExtractor:
     """
     Extrae features mejorados para predicción de partidos.
@@ -48,19 +103,33 @@ class FeatureExtractor:
         Args:
             todos_los_partidos: Lista de objetos Partido (de partidos.pkl)
         """
-        self.partidos_ft = [p for p in todos_los_partidos if p.estado == "FT"]
+        self._vaciar()
+        self._set_partidos_ft(todos_los_partidos)
         self._build_indices()
 
-    def _build_indices(self):
-        """Construye índices para búsqueda rápida por equipo y H2H."""
+    def _vaciar(self):
+        self.partidos_ft = []
+        self._posiciones = {}  # id_partido -> posición en partidos_ft
         self.por_equipo = defaultdict(list)
         self.h2h_index = defaultdict(list)
+        self.firmas_ft = {}    # id_partido -> firma de lo indexado
+        self._indexados = {}   # id_partido -> (fecha, partido)
+
+    def _set_partidos_ft(self, todos_los_partidos):
+        self.partidos_ft = [p for p in todos_los_partidos if p.estado == "FT"]
+        self._posiciones = {int(p.id_partido): i for i, p in enumerate(self.partidos_ft)}
+
+    def _build_indices(self):
+        """Construye índices para búsqueda rápida por equipo y H2H."""
 
         for p in self.partidos_ft:
             fecha = _parse_fecha(p.fecha)
             if fecha is None:
                 continue
 
+            self.firmas_ft[int(p.id_partido)] = _firma_ft(p, fecha)
+            self._indexados[int(p.id_partido)] = (fecha, p)
+
             id_l = p.equipo_local.id
             id_v = p.equipo_visitante.id
 
@@ -73,9 +142,200 @@ class FeatureExtractor:
 
         # Ordenar por fecha para iterar eficientemente
         for k in self.por_equipo:
-            self.por_equipo[k].sort(key=lambda x: x[0])
+            self.por_equipo[k].sort(key=_orden_entrada)
         for k in self.h2h_index:
-            self.h2h_index[k].sort(key=lambda x: x[0])
+            self.h2h_index[k].sort(key=_orden_entrada)
+
+    # =================================================================
+    # ACTUALIZACIÓN INCREMENTAL Y PERSISTENCIA
+    # =================================================================
+
+    def actualizar(self, nuevos_partidos):
+        """
+        Incorpora partidos a los índices sin reconstruirlos.
+
+        - FT nuevos: se insertan en su posición (por fecha) en por_equipo
+          y h2h_index.
+        - FT ya indexados con datos distintos (p.ej. marcador corregido):
+          se sustituye la entrada.
+        - Partidos indexados que ya no están FT: se retiran.
+        Los partidos sin cambios se ignoran.
+
+        Returns:
+            Nº de partidos añadidos, modificados o retirados
+        """
+        cambios = 0
+        for p in nuevos_partidos:
+            id_p = int(p.id_partido)
+            fecha = _parse_fecha(p.fecha) if p.estado == "FT" else None
+            firma = _firma_ft(p, fecha) if fecha is not None else None
+            if firma == self.firmas_ft.get(id_p):
+                continue
+
+            if id_p in self._indexados:
+                self._quitar(id_p)
+            if firma is not None:
+                self._insertar(p, fecha)
+            elif p.estado == "FT":
+                self._anotar_ft(p)  # FT sin fecha: no se indexa
+            cambios += 1
+        return cambios
+
+    def sincronizar(self, todos_los_partidos):
+        """
+        Deja los índices como si se hubieran construido desde
+        `todos_los_partidos`: aplica `actualizar` y retira los partidos
+        indexados que ya no aparecen. Returns: nº de cambios.
+        """
+        cambios = self.actualizar(todos_los_partidos)
+        presentes = {int(p.id_partido) for p in todos_los_partidos}
+        for id_p in [i for i in self._indexados if i not in presentes]:
+            self._quitar(id_p)
+            cambios += 1
+        return cambios
+
+    def _insertar(self, p, fecha):
+        id_p = int(p.id_partido)
+        id_l = p.equipo_local.id
+        id_v = p.equipo_visitante.id
+
+        insort(self.por_equipo[id_l], (fecha, p, 'home'), key=_orden_entrada)
+        insort(self.por_equipo[id_v], (fecha, p, 'away'), key=_orden_entrada)
+        key = (min(id_l, id_v), max(id_l, id_v))
+        insort(self.h2h_index[key], (fecha, p), key=_orden_entrada)
+
+        self._anotar_ft(p)
+        self.firmas_ft[id_p] = _firma_ft(p, fecha)
+        self._indexados[id_p] = (fecha, p)
+
+    def _quitar(self, id_p):
+        fecha, viejo = self._indexados.pop(id_p)
+        del self.firmas_ft[id_p]
+
+        id_l = viejo.equipo_local.id
+        id_v = viejo.equipo_visitante.id
+        for lista in (self.por_equipo[id_l], self.por_equipo[id_v],
+                      self.h2h_index[(min(id_l, id_v), max(id_l, id_v))]):
+            # Las listas están ordenadas por (fecha, id): búsqueda binaria
+            i = bisect_left(lista, (fecha, id_p), key=_orden_entrada)
+            while i < len(lista) and lista[i][1] is not viejo:
+                i += 1
+            if i < len(lista):
+                del lista[i]
+        self._retirar_ft(id_p)
+
+    def _anotar_ft(self, p):
+        """Añade (o sustituye) `p` en partidos_ft."""
+        id_p = int(p.id_partido)
+        pos = self._posiciones.get(id_p)
+        if pos is None:
+            self._posiciones[id_p] = len(self.partidos_ft)
+            self.partidos_ft.append(p)
+        else:
+            self.partidos_ft[pos] = p
+
+    def _retirar_ft(self, id_p):
+        """Quita el partido de partidos_ft en O(1): el último ocupa su hueco."""
+        pos = self._posiciones.pop(id_p, None)
+        if pos is None:
+            return
+        ultimo = self.partidos_ft.pop()
+        if pos < len(self.partidos_ft):
+            self.partidos_ft[pos] = ultimo
+            self._posiciones[int(ultimo.id_partido)] = pos
+
+    def guardar_estado(self, ruta):
+        """
+        Persiste los índices para no reconstruirlos en la próxima ejecución.
+        Solo se guardan ids, firmas y el orden de cada índice: los objetos
+        Partido ya están en partidos.pkl y se resuelven al cargar.
+        """
+        estado = {
+            'version': VERSION_FEATURES,
+            'formato': FORMATO_ESTADO,
+            'firmas_ft': self.firmas_ft,
+            'por_equipo': {k: [(int(p.id_partido), ub) for _, p, ub in v]
+                           for k, v in self.por_equipo.items() if v},
+            'h2h_index': {k: [int(p.id_partido) for _, p in v]
+                          for k, v in self.h2h_index.items() if v},
+        }
+        directorio = os.path.dirname(ruta)
+        os.makedirs(directorio, exist_ok=True)
+        # tmp único: varios procesos pueden guardar a la vez
+        fd, tmp = tempfile.mkstemp(dir=directorio, prefix=os.path.basename(ruta) + '.',
+                                   suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(estado, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, ruta)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @classmethod
+    def desde_estado(cls, todos_los_partidos, ruta, guardar=True):
+        """
+        Carga los índices persistidos en `ruta` y les aplica solo las
+        diferencias con `todos_los_partidos` (normalmente los resultados
+        del día anterior). Si no hay estado válido, construye desde cero.
+
+        Los partidos cuya firma no ha cambiado se recolocan en el orden
+        guardado, sin volver a ordenar; solo los nuevos o modificados se
+        insertan. Con `guardar`, el estado se vuelve a escribir si ha
+        cambiado algo (guardar=False = solo lectura).
+        """
+        estado = None
+        if os.path.exists(ruta):
+            try:
+                with open(ruta, 'rb') as f:
+                    estado = pickle.load(f)
+            except Exception:
+                estado = None  # Estado corrupto → reconstruir
+
+        if (estado is None or estado.get('version') != VERSION_FEATURES
+                or estado.get('formato') != FORMATO_ESTADO):
+            extractor = cls(todos_los_partidos)
+            if guardar:
+                extractor.guardar_estado(ruta)
+            return extractor
+
+        extractor = cls.__new__(cls)
+        extractor._vaciar()
+        extractor._set_partidos_ft(todos_los_partidos)
+        guardadas = estado['firmas_ft']
+
+        # Una sola pasada: partidos sin cambios y partidos a insertar
+        vigentes = {}   # id_partido -> (fecha, partido)
+        cambiados = []
+        for p in extractor.partidos_ft:
+            fecha = _parse_fecha(p.fecha)
+            if fecha is None:
+                continue
+            id_p = int(p.id_partido)
+            firma = _firma_ft(p, fecha)
+            if firma == guardadas.get(id_p):
+                vigentes[id_p] = (fecha, p)
+                extractor.firmas_ft[id_p] = firma
+            else:
+                cambiados.append((p, fecha))
+
+        for k, entradas in estado['por_equipo'].items():
+            lista = [(vigentes[i][0], vigentes[i][1], ub) for i, ub in entradas if i in vigentes]
+            if lista:
+                extractor.por_equipo[k] = lista
+        for k, ids in estado['h2h_index'].items():
+            lista = [vigentes[i] for i in ids if i in vigentes]
+            if lista:
+                extractor.h2h_index[k] = lista
+        extractor._indexados = vigentes
+
+        for p, fecha in cambiados:
+            extractor._insertar(p, fecha)
+
+        if guardar and (cambiados or len(vigentes) != len(guardadas)):
+            extractor.guardar_estado(ruta)
+        return extractor
 
     # =================================================================
     # FUNCIONES DE CONSULTA HISTÓRICA
@@ -272,6 +532,84 @@ class FeatureExtractor:
         Returns:
             np.array shape (1, 50)
         """
+        return np.array(self._valores(partido)).reshape(1, -1)
+
+    def extraer_lote(self, partidos, columnas=None, dtype=np.float32):
+        """
+        Extrae los features de muchos partidos sobre una matriz preasignada,
+        sin crear un array intermedio por partido.
+
+        Args:
+            partidos: Lista de objetos Partido
+            columnas: Subconjunto opcional de columnas (nombres de
+                      FEATURE_NAMES o índices), en el orden deseado
+            dtype: Tipo de la matriz (float64 da los mismos valores que extraer)
+
+        Returns:
+            (X, ids): X shape (n, n_columnas) y ids[i] = id_partido de la fila i
+        """
+        idx = self._indices_columnas(columnas)
+        n_cols = self.n_features if idx is None else len(idx)
+
+        X = np.empty((len(partidos), n_cols), dtype=dtype)
+        ids = np.empty(len(partidos), dtype=np.int64)
+
+        for i, p in enumerate(partidos):
+            fila = self._valores(p)
+            X[i] = fila if idx is None else [fila[j] for j in idx]
+            ids[i] = p.id_partido
+
+        return X, ids
+
+    def extraer_lote_paralelo(self, partidos, columnas=None, dtype=np.float32,
+                              n_procesos=None, tam_trozo=None):
+        """
+        Igual que extraer_lote, repartiendo los partidos en trozos entre
+        varios procesos. Los índices (por_equipo, h2h_index) se construyen
+        una sola vez en el proceso padre y los hijos los heredan por fork
+        sin copiarlos ni serializarlos.
+
+        Si no hay fork (Windows), hay 1 núcleo o pocos partidos, se hace
+        en serie. El resultado es idéntico al de extraer_lote.
+
+        Args:
+            n_procesos: Nº de procesos (por defecto, todos los núcleos)
+            tam_trozo: Partidos por tarea (por defecto ~4 tareas por proceso)
+        """
+        n_procesos = n_procesos or os.cpu_count() or 1
+        if (n_procesos <= 1 or len(partidos) < MIN_PARTIDOS_PARALELO
+                or 'fork' not in mp.get_all_start_methods()):
+            return self.extraer_lote(partidos, columnas, dtype)
+
+        n = len(partidos)
+        tam_trozo = tam_trozo or max(1, -(-n // (n_procesos * 4)))
+        tareas = [(i, min(i + tam_trozo, n), columnas, dtype)
+                  for i in range(0, n, tam_trozo)]
+
+        idx = self._indices_columnas(columnas)
+        X = np.empty((n, self.n_features if idx is None else len(idx)), dtype=dtype)
+        ids = np.fromiter((p.id_partido for p in partidos), dtype=np.int64, count=n)
+
+        _COMPARTIDO['extractor'] = self
+        _COMPARTIDO['partidos'] = partidos
+        try:
+            with mp.get_context('fork').Pool(n_procesos) as pool:
+                for inicio, bloque in pool.imap_unordered(_extraer_trozo, tareas):
+                    X[inicio:inicio + len(bloque)] = bloque
+        finally:
+            _COMPARTIDO.clear()
+
+        return X, ids
+
+    def _indices_columnas(self, columnas):
+        """Convierte nombres/índices de columnas a lista de índices (None = todas)."""
+        if columnas is None:
+            return None
+        return [self.FEATURE_NAMES.index(c) if isinstance(c, str) else int(c)
+                for c in columnas]
+
+    def _valores(self, partido):
+        """Lista con los 50 valores de features de un partido."""
         el = partido.equipo_local
         ev = partido.equipo_visitante
         fecha = _parse_fecha(partido.fecha)
@@ -362,8 +700,7 @@ class FeatureExtractor:
         ]
 
         # --- VECTOR FINAL: 20+26+4 = 50 features ---
-        X = acumulados + historicos + buckets
-        return np.array(X).reshape(1, -1)
+        return acumulados + historicos + buckets
 
     @property
     def n_features(self):
@@ -9,12 +9,13 @@ Mejoras sobre v1:
 """
 
 import os
-import math
 import pickle
 import numpy as np
 import lightgbm as lgb
 from sklearn.model_selection import TimeSeriesSplit
 from config import BASE_DIR
+from services.ml_v2 import recomendaciones
+from services.ml_v2.recomendaciones import CUOTAS
 
 MODELOS_DIR = os.path.join(BASE_DIR, 'meta_modelos_v2')
 
@@ -40,183 +41,179 @@ def cargar(nombre):
 # FEATURE ENGINEERING PARA META-MODELOS
 # =================================================================
 
-def _features_resultado(p_dict):
-    """Features del meta-modelo para mercado Resultado 1X2."""
-    probs = p_dict["prediccion"]["resultado_1x2"]["probabilidades"]
-    prob_l = probs["local"]
-    prob_e = probs["empate"]
-    prob_v = probs["visitante"]
-
-    probs_sorted = sorted([prob_l, prob_e, prob_v], reverse=True)
-    prob_max = probs_sorted[0]
-    prob_gap = prob_max - probs_sorted[1]
-    entropy = -sum(p * math.log(p + 1e-9) for p in [prob_l, prob_e, prob_v])
-
-    pred = p_dict["prediccion"]["resultado_1x2"]["prediccion"]
-    if pred == "Local":
-        cuota = float(p_dict["cuota_local"])
-    elif pred == "Empate":
-        cuota = float(p_dict["cuota_empate"])
-    elif pred == "Visitante":
-        cuota = float(p_dict["cuota_visitante"])
-    else:
-        return None
-
-    if cuota <= 1.0:
-        return None
-
-    implied = 1.0 / cuota
+# Todas las funciones trabajan sobre arrays con una fila por partido
+# (ver _columnas); en vez de None, devuelven una máscara `validos` con
+# las filas que tienen predicción reconocible y cuota > 1.
+
+# Las cuotas de _columnas siguen el orden de recomendaciones.CUOTAS
+_PRED_RESULTADO = {'Local': 0, 'Empate': 1, 'Visitante': 2}
+_PRED_BTTS = {'Sí': 1, 'No': 0}
+_PRED_OVER = {'Over': 1, 'Under': 0}
+
+
+def _cuota(partido, atributo):
+    """Cuota como float; -1 (sin cuota) si falta o no es numérica."""
+    try:
+        return float(getattr(partido, atributo, -1))
+    except (TypeError, ValueError):
+        return -1.0
+
+
+def _columnas(partidos):
+    """
+    Probabilidades, predicciones, cuotas y resultados de `partidos` como
+    arrays, leídos directamente de los atributos (sin to_dict).
+
+    Las predicciones se codifican como índice (resultado: 0 local,
+    1 empate, 2 visitante; btts/over: 1 sí/over, 0 no/under) y -1 si el
+    partido no tiene predicción o no es reconocible. Un mercado ausente de
+    la predicción o una cuota no numérica invalidan solo esa fila.
+    """
+    n = len(partidos)
+    prob_res = np.zeros((n, 3))
+    prob_btts = np.zeros(n)
+    prob_over = np.zeros(n)
+    pred_res = np.full(n, -1, dtype=np.int8)
+    pred_btts = np.full(n, -1, dtype=np.int8)
+    pred_over = np.full(n, -1, dtype=np.int8)
+
+    for i, p in enumerate(partidos):
+        pred = p.prediccion
+        if not isinstance(pred, dict):
+            continue
+        res = pred.get("resultado_1x2") or {}
+        probs = res.get("probabilidades") or {}
+        prob_res[i] = (probs.get("local") or 0, probs.get("empate") or 0,
+                       probs.get("visitante") or 0)
+        pred_res[i] = _PRED_RESULTADO.get(res.get("prediccion"), -1) if probs else -1
+        btts = pred.get("btts") or {}
+        prob_btts[i] = btts.get("probabilidad") or 0
+        pred_btts[i] = _PRED_BTTS.get(btts.get("prediccion"), -1)
+        over = pred.get("over25") or {}
+        prob_over[i] = over.get("probabilidad") or 0
+        pred_over[i] = _PRED_OVER.get(over.get("prediccion"), -1)
+
+    return {
+        'prob_res': prob_res, 'pred_res': pred_res,
+        'prob_btts': prob_btts, 'pred_btts': pred_btts,
+        'prob_over': prob_over, 'pred_over': pred_over,
+        'cuotas': np.array([[_cuota(p, c) for c in CUOTAS] for p in partidos],
+                           dtype=np.float64).reshape(n, len(CUOTAS)),
+        'resultado': np.array([p.resultado for p in partidos]),
+        'ambos_marcan': np.array([p.ambos_marcan for p in partidos]),
+        'goles': np.array([p.goles_local + p.goles_visitante for p in partidos]),
+    }
+
+
+def _entropia(*probs):
+    total = 0
+    for p in probs:
+        total = total + p * np.log(p + 1e-9)
+    return -total
+
+
+def _overround(*cuotas):
+    """Overround del mercado; 0 si falta alguna cuota (<= 1)."""
+    todas = np.ones(len(cuotas[0]), dtype=bool)
+    suma = 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for c in cuotas:
+            todas &= c > 1
+            suma = suma + 1 / c
+    return np.where(todas, suma - 1, 0.0)
+
+
+def _cuota_predicha(cuotas, pred):
+    """Cuota de la clase predicha (NaN si no hay predicción) y máscara de válidas."""
+    filas = np.arange(len(pred))
+    cuota = np.where(pred >= 0, cuotas[filas, np.maximum(pred, 0)], np.nan)
+    return cuota, (pred >= 0) & ~(cuota <= 1.0)
+
+
+def _features_resultado(c):
+    """Features del meta-modelo para mercado Resultado 1X2. Returns: (X, validos, cuota)."""
+    P = c['prob_res']
+    prob_l, prob_e, prob_v = P[:, 0], P[:, 1], P[:, 2]
+
+    probs_sorted = -np.sort(-P, axis=1)
+    prob_max = probs_sorted[:, 0]
+    prob_gap = prob_max - probs_sorted[:, 1]
+    entropy = _entropia(prob_l, prob_e, prob_v)
+
+    cuotas = c['cuotas'][:, :3]
+    cuota, validos = _cuota_predicha(cuotas, c['pred_res'])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        implied = 1.0 / cuota
     value = prob_max - implied
 
     # Features adicionales v2
-    cuota_l = float(p_dict.get("cuota_local", -1))
-    cuota_e = float(p_dict.get("cuota_empate", -1))
-    cuota_v = float(p_dict.get("cuota_visitante", -1))
-    overround = 0
-    if cuota_l > 1 and cuota_e > 1 and cuota_v > 1:
-        overround = (1/cuota_l + 1/cuota_e + 1/cuota_v) - 1
-
-    return [
+    overround = _overround(cuotas[:, 0], cuotas[:, 1], cuotas[:, 2])
+
+    X = np.column_stack([
         prob_max, prob_gap, entropy,
         cuota, implied, value,
         prob_l, prob_e, prob_v,         # Probabilidades individuales
         overround,                      # Overround del mercado
-        probs_sorted[2],                # Prob mínima (incertidumbre)
-    ]
-
-
-def _target_resultado(p_dict):
-    """Target ROI para Resultado."""
-    pred = p_dict["prediccion"]["resultado_1x2"]["prediccion"]
-    if pred == "Local":
-        cuota = float(p_dict["cuota_local"])
-        ok = p_dict["resultado"] == 1
-    elif pred == "Empate":
-        cuota = float(p_dict["cuota_empate"])
-        ok = p_dict["resultado"] == 0
-    elif pred == "Visitante":
-        cuota = float(p_dict["cuota_visitante"])
-        ok = p_dict["resultado"] == 2
-    else:
-        return None
-    if cuota <= 1.0:
-        return None
-    return cuota - 1 if ok else -1
-
-
-def _features_btts(p_dict):
-    """Features del meta-modelo para mercado BTTS."""
-    probabilidad = p_dict["prediccion"]["btts"]["probabilidad"]
-    prediccion = p_dict["prediccion"]["btts"]["prediccion"]
-
-    if prediccion == "No":
-        prob_si, prob_no = 1 - probabilidad, probabilidad
-    else:
-        prob_si, prob_no = probabilidad, 1 - probabilidad
-
-    prob_max = max(prob_si, prob_no)
-    prob_gap = abs(prob_si - prob_no)
-    entropy = -sum(p * math.log(p + 1e-9) for p in [prob_si, prob_no])
-
-    if prediccion == "Sí":
-        cuota = float(p_dict["cuota_btts"])
-    elif prediccion == "No":
-        cuota = float(p_dict["cuota_btts_no"])
-    else:
-        return None
-
-    if cuota <= 1.0:
-        return None
-
-    implied = 1.0 / cuota
+        probs_sorted[:, 2],             # Prob mínima (incertidumbre)
+    ])
+    return X, validos, cuota
+
+
+def _target_resultado(c, cuota):
+    """Target ROI para Resultado (válido donde lo sean los features)."""
+    ok = c['resultado'] == np.array([1, 0, 2])[np.maximum(c['pred_res'], 0)]
+    return np.where(ok, cuota - 1, -1.0)
+
+
+def _features_binario(probabilidad, pred, cuota_si, cuota_no):
+    """Features comunes de BTTS y Over/Under (clase 1 = sí / over)."""
+    prob_si = np.where(pred == 0, 1 - probabilidad, probabilidad)
+    prob_no = np.where(pred == 0, probabilidad, 1 - probabilidad)
+
+    prob_max = np.maximum(prob_si, prob_no)
+    prob_gap = np.abs(prob_si - prob_no)
+    entropy = _entropia(prob_si, prob_no)
+
+    cuota, validos = _cuota_predicha(np.column_stack([cuota_no, cuota_si]), pred)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        implied = 1.0 / cuota
     value = prob_max - implied
 
-    cuota_si = float(p_dict.get("cuota_btts", -1))
-    cuota_no = float(p_dict.get("cuota_btts_no", -1))
-    overround = 0
-    if cuota_si > 1 and cuota_no > 1:
-        overround = (1/cuota_si + 1/cuota_no) - 1
+    overround = _overround(cuota_si, cuota_no)
 
-    return [
+    X = np.column_stack([
         prob_max, prob_gap, entropy,
         cuota, implied, value,
         prob_si, prob_no,
         overround,
-    ]
+    ])
+    return X, validos, cuota
+
 
+def _features_btts(c):
+    """Features del meta-modelo para mercado BTTS. Returns: (X, validos, cuota)."""
+    return _features_binario(c['prob_btts'], c['pred_btts'],
+                             c['cuotas'][:, 3], c['cuotas'][:, 4])
 
-def _target_btts(p_dict):
+
+def _target_btts(c, cuota):
     """Target ROI para BTTS."""
-    pred = p_dict["prediccion"]["btts"]["prediccion"]
-    if pred == "Sí":
-        cuota = float(p_dict["cuota_btts"])
-        ok = p_dict["ambos_marcan"] == 1
-    elif pred == "No":
-        cuota = float(p_dict["cuota_btts_no"])
-        ok = p_dict["ambos_marcan"] == 0
-    else:
-        return None
-    if cuota <= 1.0:
-        return None
-    return cuota - 1 if ok else -1
-
-
-def _features_over(p_dict):
-    """Features del meta-modelo para mercado Over/Under 2.5."""
-    probabilidad = p_dict["prediccion"]["over25"]["probabilidad"]
-    prediccion = p_dict["prediccion"]["over25"]["prediccion"]
-
-    if prediccion == "Under":
-        prob_o, prob_u = 1 - probabilidad, probabilidad
-    else:
-        prob_o, prob_u = probabilidad, 1 - probabilidad
-
-    prob_max = max(prob_o, prob_u)
-    prob_gap = abs(prob_o - prob_u)
-    entropy = -sum(p * math.log(p + 1e-9) for p in [prob_o, prob_u])
-
-    if prediccion == "Over":
-        cuota = float(p_dict["cuota_over"])
-    elif prediccion == "Under":
-        cuota = float(p_dict["cuota_under"])
-    else:
-        return None
-
-    if cuota <= 1.0:
-        return None
-
-    implied = 1.0 / cuota
-    value = prob_max - implied
+    ok = c['ambos_marcan'] == c['pred_btts']
+    return np.where(ok, cuota - 1, -1.0)
 
-    cuota_ov = float(p_dict.get("cuota_over", -1))
-    cuota_un = float(p_dict.get("cuota_under", -1))
-    overround = 0
-    if cuota_ov > 1 and cuota_un > 1:
-        overround = (1/cuota_ov + 1/cuota_un) - 1
 
-    return [
-        prob_max, prob_gap, entropy,
-        cuota, implied, value,
-        prob_o, prob_u,
-        overround,
-    ]
+def _features_over(c):
+    """Features del meta-modelo para mercado Over/Under 2.5. Returns: (X, validos, cuota)."""
+    return _features_binario(c['prob_over'], c['pred_over'],
+                             c['cuotas'][:, 5], c['cuotas'][:, 6])
 
 
-def _target_over(p_dict):
+def _target_over(c, cuota):
     """Target ROI para Over 2.5."""
-    pred = p_dict["prediccion"]["over25"]["prediccion"]
-    goles = p_dict["goles_local"] + p_dict["goles_visitante"]
-    if pred == "Over":
-        cuota = float(p_dict["cuota_over"])
-        ok = goles >= 3
-    elif pred == "Under":
-        cuota = float(p_dict["cuota_under"])
-        ok = goles < 3
-    else:
-        return None
-    if cuota <= 1.0:
-        return None
-    return cuota - 1 if ok else -1
+    ok = (c['goles'] >= 3) == (c['pred_over'] == 1)
+    return np.where(ok, cuota - 1, -1.0)
 
 
 # Mapeo para unificar
@@ -243,22 +240,15 @@ def crear_meta_modelo(mercado, historial, logger):
     feat_fn, target_fn = _EXTRACTORES[mercado]
     logger.info(f"  Preparando datos Meta-Modelo v2 [{mercado}]...")
 
-    X, y = [], []
-    for p in historial:
-        p_dict = p.to_dict()
-        features = feat_fn(p_dict)
-        target = target_fn(p_dict)
-        if features is not None and target is not None:
-            X.append(features)
-            y.append(target)
+    c = _columnas(historial)
+    X, validos, cuota = feat_fn(c)
+    y = target_fn(c, cuota)
+    X, y = X[validos], y[validos]
 
     if len(X) < 30:
         logger.info(f"  ⚠ Solo {len(X)} muestras para {mercado}, insuficiente.")
         return
 
-    X = np.array(X)
-    y = np.array(y)
-
     logger.info(f"  Entrenando Meta-Modelo v2 [{mercado}] con {len(X)} partidos (LightGBM)...")
 
     model = lgb.LGBMRegressor(
@@ -295,130 +285,62 @@ def _asignar_predicciones_v2(historial, logger):
     import json
     warnings.filterwarnings('ignore')
 
-    from services.ml_v2.features import FeatureExtractor
+    from services.ml_v2.feature_store import FeatureStore, cargar_extractor
+    from services.ml_v2.entrenar import cargar_modelo, directorio_modelos, predecir_base
     from services.data_fetching.obtener_partidos import cargar_partidos
 
-    # Los modelos base están en modelos_v2/
-    modelos_dir = os.path.join(BASE_DIR, 'modelos_v2')
+    # Los modelos base están en la versión activa de modelos_v2/
+    # (artefactos nativos o pickle), todos del mismo juego
+    directorio = directorio_modelos()
     modelos = {}
     for nombre in ['modelo_btts', 'modelo_over25', 'modelo_resultado',
                     'modelo_goles_local', 'modelo_goles_visitante']:
-        ruta = os.path.join(modelos_dir, f'{nombre}.pkl')
-        if not os.path.exists(ruta):
+        try:
+            modelos[nombre] = cargar_modelo(nombre, directorio=directorio)
+        except FileNotFoundError:
             logger.info(f"  ⚠ Modelo base {nombre} no encontrado en modelos_v2/")
             return False
-        with open(ruta, 'rb') as f:
-            modelos[nombre] = pickle.load(f)
 
-    # FeatureExtractor con todos los partidos
+    # FeatureExtractor con todos los partidos; features en lote desde el store
     todos = cargar_partidos()
-    extractor = FeatureExtractor(todos)
+    extractor = cargar_extractor(todos)
     logger.info(f"  FeatureExtractor inicializado ({len(extractor.partidos_ft)} FT)")
+    X_todos = FeatureStore().matriz(extractor, historial)
 
     # Cargar umbrales optimizados
     umbrales_path = os.path.join(BASE_DIR, 'datos', 'umbrales_v2.json')
     with open(umbrales_path, 'r') as f:
         optimos = json.load(f)
 
-    def _rec(mercado, prob, cuota, cuota_no=None, side_idx=None):
-        """Calcula recomendación {conservadora, moderada, arriesgada}."""
-        rec = {'conservadora': 0, 'moderada': 0, 'arriesgada': 0}
-        if cuota <= 1.0: return rec
-        
-        # Estrategias
-        for strat, key in [('agresivo', 'arriesgada'), ('moderado', 'moderada'), ('conservador', 'conservadora')]:
-            # Obtener umbral y margen
-            # Si mercado es 'resultado', prob y cuota ya son específicos de la predicción
-            # Si mercado es 'btts'/'over', prob es de la clase 1
-            
-            # Check data availability
-            if mercado not in optimos[strat]: continue
-            
-            u_prob = optimos[strat][mercado]['umbral_prob']
-            margen = optimos[strat][mercado]['margen']
-            
-            # Value check
-            implied = 1.0 / cuota
-            value = prob - implied
-            
-            if prob >= u_prob and value >= margen:
-                rec[key] = 1
-                
-        return rec
-
-    asignados = 0
-    for p in historial:
+    # Cuotas partido a partido: si las de un partido no se pueden leer se
+    # informa de él (id y error) y se omite, conservando la predicción que
+    # tuviera, sin abortar el resto
+    filas, cuotas, omitidos = [], [], []
+    for i, p in enumerate(historial):
         try:
-            X = extractor.extraer(p).flatten().reshape(1, -1)
-
-            pred_gl = round(float(modelos['modelo_goles_local'].predict(X)[0]), 2)
-            pred_gv = round(float(modelos['modelo_goles_visitante'].predict(X)[0]), 2)
-
-            prob_res = modelos['modelo_resultado'].predict_proba(X)[0].astype(float)
-            pred_res = int(prob_res.argmax())
-            prob_res_max = float(prob_res.max())
-
-            prob_btts = modelos['modelo_btts'].predict_proba(X)[0].astype(float)
-            pred_btts_cls = int(prob_btts.argmax())
-
-            prob_over = modelos['modelo_over25'].predict_proba(X)[0].astype(float)
-            pred_over_cls = int(prob_over.argmax())
-
-            # --- Calcular Recomendaciones ---
-            
-            # Resultado
-            if pred_res == 1: # Local
-                c_res = float(getattr(p, 'cuota_local', -1))
-            elif pred_res == 2: # Visitante
-                c_res = float(getattr(p, 'cuota_visitante', -1))
-            else: # Empate
-                c_res = float(getattr(p, 'cuota_empate', -1))
-            rec_res = _rec('resultado', prob_res_max, c_res)
-
-            # BTTS
-            c_btts_si = float(getattr(p, 'cuota_btts', -1))
-            c_btts_no = float(getattr(p, 'cuota_btts_no', -1))
-            prob_btts_val = float(prob_btts[pred_btts_cls])
-            c_btts_val = c_btts_si if pred_btts_cls == 1 else c_btts_no
-            rec_btts = _rec('btts', prob_btts_val, c_btts_val)
-
-            # Over
-            c_over_si = float(getattr(p, 'cuota_over', -1))
-            c_over_no = float(getattr(p, 'cuota_under', -1))
-            prob_over_val = float(prob_over[pred_over_cls])
-            c_over_val = c_over_si if pred_over_cls == 1 else c_over_no
-            rec_over = _rec('over', prob_over_val, c_over_val)
-
-            # Construir predicción
-            p.prediccion = {
-                'goles_esperados': {'local': pred_gl, 'visitante': pred_gv},
-                'resultado_1x2': {
-                    'prediccion': ['Empate', 'Local', 'Visitante'][pred_res],
-                    'probabilidades': {
-                        'local': float(prob_res[1]),
-                        'empate': float(prob_res[0]),
-                        'visitante': float(prob_res[2])
-                    },
-                    'probabilidad_max': prob_res_max,
-                    'recomendacion': rec_res
-                },
-                'btts': {
-                    'prediccion': 'Sí' if pred_btts_cls == 1 else 'No',
-                    'probabilidad': float(prob_btts[pred_btts_cls]),
-                    'recomendacion': rec_btts
-                },
-                'over25': {
-                    'prediccion': 'Over' if pred_over_cls == 1 else 'Under',
-                    'probabilidad': float(prob_over[pred_over_cls]),
-                    'recomendacion': rec_over
-                }
-            }
-            asignados += 1
+            cuotas.append([float(getattr(p, c, -1)) for c in CUOTAS])
+            filas.append(i)
         except Exception as e:
-            # Skip matches que no tienen datos suficientes
-            continue
-
-    logger.info(f"  Predicciones v2 asignadas a {asignados}/{len(historial)} partidos.")
+            omitidos.append(f"{p.id_partido} ({type(e).__name__}: {e})")
+    if omitidos:
+        logger.info(f"  ⚠ {len(omitidos)} partidos omitidos: {'; '.join(omitidos[:10])}"
+                    f"{'; ...' if len(omitidos) > 10 else ''}")
+    if not filas:
+        logger.info("  ⚠ Ningún partido puntuable.")
+        return False
+    partidos = [historial[i] for i in filas]
+
+    # Una llamada por modelo para todo el historial y recomendaciones con
+    # las mismas reglas que las predicciones de producción
+    base = predecir_base(X_todos[filas], modelos['modelo_goles_local'],
+                         modelos['modelo_goles_visitante'], modelos['modelo_btts'],
+                         modelos['modelo_over25'], modelos['modelo_resultado'])
+    preds = recomendaciones.predicciones(*base, np.array(cuotas, dtype=np.float64), optimos)
+    for p, prediccion in zip(partidos, preds):
+        p.prediccion = prediccion
+
+    logger.info(f"  Predicciones v2 asignadas a {len(partidos)}/{len(historial)} partidos "
+                f"({len(omitidos)} omitidos).")
     return True
 
 
@@ -455,58 +377,53 @@ def crear_meta_modelos_v2_fresh(logger):
 # PREDICCIÓN (filtro del meta-modelo)
 # =================================================================
 
+# EV mínimo esperado por estrategia para mantener la recomendación
+_UMBRALES_EV = {'conservadora': 0.10, 'moderada': 0.03, 'arriesgada': -0.01}
+# (mercado, clave en prediccion)
+_MERCADOS_FILTRO = (('resultado', 'resultado_1x2'), ('btts', 'btts'), ('over', 'over25'))
+
+
+def aplicar_filtro_meta_lote(partidos, meta_resultado, meta_btts, meta_over):
+    """
+    Aplica el filtro del meta-modelo sobre las recomendaciones de
+    `partidos`, con una predicción por meta-modelo para todo el lote.
+    Modifica partido.prediccion in-place (se ignoran los partidos sin
+    predicción).
+
+    Sin features válidos (predicción o cuota ausente) se anulan las tres
+    recomendaciones del mercado; si no, se anula cada estrategia cuyo EV
+    esperado no llega a su umbral.
+    """
+    partidos = [p for p in partidos if isinstance(p.prediccion, dict)]
+    if not partidos:
+        return
+    c = _columnas(partidos)
+    metas = {'resultado': meta_resultado, 'btts': meta_btts, 'over': meta_over}
+
+    for mercado, clave in _MERCADOS_FILTRO:
+        X, validos, _ = _EXTRACTORES[mercado][0](c)
+        ev = np.full(len(partidos), np.nan)
+        if validos.any():
+            ev[validos] = metas[mercado].predict(X[validos])
+
+        for i, p in enumerate(partidos):
+            pred = p.prediccion.get(clave)
+            if not isinstance(pred, dict):
+                continue
+            if not validos[i]:
+                pred['recomendacion'] = {
+                    'conservadora': 0, 'moderada': 0, 'arriesgada': 0
+                }
+                continue
+            rec = pred.get('recomendacion') or {}
+            for estrategia, umbral in _UMBRALES_EV.items():
+                if rec.get(estrategia) == 1 and ev[i] < umbral:
+                    rec[estrategia] = 0
+
+
 def aplicar_filtro_meta(partido, meta_resultado, meta_btts, meta_over):
     """
     Aplica el filtro del meta-modelo sobre las recomendaciones.
     Modifica partido.prediccion in-place.
     """
-    p_dict = partido.to_dict()
-    pred = partido.prediccion
-
-    # --- Resultado ---
-    feat = _features_resultado(p_dict)
-    if feat is None:
-        pred['resultado_1x2']['recomendacion'] = {
-            'conservadora': 0, 'moderada': 0, 'arriesgada': 0
-        }
-    else:
-        ev = meta_resultado.predict(np.array(feat).reshape(1, -1))[0]
-        rec = pred['resultado_1x2']['recomendacion']
-        if rec.get('conservadora') == 1 and ev < 0.10:
-            rec['conservadora'] = 0
-        if rec.get('moderada') == 1 and ev < 0.03:
-            rec['moderada'] = 0
-        if rec.get('arriesgada') == 1 and ev < -0.01:
-            rec['arriesgada'] = 0
-
-    # --- BTTS ---
-    feat = _features_btts(p_dict)
-    if feat is None:
-        pred['btts']['recomendacion'] = {
-            'conservadora': 0, 'moderada': 0, 'arriesgada': 0
-        }
-    else:
-        ev = meta_btts.predict(np.array(feat).reshape(1, -1))[0]
-        rec = pred['btts']['recomendacion']
-        if rec.get('conservadora') == 1 and ev < 0.10:
-            rec['conservadora'] = 0
-        if rec.get('moderada') == 1 and ev < 0.03:
-            rec['moderada'] = 0
-        if rec.get('arriesgada') == 1 and ev < -0.01:
-            rec['arriesgada'] = 0
-
-    # --- Over ---
-    feat = _features_over(p_dict)
-    if feat is None:
-        pred['over25']['recomendacion'] = {
-            'conservadora': 0, 'moderada': 0, 'arriesgada': 0
-        }
-    else:
-        ev = meta_over.predict(np.array(feat).reshape(1, -1))[0]
-        rec = pred['over25']['recomendacion']
-        if rec.get('conservadora') == 1 and ev < 0.10:
-            rec['conservadora'] = 0
-        if rec.get('moderada') == 1 and ev < 0.03:
-            rec['moderada'] = 0
-        if rec.get('arriesgada') == 1 and ev < -0.01:
-            rec['arriesgada'] = 0
+    aplicar_filtro_meta_lote([partido], meta_resultado, meta_btts, meta_over)
@@ -0,0 +1,274 @@
+"""
+Motor vectorizado de búsqueda de umbrales de apuesta.
+
+Una apuesta (prob, cuota, acierto) entra en la celda (umbral, margen) si
+prob >= umbral y prob - 1/cuota >= margen. En vez de re-simular todas las
+apuestas para cada par, se evalúan todas las celdas de una vez.
+
+Optimización exacta (evaluar_cortes): en lugar de una rejilla fija, los
+candidatos son todos los puntos de corte distintos de los datos (cada
+prob. y cada value observados dentro de la ventana de la estrategia,
+redondeados hacia arriba a DECIMALES), así que no se escapa ningún óptimo
+entre dos nodos de la rejilla y el umbral guardado es estable. Cada
+apuesta cae en la celda del mayor umbral y el mayor margen que la
+admiten (búsqueda binaria sobre los candidatos ordenados); con ese
+histograma (U, M), las sumas acumuladas hacia atrás en ambos ejes dan las
+apuestas con prob >= umbral y value >= margen de todas las celdas:
+O(n log n + U·M), sin bucles en Python.
+
+Robustez (robustez): con B remuestreos bootstrap expresados como matriz de
+pesos (B, n), el mismo histograma ponderado da el ROI de toda la rejilla
+en todos los remuestreos a la vez. De ahí salen un intervalo de confianza
+del ROI del umbral elegido y su estabilidad: la fracción de remuestreos
+cuyo óptimo cae cerca del umbral elegido.
+
+Uso:
+    prob, cuota, acierto = arrays(apuestas['btts'])
+    optimizar_estrategias(prob, cuota, acierto,
+                          {'moderado': ((0.50, 0.70), (0.00, 0.10), 20)})
+"""
+
+import numpy as np
+
+# Celdas (muestras × (apuestas + celdas)) por bloque de histogramas
+TAMANO_BLOQUE = 4_000_000
+
+# Decimales de umbral y margen: los cortes se buscan entre los valores con
+# DECIMALES, que es como se guardan en umbrales_v2.json (la rejilla
+# heredada, de 0.01 y 0.005, cabe entera)
+DECIMALES = 3
+
+# Bootstrap: nº de remuestreos, rejilla de re-optimización y tolerancia
+# (umbral, margen) para contar un remuestreo como estable
+N_MUESTRAS = 1000
+PASOS_BOOTSTRAP = (0.01, 0.005)
+TOLERANCIA_BOOTSTRAP = (0.02, 0.01)
+
+SIN_RESULTADO = {"roi": -999, "umbral_prob": None, "margen": None, "apuestas": 0, "aciertos": 0}
+
+
+def arrays(datos):
+    """Lista de apuestas {prob, cuota, acierto} → arrays (prob, cuota, acierto)."""
+    prob = np.array([d["prob"] for d in datos], dtype=np.float64)
+    cuota = np.array([d["cuota"] for d in datos], dtype=np.float64)
+    acierto = np.array([d["acierto"] for d in datos], dtype=bool)
+    return prob, cuota, acierto
+
+
+def redondear_arriba(valores, decimales=DECIMALES):
+    """
+    Menor número con `decimales` (como float) >= cada valor: el umbral
+    redondeado que selecciona exactamente los datos >= ese valor.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    paso = 10.0 ** -decimales
+    r = np.round(np.ceil(valores / paso) * paso, decimales)
+    # Corregir el error de coma flotante de ceil en ambos sentidos
+    anterior = np.round(r - paso, decimales)
+    r = np.where(anterior >= valores, anterior, r)
+    return np.where(r < valores, np.round(r + paso, decimales), r)
+
+
+def cortes(valores, *ventanas, decimales=DECIMALES):
+    """
+    Puntos de corte candidatos para un umbral `>=` con `decimales` dentro
+    de las ventanas [desde, hasta]: los extremos de cada ventana y cada
+    valor de los datos redondeado hacia arriba que cae dentro de alguna.
+    Cualquier otro umbral de la ventana con esos decimales selecciona el
+    mismo conjunto de apuestas que uno de estos (el siguiente valor de
+    los datos redondeado o, por encima del último, `hasta`).
+    """
+    valores = redondear_arriba(valores, decimales)
+    dentro = np.zeros(len(valores), dtype=bool)
+    for desde, hasta in ventanas:
+        dentro |= (valores > desde) & (valores <= hasta)
+    extremos = np.round([x for ventana in ventanas for x in ventana], decimales)
+    return np.unique(np.concatenate([extremos, valores[dentro]]))
+
+
+def en_ventana(valores, desde, hasta):
+    """Índices de los `valores` (p.ej. cortes) dentro de [desde, hasta]."""
+    return np.flatnonzero((valores >= desde) & (valores <= hasta))
+
+
+def evaluar_cortes(prob, cuota, acierto, umbrales, margenes, pesos=None):
+    """
+    Evalúa todas las combinaciones (umbral, margen) a partir del
+    histograma de las apuestas por celda (adecuado para muchos
+    candidatos, p.ej. los de cortes()).
+
+    Returns:
+        dict de tensores (U, M): 'apuestas', 'aciertos', 'beneficio'
+        (unidades apostando 1 por apuesta) y 'roi' (%, NaN sin apuestas)
+
+    Args:
+        pesos: (B, n) veces que cuenta cada apuesta en cada una de B
+               muestras (ver pesos_bootstrap); los tensores devueltos
+               son entonces (B, U, M)
+    """
+    umbrales = np.asarray(umbrales, dtype=np.float64)
+    margenes = np.asarray(margenes, dtype=np.float64)
+    orden_u = np.argsort(umbrales, kind='stable')
+    orden_m = np.argsort(margenes, kind='stable')
+    n_u, n_m = len(umbrales), len(margenes)
+    value = prob - 1.0 / cuota
+    w = np.ones((1, len(prob))) if pesos is None else np.asarray(pesos, dtype=np.float64)
+
+    # Celda de cada apuesta: mayor umbral <= prob y mayor margen <= value
+    # (-1 si no entra en ninguna)
+    fila = np.searchsorted(umbrales[orden_u], prob, side='right') - 1
+    columna = np.searchsorted(margenes[orden_m], value, side='right') - 1
+    entra = (fila >= 0) & (columna >= 0) & np.isfinite(prob) & np.isfinite(value)
+    celda = fila[entra] * n_m + columna[entra]
+    w = w[:, entra]
+    factores = (None, acierto[entra], np.where(acierto, cuota - 1.0, -1.0)[entra])
+
+    celdas = n_u * n_m
+    forma = (len(w), n_u, n_m)
+    tensores = [np.empty(forma) for _ in factores]
+    paso_b = max(1, TAMANO_BLOQUE // max(len(celda) + celdas, 1))
+    for j in range(0, len(w), paso_b):
+        bloque = w[j:j + paso_b]
+        indices = (np.arange(len(bloque))[:, None] * celdas + celda[None, :]).ravel()
+        for destino, factor in zip(tensores, factores):
+            x = bloque if factor is None else bloque * factor
+            h = np.bincount(indices, weights=x.ravel(), minlength=len(bloque) * celdas)
+            h = h.reshape(len(bloque), n_u, n_m)[:, ::-1, ::-1]
+            destino[j:j + paso_b] = np.cumsum(np.cumsum(h, axis=1), axis=2)[:, ::-1, ::-1]
+
+    # Volver al orden de umbrales y margenes recibido
+    inversa_u, inversa_m = np.argsort(orden_u), np.argsort(orden_m)
+    apuestas, aciertos, beneficio = (t[:, inversa_u][:, :, inversa_m] for t in tensores)
+    apuestas = np.rint(apuestas).astype(np.int64)
+    aciertos = np.rint(aciertos).astype(np.int64)
+
+    if pesos is None:
+        apuestas, aciertos, beneficio = apuestas[0], aciertos[0], beneficio[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        roi = np.where(apuestas > 0, beneficio / apuestas * 100, np.nan)
+
+    return {"apuestas": apuestas, "aciertos": aciertos, "beneficio": beneficio, "roi": roi}
+
+
+def ventana(tensores, filas, columnas):
+    """Sub-rejilla (umbrales `filas` × márgenes `columnas`) de evaluar_cortes()."""
+    return {k: v[np.ix_(filas, columnas)] for k, v in tensores.items()}
+
+
+def _redondear(valor, decimales):
+    return float(valor) if decimales is None else round(float(valor), decimales)
+
+
+def mejor(tensores, umbrales, margenes, min_apuestas=15, decimales=DECIMALES):
+    """
+    Celda de mayor ROI con al menos `min_apuestas` apuestas (a igualdad,
+    la de menor umbral y luego menor margen). Los cortes de cortes() ya
+    tienen DECIMALES: redondear solo quita el ruido de coma flotante.
+
+    Returns:
+        dict con el formato de umbrales_v2.json (SIN_RESULTADO si ninguna
+        celda llega al mínimo de apuestas)
+    """
+    roi = np.where(tensores["apuestas"] >= min_apuestas, tensores["roi"], np.nan)
+    if np.isnan(roi).all():
+        return dict(SIN_RESULTADO)
+    u, m = np.unravel_index(np.nanargmax(roi), roi.shape)
+    n = int(tensores["apuestas"][u, m])
+    aciertos = int(tensores["aciertos"][u, m])
+    return {
+        "roi": round(float(roi[u, m]), 2),
+        "umbral_prob": _redondear(umbrales[u], decimales),
+        "margen": _redondear(margenes[m], decimales),
+        "apuestas": n,
+        "aciertos": aciertos,
+        "accuracy": round(aciertos / n * 100, 1),
+        "beneficio": round(float(tensores["beneficio"][u, m]), 2),
+    }
+
+
+def optimizar_estrategias(prob, cuota, acierto, estrategias):
+    """
+    Óptimo exacto de cada estrategia entre todos los umbrales y márgenes
+    con DECIMALES de su ventana. Se evalúa un solo tensor con los cortes
+    de todas las ventanas y cada estrategia lee la parte que cae en la suya.
+
+    Args:
+        estrategias: {nombre: ((prob. desde, hasta), (margen desde, hasta), mínimo de apuestas)}
+
+    Returns:
+        {nombre: dict de mejor()}
+    """
+    value = prob - 1.0 / cuota
+    cortes_u = cortes(prob, *(u for u, _, _ in estrategias.values()))
+    cortes_m = cortes(value, *(m for _, m, _ in estrategias.values()))
+    tensores = evaluar_cortes(prob, cuota, acierto, cortes_u, cortes_m)
+
+    res = {}
+    for nombre, (ventana_u, ventana_m, min_apuestas) in estrategias.items():
+        filas = en_ventana(cortes_u, *ventana_u)
+        columnas = en_ventana(cortes_m, *ventana_m)
+        res[nombre] = mejor(ventana(tensores, filas, columnas),
+                            cortes_u[filas], cortes_m[columnas], min_apuestas)
+    return res
+
+
+# =====================================================================
+# BOOTSTRAP
+# =====================================================================
+
+def pesos_bootstrap(n, n_muestras=N_MUESTRAS, semilla=42):
+    """
+    Remuestreos con reposición de n apuestas: matriz de índices (B, n)
+    convertida en cuántas veces sale cada apuesta en cada remuestreo (B, n).
+    """
+    rng = np.random.default_rng(semilla)
+    indices_muestra = rng.integers(0, n, size=(n_muestras, n))
+    indices_muestra += np.arange(n_muestras)[:, None] * n
+    return np.bincount(indices_muestra.ravel(), minlength=n_muestras * n).reshape(n_muestras, n)
+
+
+def robustez(prob, cuota, acierto, elegido, ventana_u, ventana_m, min_apuestas, pesos,
+             nivel=0.95):
+    """
+    Intervalo de confianza del ROI (%) del umbral/margen `elegido` (un
+    resultado de mejor()) y estabilidad de la elección: fracción de los
+    remuestreos en los que el óptimo de la ventana (re-optimizado sobre
+    una rejilla de PASOS_BOOTSTRAP) queda a TOLERANCIA_BOOTSTRAP o menos.
+
+    El intervalo se calcula con los mismos datos con los que se eligió el
+    umbral, así que es optimista; la estabilidad indica cuánto.
+
+    Returns:
+        {'ic_roi': [inferior, superior] o None, 'estabilidad': 0-1 o None}
+    """
+    umbral, margen = elegido["umbral_prob"], elegido["margen"]
+    if umbral is None:
+        return {"ic_roi": None, "estabilidad": None}
+
+    # ROI del umbral elegido en cada remuestreo
+    value = prob - 1.0 / cuota
+    entra = (prob >= umbral) & (value >= margen)
+    n = pesos @ entra
+    with np.errstate(divide='ignore', invalid='ignore'):
+        roi = np.where(n > 0, (pesos @ np.where(entra, np.where(acierto, cuota - 1.0, -1.0), 0.0))
+                       / n * 100, np.nan)
+    cola = (1 - nivel) / 2 * 100
+    ic = None
+    if not np.isnan(roi).all():
+        inferior, superior = np.nanpercentile(roi, [cola, 100 - cola])
+        ic = [round(float(inferior), 2), round(float(superior), 2)]
+
+    # Óptimo de la ventana en cada remuestreo
+    paso_u, paso_m = PASOS_BOOTSTRAP
+    umbrales = np.arange(ventana_u[0], ventana_u[1] + paso_u / 2, paso_u)
+    margenes = np.arange(ventana_m[0], ventana_m[1] + paso_m / 2, paso_m)
+    t = evaluar_cortes(prob, cuota, acierto, umbrales, margenes, pesos)
+    roi_t = np.where(t["apuestas"] >= min_apuestas, t["roi"], -np.inf).reshape(len(pesos), -1)
+    k = roi_t.argmax(axis=1)
+    con_optimo = np.isfinite(roi_t[np.arange(len(k)), k])
+    tol_u, tol_m = TOLERANCIA_BOOTSTRAP
+    cerca = (con_optimo
+             & (np.abs(umbrales[k // len(margenes)] - umbral) <= tol_u + 1e-9)
+             & (np.abs(margenes[k % len(margenes)] - margen) <= tol_m + 1e-9))
+
+    return {"ic_roi": ic, "estabilidad": round(float(cerca.mean()), 3)}
@@ -8,11 +8,20 @@ Estrategia Híbrida:
    - Se generan predicciones frescas con el modelo v2.
 3. OPTIMIZACIÓN: Busca umbrales rentables sobre ese set de validación de alta calidad.
 
+Iteraciones rápidas: run(reutilizar_modelos=True) usa los modelos base de
+la versión activa del registro (validando solo con los partidos del
+historial que no vieron al entrenar) y las features del feature store.
+En ambos modos las probabilidades del historial se guardan en
+datos/cache/probs_umbrales_v2.npz y, si nada cambió, se reutilizan sin
+entrenar ni predecir.
+
 Uso:
   python -c "from services.ml_v2.optimizar_umbrales import run; run()"
+  python -c "from services.ml_v2.optimizar_umbrales import run; run(reutilizar_modelos=True)"
 """
 
 import os
+import hashlib
 import json
 import logging
 import pickle
@@ -22,11 +31,20 @@ from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.calibration import CalibratedClassifierCV
 import xgboost as xgb
-import lightgbm as lgb
 from datetime import datetime
 
 from config import BASE_DIR
-from services.ml_v2.features import FeatureExtractor, _parse_fecha
+from services.ml_v2 import motor_umbrales, registro
+from services.ml_v2.features import FeatureExtractor, VERSION_FEATURES, _parse_fecha
+from services.ml_v2.feature_store import FeatureStore, cargar_extractor
+from services.ml_v2.entrenar import (
+    _modelo_clasificador,
+    cargar_hiperparametros,
+    cargar_modelo,
+    directorio_modelos,
+    huella_dataset,
+    ids_vistos,
+)
 from services.data_fetching.obtener_partidos import cargar_partidos
 from services.data_fetching.obtener_historial import cargar_historial
 
@@ -34,6 +52,13 @@ logger = logging.getLogger("opt_umbrales_v2")
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s", datefmt="%H:%M:%S")
 warnings.filterwarnings("ignore")
 
+# Probabilidades del historial de la última ejecución (ver _clave_probs)
+RUTA_PROBS = os.path.join(BASE_DIR, 'datos', 'cache', 'probs_umbrales_v2.npz')
+
+# Feature store propio del reentreno: su extractor solo ve train + historial,
+# así que sus filas no valen para el store compartido (historial completo)
+RUTA_STORE_REENTRENO = os.path.join(BASE_DIR, 'datos', 'cache', 'features_umbrales_v2.npz')
+
 # ─── Utilidades ───────────────────────────────────────────────────
 
 def _safe_float(val, default=-1.0):
@@ -62,20 +87,39 @@ def extraer_targets(p):
     res = 1 if gl > gv else (2 if gv > gl else 0)
     return gl, gv, btts, over, res
 
-# ─── Pipeline Completo ───────────────────────────────────────────
+# ─── Probabilidades del set de validación (con caché) ─────────────
 
-def pipeline_entrenamiento_optimizacion():
-    logger.info("=== INICIO: Pipeline de Optimización Híbrida ===")
+def _clave_probs(origen, historial):
+    """Clave de la caché: origen de los modelos + versión de features + ids del historial (en orden)."""
+    h = hashlib.sha256(f"{origen}|features_v{VERSION_FEATURES}".encode())
+    h.update(np.array([int(p.id_partido) for p in historial], dtype=np.int64).tobytes())
+    return h.hexdigest()
 
-    # 1. Cargar datos
-    logger.info("Cargando `partidos.pkl` (Training candidates)...")
-    partidos_raw = cargar_partidos() 
+def _cargar_probs(clave):
+    try:
+        with np.load(RUTA_PROBS) as d:
+            if str(d['clave']) != clave:
+                return None
+            return d['btts'], d['over'], d['resultado']
+    except (OSError, KeyError, ValueError):
+        return None
+
+def _guardar_probs(clave, probs):
+    os.makedirs(os.path.dirname(RUTA_PROBS), exist_ok=True)
+    tmp = RUTA_PROBS + '.tmp.npz'
+    np.savez(tmp, clave=np.array(clave), btts=probs[0], over=probs[1], resultado=probs[2])
+    os.replace(tmp, RUTA_PROBS)
+
+def _probabilidades_reentreno(partidos_raw, historial):
+    """
+    Entrena BTTS / Over / Resultado (LightGBM + CalibratedCV) con los
+    partidos que no están en el historial y predice el historial. Si ni
+    el dataset de train ni los hiperparámetros cambiaron desde la última
+    vez, devuelve las probabilidades guardadas sin reentrenar.
+    """
     partidos_ft = [p for p in partidos_raw if p.estado == "FT"]
-    
-    logger.info("Cargando `historial.pkl` (Validation set)...")
-    historial = cargar_historial()
-    
-    # 2. Identificar y limpiar
+
+    # Identificar y limpiar
     ids_historial = set(get_match_id(p) for p in historial)
     logger.info(f"  Historial tiene {len(historial)} partidos únicos.")
 
@@ -86,70 +130,137 @@ def pipeline_entrenamiento_optimizacion():
             partidos_train.append(p)
     
     logger.info(f"  Partidos para entrenamiento (excluyendo historial): {len(partidos_train)}")
+
+    #    Mismos hiperparámetros que crear_modelos (por defecto o buscados)
+    hiperparametros = cargar_hiperparametros()
+    origen = f"reentreno:{huella_dataset(partidos_train)}:{json.dumps(hiperparametros, sort_keys=True)}"
+    clave = _clave_probs(origen, historial)
+    probs = _cargar_probs(clave)
+    if probs is not None:
+        logger.info("  Train, hiperparámetros e historial sin cambios: probabilidades en caché.")
+        return probs
     
     # Ordenar por fecha
     partidos_train.sort(key=lambda p: _parse_fecha(p.fecha) or datetime(1970,1,1))
     
-    # 3. Feature Extraction (Train & Validation)
+    # Feature Extraction (Train & Validation)
     logger.info("Extrayendo features...")
     # Usamos TODOS para el extractor histórico, pero solo entrenamos con subset
     todos = partidos_train + historial
     todos.sort(key=lambda p: _parse_fecha(p.fecha) or datetime(1970,1,1))
     
     extractor = FeatureExtractor(todos)
+    store = FeatureStore(RUTA_STORE_REENTRENO)
     
     # X_train
-    X_train = np.array([extractor.extraer(p).flatten() for p in partidos_train])
+    X_train = store.matriz(extractor, partidos_train)
     y_btts_t = np.array([extraer_targets(p)[2] for p in partidos_train])
     y_over_t = np.array([extraer_targets(p)[3] for p in partidos_train])
     y_res_t  = np.array([extraer_targets(p)[4] for p in partidos_train])
 
     # X_val (Historial)
-    X_val = np.array([extractor.extraer(p).flatten() for p in historial])
+    X_val = store.matriz(extractor, historial)
     # No necesitamos y_val para entrenar, solo para validar targets
     
     logger.info(f"  Dimensiones: X_train={X_train.shape}, X_val={X_val.shape}")
 
-    # 4. Entrenar Modelos (Base + Calibración interna CV)
+    # Entrenar Modelos (Base + Calibración interna CV)
     #    Calibramos con CV sobre train para no tocar historial (que es puro validación)
     
     msg_modelo = "LightGBM + CalibratedCV(cv=3)"
     
     def entrenar_modelo(y, name):
         logger.info(f"  Entrenando {name} ({msg_modelo})...")
-        base = lgb.LGBMClassifier(
-            n_estimators=300, max_depth=6, learning_rate=0.05,
-            random_state=42, n_jobs=-1, verbose=-1
-        )
+        base = _modelo_clasificador(-1, hiperparametros.get(name))
         # Calibración interna 3-fold sobre Training Set
         model = CalibratedClassifierCV(base, method='isotonic', cv=3)
         model.fit(X_train, y)
         return model
 
-    m_btts = entrenar_modelo(y_btts_t, "BTTS")
-    m_over = entrenar_modelo(y_over_t, "OVER")
-    m_res  = entrenar_modelo(y_res_t,  "RESULTADO")
+    m_btts = entrenar_modelo(y_btts_t, "modelo_btts")
+    m_over = entrenar_modelo(y_over_t, "modelo_over25")
+    m_res  = entrenar_modelo(y_res_t,  "modelo_resultado")
 
-    # 5. Predecir sobre Historial (Generar apuestas)
+    # Predecir sobre Historial
     logger.info("Generando probabilidades v2 para el historial de validación...")
     
-    apuestas = {"btts": [], "over": [], "resultado": []}
-    
     # Batch predict
-    probs_btts = m_btts.predict_proba(X_val)[:, 1]
-    probs_over = m_over.predict_proba(X_val)[:, 1]
-    probs_res  = m_res.predict_proba(X_val) # [class 0, 1, 2] -> Empate, Local, Visitante? 
-                                            # Ojo: classes_ suelen ser [0, 1, 2] ordenadas
-                                            # 0=Empate, 1=Local, 2=Visitante (según targets)
-    
-    # Verificar orden de clases
-    # Mis targets: 1=Local, 0=Empate, 2=Visitante? Revisar extraer_targets
-    # extraer_targets: res = 1 (L), 2 (V), 0 (E)
-    # classes_ sklearn: [0, 1, 2] sorted.
-    # index 0 -> class 0 (Empate)
-    # index 1 -> class 1 (Local)
-    # index 2 -> class 2 (Visitante)
+    # classes_ de sklearn ordenadas: [0, 1, 2] -> 0=Empate, 1=Local, 2=Visitante (según extraer_targets)
+    probs = (m_btts.predict_proba(X_val)[:, 1],
+             m_over.predict_proba(X_val)[:, 1],
+             m_res.predict_proba(X_val))
+    _guardar_probs(clave, probs)
+    return probs
+
+def _probabilidades_registro(partidos_raw, historial):
+    """
+    Probabilidades de los modelos base de la versión activa del registro
+    (sin reentrenar), con features del feature store.
+
+    Solo se validan los partidos del historial que esos modelos no vieron
+    de ninguna forma (train, parada temprana ni calibración; ver
+    entrenar.ids_vistos). Devuelve (validación, probabilidades), o None
+    si la versión activa no guarda esos ids o no queda ningún partido.
+    """
+    version = registro.version_actual()
+    vistos = ids_vistos() if version else None
+    if vistos is None:
+        logger.info("  ⚠ La versión activa del registro no indica qué partidos vio al entrenar.")
+        return None
+
+    validacion = [p for p in historial if int(p.id_partido) not in vistos]
+    logger.info(f"  Modelos del registro ({version}): {len(validacion)} partidos del historial "
+                f"({len(historial) - len(validacion)} excluidos por estar en su entrenamiento)")
+    if not validacion:
+        return None
+
+    clave = _clave_probs(f"registro:{version}", validacion)
+    probs = _cargar_probs(clave)
+    if probs is not None:
+        logger.info("  Probabilidades en caché.")
+        return validacion, probs
+
+    directorio = directorio_modelos()
+    m_btts, m_over, m_res = (cargar_modelo(n, directorio=directorio)
+                             for n in ("modelo_btts", "modelo_over25", "modelo_resultado"))
+    X_val = FeatureStore().matriz(cargar_extractor(partidos_raw), validacion)
+    probs = (m_btts.predict_proba(X_val)[:, 1],
+             m_over.predict_proba(X_val)[:, 1],
+             m_res.predict_proba(X_val))
+    _guardar_probs(clave, probs)
+    return validacion, probs
+
+# ─── Pipeline Completo ───────────────────────────────────────────
+
+def pipeline_entrenamiento_optimizacion(reutilizar_modelos=False):
+    """
+    Apuestas simuladas sobre el historial de validación.
+
+    Args:
+        reutilizar_modelos: Usar los modelos base del registro en vez de
+            reentrenar (si no es posible, se reentrena)
+    """
+    logger.info("=== INICIO: Pipeline de Optimización Híbrida ===")
+
+    # 1. Cargar datos
+    logger.info("Cargando `partidos.pkl` (Training candidates)...")
+    partidos_raw = cargar_partidos() 
     
+    logger.info("Cargando `historial.pkl` (Validation set)...")
+    historial = cargar_historial()
+
+    # 2. Probabilidades sobre el historial
+    reutilizadas = _probabilidades_registro(partidos_raw, historial) if reutilizar_modelos else None
+    if reutilizadas is not None:
+        historial, (probs_btts, probs_over, probs_res) = reutilizadas
+    else:
+        if reutilizar_modelos:
+            logger.info("  Se reentrenan los modelos.")
+        probs_btts, probs_over, probs_res = _probabilidades_reentreno(partidos_raw, historial)
+
+    # 3. Generar apuestas
+    apuestas = {"btts": [], "over": [], "resultado": []}
+
     for i, p in enumerate(historial):
         # Odds reales de historial
         c_btts = _safe_float(getattr(p, 'cuota_btts', -1))
@@ -195,41 +306,20 @@ def pipeline_entrenamiento_optimizacion():
 
     return apuestas
 
-# ─── Grid Search y Guardado (Reutilizado) ─────────────────────────
-
-def simular_apuestas(datos, umbral_prob, margen_min):
-    ganancias = []
-    for d in datos:
-        prob = d["prob"]
-        cuota = d["cuota"]
-        value = prob - (1.0 / cuota)
-        if prob >= umbral_prob and value >= margen_min:
-            ganancia = cuota - 1 if d["acierto"] else -1
-            ganancias.append(ganancia)
-    return ganancias, len(ganancias)
-
-def grid_search(datos, prob_range, margen_range, min_apuestas=15):
-    mejor = {"roi": -999, "umbral_prob": None, "margen": None, "apuestas": 0, "aciertos": 0}
-    for umbral in prob_range:
-        for margen in margen_range:
-            g, n = simular_apuestas(datos, umbral, margen)
-            if n >= min_apuestas:
-                roi = sum(g) / n * 100
-                if roi > mejor["roi"]:
-                    aciertos = sum(1 for x in g if x > 0)
-                    mejor = {
-                        "roi": round(roi, 2),
-                        "umbral_prob": round(float(umbral), 2),
-                        "margen": round(float(margen), 2),
-                        "apuestas": n,
-                        "aciertos": aciertos,
-                        "accuracy": round(aciertos / n * 100, 1),
-                        "beneficio": round(sum(g), 2)
-                    }
-    return mejor
+# ─── Optimización y Guardado ──────────────────────────────────────
+
+# Ventanas de búsqueda de cada estrategia: ((prob. desde, hasta), (margen desde, hasta), mínimo de apuestas)
+ESTRATEGIAS = {
+    "agresivo": ((0.40, 0.60), (-0.05, 0.05), 30),
+    "moderado": ((0.50, 0.70), (0.00, 0.10), 20),
+    # Conservador (Alta Probabilidad, Buen Margen)
+    # Relajamos un poco para encontrar apuestas (antes 0.60/0.05 daba 0 bets)
+    "conservador": ((0.55, 0.80), (0.025, 0.10), 10),
+}
+
 
 def optimizar(apuestas):
-    res = {"agresivo": {}, "moderado": {}, "conservador": {}}
+    res = {estrategia: {} for estrategia in ESTRATEGIAS}
     
     for mercado in ["btts", "over", "resultado"]:
         datos = apuestas.get(mercado, [])
@@ -237,22 +327,19 @@ def optimizar(apuestas):
             continue
         
         logger.info(f"  ── {mercado.upper()} ({len(datos)} apuestas) ──")
-        
-        # Agresivo
-        agr = grid_search(datos, np.arange(0.40, 0.60, 0.01), np.arange(-0.05, 0.05, 0.005), min_apuestas=30)
-        res["agresivo"][mercado] = agr
-        logger.info(f"    Agresivo: ROI={agr['roi']:+.1f}% ({agr['apuestas']} ap, {agr.get('accuracy',0)}% acc)")
-        
-        # Moderado
-        mod = grid_search(datos, np.arange(0.50, 0.70, 0.01), np.arange(0.00, 0.10, 0.005), min_apuestas=20)
-        res["moderado"][mercado] = mod
-        logger.info(f"    Moderado: ROI={mod['roi']:+.1f}% ({mod['apuestas']} ap, {mod.get('accuracy',0)}% acc)")
-
-        # Conservador (Alta Probabilidad, Buen Margen)
-        # Relajamos un poco para encontrar apuestas (antes 0.60/0.05 daba 0 bets)
-        con = grid_search(datos, np.arange(0.55, 0.80, 0.01), np.arange(0.025, 0.10, 0.005), min_apuestas=10)
-        res["conservador"][mercado] = con
-        logger.info(f"    Conservador: ROI={con['roi']:+.1f}% ({con['apuestas']} ap, {con.get('accuracy',0)}% acc)")
+        prob, cuota, acierto = motor_umbrales.arrays(datos)
+        optimos = motor_umbrales.optimizar_estrategias(prob, cuota, acierto, ESTRATEGIAS)
+        # Mismos remuestreos para las tres estrategias del mercado
+        pesos = motor_umbrales.pesos_bootstrap(len(prob))
+
+        for estrategia, r in optimos.items():
+            ventana_u, ventana_m, min_apuestas = ESTRATEGIAS[estrategia]
+            r.update(motor_umbrales.robustez(prob, cuota, acierto, r, ventana_u, ventana_m,
+                                             min_apuestas, pesos))
+            res[estrategia][mercado] = r
+            logger.info(f"    {estrategia.capitalize()}: ROI={r['roi']:+.1f}% "
+                        f"({r['apuestas']} ap, {r.get('accuracy',0)}% acc) "
+                        f"IC95={r['ic_roi']} estabilidad={r['estabilidad']}")
         
     return res
 
@@ -262,12 +349,12 @@ def guardar_umbrales(resultados):
         json.dump(resultados, f, indent=2, ensure_ascii=False)
     logger.info(f"\n✓ Umbrales guardados en {ruta}")
 
-def run():
+def run(reutilizar_modelos=False):
     print("╔═════════════════════════════════════════════════╗")
     print("║  RDScore — Optimización Híbrida (Train-Val) v2  ║")
     print("╚═════════════════════════════════════════════════╝\n")
     
-    apuestas = pipeline_entrenamiento_optimizacion()
+    apuestas = pipeline_entrenamiento_optimizacion(reutilizar_modelos)
     if not apuestas: return
     
     logger.info("\nOptimizando umbrales sobre el HIDDEN TEST SET (Historial)...")
@@ -0,0 +1,156 @@
+"""
+Capa de recomendaciones v2 vectorizada.
+
+A partir de las salidas de los modelos base para n partidos calcula, con
+operaciones de NumPy sobre todos los partidos y mercados a la vez, las
+recomendaciones por estrategia (umbral de probabilidad de
+umbrales_v2.json) filtradas por value betting (prob. del modelo menos
+prob. implícita de la cuota >= margen), y construye los dicts
+`prediccion` con el mismo formato que v1.
+
+Son funciones puras: no leen disco ni modelos, solo arrays y `optimos`.
+
+Reglas (por mercado y estrategia):
+- Si alguna cuota del mercado es <= 1 (sin cuotas), no se recomienda.
+- Si la estrategia no tiene el mercado o su umbral es None, no se
+  recomienda.
+- Si no, se recomienda si prob_max >= umbral y, cuando hay cuota (> 1)
+  para la clase predicha (para 1X2, para las tres), además
+  prob_max - 1 / cuota >= margen (margen None = no se recomienda).
+"""
+
+import numpy as np
+
+# (clave en umbrales_v2.json, clave en el dict de recomendación)
+ESTRATEGIAS = (
+    ('conservador', 'conservadora'),
+    ('moderado', 'moderada'),
+    ('agresivo', 'arriesgada'),
+)
+
+MERCADOS = ('resultado', 'btts', 'over')
+
+# Columnas de la matriz de cuotas
+CUOTAS = ('cuota_local', 'cuota_empate', 'cuota_visitante',
+          'cuota_btts', 'cuota_btts_no', 'cuota_over', 'cuota_under')
+
+
+def matriz_cuotas(partidos):
+    """Cuotas de `partidos` como array float64 (n, 7) en el orden de CUOTAS."""
+    return np.array([[float(getattr(p, c)) for c in CUOTAS] for p in partidos],
+                    dtype=np.float64).reshape(len(partidos), len(CUOTAS))
+
+
+def tablas_umbrales(optimos):
+    """
+    Umbrales y márgenes de `optimos` como arrays (3 mercados, 3 estrategias)
+    en el orden de MERCADOS / ESTRATEGIAS; None (o un mercado ausente)
+    pasa a NaN, que nunca supera una comparación y por tanto nunca
+    recomienda.
+    """
+    def _valor(s, m, campo):
+        valor = optimos.get(s, {}).get(m, {}).get(campo)
+        return np.nan if valor is None else valor
+
+    def _tabla(campo):
+        return np.array([[_valor(s, m, campo) for s, _ in ESTRATEGIAS] for m in MERCADOS],
+                        dtype=np.float64)
+    return _tabla('umbral_prob'), _tabla('margen')
+
+
+def _mercado(P, cuotas_clase, umbrales, margenes, value_si_todas=False):
+    """
+    Predicción, probabilidad y recomendaciones (n, 3) de un mercado.
+
+    Args:
+        P: Probabilidades (n, k) del modelo
+        cuotas_clase: Cuota de cada clase (n, k), en el orden de las columnas de P
+        umbrales, margenes: (3,) por estrategia
+        value_si_todas: El filtro de value exige todas las cuotas > 1
+                        (1X2) y no solo la de la clase predicha
+    """
+    filas = np.arange(len(P))
+    pred = P.argmax(axis=1)
+    prob = P[filas, pred]
+    cuota = cuotas_clase[filas, pred]
+    # `not (c <= 1)` y no `c > 1`: una cuota NaN no invalida el mercado
+    valido = ~(cuotas_clase <= 1.0).any(axis=1)
+    con_value = (cuotas_clase > 1.0).all(axis=1) if value_si_todas else cuota > 1.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ventaja = prob - 1.0 / cuota
+    rec = (valido[:, None]
+           & (prob[:, None] >= umbrales[None, :])
+           & (~con_value[:, None] | (ventaja[:, None] >= margenes[None, :])))
+    return pred, prob, rec
+
+
+def recomendaciones(prob_res, prob_btts, prob_over, cuotas, optimos):
+    """
+    Recomendaciones de los tres mercados para n partidos.
+
+    Args:
+        prob_res: (n, 3) probabilidades empate / local / visitante
+        prob_btts, prob_over: (n, 2) probabilidades no / sí
+        cuotas: (n, 7) ver matriz_cuotas
+        optimos: Contenido de umbrales_v2.json
+
+    Returns:
+        {mercado: (pred (n,), prob_pred (n,), rec (n, 3) bool)}
+    """
+    umbrales, margenes = tablas_umbrales(optimos)
+    cl, ce, cv, cbtts, cbtts_n, co, cu = cuotas.T
+    clases = {
+        'resultado': (prob_res, np.column_stack([ce, cl, cv])),
+        'btts': (prob_btts, np.column_stack([cbtts_n, cbtts])),
+        'over': (prob_over, np.column_stack([cu, co])),
+    }
+    return {m: _mercado(np.asarray(clases[m][0], dtype=np.float64), clases[m][1],
+                        umbrales[k], margenes[k], value_si_todas=(m == 'resultado'))
+            for k, m in enumerate(MERCADOS)}
+
+
+def _rec_dict(fila):
+    return {clave: int(fila[k]) for k, (_, clave) in enumerate(ESTRATEGIAS)}
+
+
+def predicciones(goles_local, goles_visitante, prob_res, prob_btts, prob_over,
+                 cuotas, optimos):
+    """
+    Dicts `prediccion` (formato v1) de n partidos.
+
+    Returns:
+        Lista de n dicts
+    """
+    prob_res = np.asarray(prob_res, dtype=np.float64)
+    rec = recomendaciones(prob_res, prob_btts, prob_over, cuotas, optimos)
+    pred_res, max_res, rec_res = rec['resultado']
+    pred_btts, p_btts, rec_btts = rec['btts']
+    pred_over, p_over, rec_over = rec['over']
+
+    salida = []
+    for i in range(len(prob_res)):
+        salida.append({
+            'goles_esperados': {'local': round(float(goles_local[i]), 2),
+                                'visitante': round(float(goles_visitante[i]), 2)},
+            'resultado_1x2': {
+                'prediccion': ['Empate', 'Local', 'Visitante'][pred_res[i]],
+                'probabilidades': {
+                    'local': float(prob_res[i, 1]),
+                    'empate': float(prob_res[i, 0]),
+                    'visitante': float(prob_res[i, 2])
+                },
+                'probabilidad_max': float(max_res[i]),
+                'recomendacion': _rec_dict(rec_res[i])
+            },
+            'btts': {
+                'prediccion': 'Sí' if pred_btts[i] == 1 else 'No',
+                'probabilidad': float(p_btts[i]),
+                'recomendacion': _rec_dict(rec_btts[i])
+            },
+            'over25': {
+                'prediccion': 'Over' if pred_over[i] == 1 else 'Under',
+                'probabilidad': float(p_over[i]),
+                'recomendacion': _rec_dict(rec_over[i])
+            }
+        })
+    return salida
@@ -0,0 +1,208 @@
+"""
+Registro versionado de los modelos base v2.
+
+Cada entrenamiento escribe un juego completo de modelos en su propio
+directorio y solo al terminar se promueve, cambiando atómicamente el
+symlink `modelos_v2/actual`:
+
+    modelos_v2/
+        actual -> registro/20260301_031502
+        registro/
+            historial.json              pila de versiones promovidas
+            20260228_031455/
+                manifiesto.json         métricas, modo, huella, rondas...
+                ids_vistos.npy          partidos vistos al entrenar/calibrar
+                modelo_btts.pkl / .json / .lgb.txt
+                ...
+            20260301_031502/
+                ...
+
+Un entrenamiento fallido nunca toca `actual`, y quien carga modelos
+resuelve el symlink una vez y lee un juego coherente, sin locks.
+
+Uso:
+  python -m services.ml_v2.registro list
+  python -m services.ml_v2.registro promote 20260228_031455
+  python -m services.ml_v2.registro rollback
+"""
+
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+
+from config import BASE_DIR
+
+MODELOS_DIR = os.path.join(BASE_DIR, 'modelos_v2')
+REGISTRO_DIR = os.path.join(MODELOS_DIR, 'registro')
+ACTUAL = os.path.join(MODELOS_DIR, 'actual')
+RUTA_HISTORIAL = os.path.join(REGISTRO_DIR, 'historial.json')
+
+VERSIONES_A_CONSERVAR = 10
+
+
+# =====================================================================
+# VERSIONES
+# =====================================================================
+
+def ruta_version(version):
+    return os.path.join(REGISTRO_DIR, version)
+
+
+def nueva_version():
+    """Crea el directorio de una versión nueva (sin promover). Returns: (versión, ruta)."""
+    os.makedirs(REGISTRO_DIR, exist_ok=True)
+    base = datetime.now().strftime("%Y%m%d_%H%M%S")
+    version, n = base, 1
+    while os.path.exists(ruta_version(version)):
+        n += 1
+        version = f"{base}_{n}"
+    os.makedirs(ruta_version(version))
+    return version, ruta_version(version)
+
+
+def versiones():
+    """Versiones completas (con manifiesto), de la más antigua a la más reciente."""
+    if not os.path.isdir(REGISTRO_DIR):
+        return []
+    return sorted(v for v in os.listdir(REGISTRO_DIR)
+                  if os.path.exists(os.path.join(ruta_version(v), 'manifiesto.json')))
+
+
+def guardar_manifiesto(version, datos):
+    ruta = os.path.join(ruta_version(version), 'manifiesto.json')
+    with open(ruta, 'w') as f:
+        json.dump({'version': version, **datos}, f, indent=2, default=float)
+
+
+def leer_manifiesto(version):
+    with open(os.path.join(ruta_version(version), 'manifiesto.json'), 'r') as f:
+        return json.load(f)
+
+
+def version_actual():
+    """Versión a la que apunta `actual` (None si no hay registro)."""
+    if not os.path.islink(ACTUAL):
+        return None
+    return os.path.basename(os.readlink(ACTUAL))
+
+
+def directorio_actual():
+    """
+    Ruta real del juego de modelos activo. Resolverla una sola vez y
+    cargar todos los modelos de ahí garantiza un juego coherente aunque
+    otro proceso promueva una versión a la vez.
+    """
+    version = version_actual()
+    return ruta_version(version) if version else None
+
+
+# =====================================================================
+# PROMOCIÓN / ROLLBACK
+# =====================================================================
+
+def _leer_historial():
+    if not os.path.exists(RUTA_HISTORIAL):
+        return []
+    with open(RUTA_HISTORIAL, 'r') as f:
+        return json.load(f)
+
+
+def _guardar_historial(historial):
+    tmp = RUTA_HISTORIAL + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(historial, f, indent=2)
+    os.replace(tmp, RUTA_HISTORIAL)
+
+
+def _apuntar_actual(version):
+    """Cambio atómico del symlink: nadie ve nunca `actual` a medias."""
+    tmp = ACTUAL + '.tmp'
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    os.symlink(os.path.join('registro', version), tmp)
+    os.replace(tmp, ACTUAL)
+
+
+def promover(version, motivo=""):
+    """Activa `version` y la apila en el historial."""
+    if version not in versiones():
+        raise ValueError(f"Versión {version} inexistente o incompleta")
+    _apuntar_actual(version)
+    historial = _leer_historial()
+    historial.append({'version': version, 'motivo': motivo,
+                      'fecha': datetime.now().isoformat(timespec='seconds')})
+    _guardar_historial(historial)
+
+
+def rollback():
+    """
+    Vuelve a la versión promovida antes de la actual (desapila la actual).
+    Returns: versión activada.
+    """
+    historial = _leer_historial()
+    disponibles = set(versiones())
+    while historial and historial[-1]['version'] == version_actual():
+        historial.pop()
+    while historial and historial[-1]['version'] not in disponibles:
+        historial.pop()
+    if not historial:
+        raise ValueError("No hay versión anterior a la que volver")
+    _apuntar_actual(historial[-1]['version'])
+    _guardar_historial(historial)
+    return historial[-1]['version']
+
+
+def limpiar(conservar=VERSIONES_A_CONSERVAR):
+    """Borra las versiones antiguas, salvo las `conservar` más recientes y la activa."""
+    actual = version_actual()
+    for version in versiones()[:-conservar]:
+        if version != actual:
+            shutil.rmtree(ruta_version(version), ignore_errors=True)
+    disponibles = set(versiones())
+    historial = _leer_historial()
+    _guardar_historial([h for h in historial if h['version'] in disponibles])
+
+
+def descartar(version):
+    """Borra una versión sin promover (p.ej. de un entrenamiento fallido)."""
+    if version != version_actual():
+        shutil.rmtree(ruta_version(version), ignore_errors=True)
+
+
+# =====================================================================
+# CLI
+# =====================================================================
+
+def _listar():
+    actual = version_actual()
+    for version in versiones():
+        m = leer_manifiesto(version)
+        met = m.get('metricas') or {}
+        resumen = ", ".join(f"{k} ll={v.get('logloss')}" for k, v in met.items()
+                            if isinstance(v, dict))
+        marca = "*" if version == actual else " "
+        print(f"{marca} {version}  {m.get('modo', ''):<11} {resumen}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Registro de modelos v2")
+    sub = parser.add_subparsers(dest='orden', required=True)
+    sub.add_parser('list', help="Listar versiones (* = activa)")
+    p = sub.add_parser('promote', help="Activar una versión")
+    p.add_argument('version')
+    sub.add_parser('rollback', help="Volver a la versión anterior")
+    args = parser.parse_args(argv)
+
+    if args.orden == 'list':
+        _listar()
+    elif args.orden == 'promote':
+        promover(args.version, motivo="manual")
+        print(f"Activa: {args.version}")
+    else:
+        print(f"Activa: {rollback()}")
+
+
+if __name__ == "__main__":
+    main()
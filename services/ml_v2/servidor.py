@@ -0,0 +1,275 @@
+"""
+Servidor de inferencia v2 en memoria.
+
+Mantiene cargados en el proceso web los 5 modelos base (versión activa
+del registro), un FeatureExtractor con el historial y los umbrales de
+umbrales_v2.json, para predecir un partido bajo demanda con las cuotas
+del momento (ver /api/v1/predecir/<id_partido>).
+
+- Carga perezosa: la primera petición de cada worker carga todo; las
+  siguientes reutilizan la instancia.
+- Sin tormentas de recarga: como mucho cada REVISION_SEGUNDOS se
+  comprueba (readlink + dos stat) si cambió la versión activa de los
+  modelos, partidos.pkl o umbrales_v2.json, y solo se recarga lo que
+  cambió. La recarga se hace sin bloquear las peticiones, que siguen
+  con el estado anterior hasta que el nuevo se sustituye de una vez.
+- Caché LRU de dos niveles: salidas de los modelos por partido (los
+  features no dependen de las cuotas) y predicción final por partido +
+  cuotas. Van con cada estado, así que se vacían al recargar; el lock
+  solo protege estas cachés, no la inferencia.
+
+Con un servidor que precarga la app antes de hacer fork (gunicorn
+--preload, uWSGI sin lazy-apps), create_app llama a `precargar()` si
+PRECARGAR_MODELOS=1 y los workers comparten los modelos por
+copy-on-write.
+
+Los procesos web nunca escriben los índices persistidos del extractor
+(los mantiene el proceso nocturno): se cargan en modo solo lectura.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from config import BASE_DIR
+from services.data_fetching.obtener_partidos import cargar_partidos
+from services.ml_v2 import recomendaciones, registro
+from services.ml_v2.entrenar import MODELOS_BASE, cargar_modelo, directorio_modelos, predecir_base
+from services.ml_v2.feature_store import cargar_extractor
+
+RUTA_PARTIDOS = os.path.join(BASE_DIR, 'datos', 'partidos.pkl')
+RUTA_UMBRALES = os.path.join(BASE_DIR, 'datos', 'umbrales_v2.json')
+
+REVISION_SEGUNDOS = 30
+TAMANO_CACHE = 2048
+
+# Atributo del Partido -> clave en la columna JSON `cuotas` de la BD
+CLAVES_CUOTAS_SQL = {
+    'cuota_local': '1',
+    'cuota_empate': 'X',
+    'cuota_visitante': '2',
+    'cuota_btts': 'BTTS',
+    'cuota_btts_no': 'BTTS_NO',
+    'cuota_over': 'O25',
+    'cuota_under': 'U25',
+}
+
+
+def cuotas_desde_sql(cuotas):
+    """Cuotas de la columna JSON de models.Partido con los nombres de recomendaciones.CUOTAS."""
+    cuotas = cuotas or {}
+    return {attr: -1 if cuotas.get(clave) is None else cuotas[clave]
+            for attr, clave in CLAVES_CUOTAS_SQL.items()}
+
+
+def _mtime(ruta):
+    try:
+        return os.stat(ruta).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class _LRU:
+    """Diccionario acotado con expulsión del menos usado recientemente."""
+
+    def __init__(self, tamano):
+        self.tamano = tamano
+        self.datos = OrderedDict()
+
+    def get(self, clave):
+        valor = self.datos.get(clave)
+        if valor is not None:
+            self.datos.move_to_end(clave)
+        return valor
+
+    def put(self, clave, valor):
+        self.datos[clave] = valor
+        self.datos.move_to_end(clave)
+        if len(self.datos) > self.tamano:
+            self.datos.popitem(last=False)
+
+    def clear(self):
+        self.datos.clear()
+
+
+class _Estado:
+    """
+    Lo que se sirve en un momento dado: modelos, extractor, partidos,
+    umbrales y sus cachés. Se construye entero fuera del lock y se
+    sustituye de una vez, así que una petición nunca mezcla versiones.
+    """
+
+    def __init__(self, version, modelos, extractor, partidos, optimos,
+                 mtime_partidos, mtime_umbrales, tamano_cache):
+        self.version = version
+        self.modelos = modelos
+        self.extractor = extractor
+        self.partidos = partidos
+        self.optimos = optimos
+        self.mtime_partidos = mtime_partidos
+        self.mtime_umbrales = mtime_umbrales
+        self.base = _LRU(tamano_cache)          # id -> salidas de los modelos
+        self.predicciones = _LRU(tamano_cache)  # (id, cuotas) -> prediccion
+
+
+class ServidorModelos:
+    """
+    Uso:
+        prediccion = obtener_servidor().predecir(id_partido, cuotas)
+    """
+
+    def __init__(self, tamano_cache=TAMANO_CACHE):
+        self.tamano_cache = tamano_cache
+        self._lock = threading.Lock()          # Solo cachés LRU y contadores
+        self._lock_recarga = threading.Lock()  # Una recarga a la vez
+        self._estado = None
+        self._revisado = 0.0
+        self.aciertos = 0
+        self.fallos = 0
+
+    @property
+    def version(self):
+        return self._estado.version if self._estado else None
+
+    # =================================================================
+    # CARGA / RECARGA
+    # =================================================================
+
+    def _cargar(self, anterior):
+        """
+        Estado nuevo con lo que haya cambiado en disco respecto a
+        `anterior` (el mismo objeto si no cambió nada). El extractor se
+        reconstruye desde los índices persistidos en vez de sincronizar
+        el que están usando otras peticiones.
+        """
+        version = registro.version_actual()
+        mtime_partidos = _mtime(RUTA_PARTIDOS)
+        mtime_umbrales = _mtime(RUTA_UMBRALES)
+        if anterior is not None and (version, mtime_partidos, mtime_umbrales) == (
+                anterior.version, anterior.mtime_partidos, anterior.mtime_umbrales):
+            return anterior
+
+        if anterior is not None and version == anterior.version:
+            modelos = anterior.modelos
+        else:
+            directorio = directorio_modelos()
+            modelos = tuple(cargar_modelo(n, directorio=directorio) for n in MODELOS_BASE)
+
+        if anterior is not None and mtime_partidos == anterior.mtime_partidos:
+            extractor, partidos = anterior.extractor, anterior.partidos
+        else:
+            todos = cargar_partidos()
+            extractor = cargar_extractor(todos, guardar=False)
+            partidos = {int(p.id_partido): p for p in todos}
+
+        if anterior is not None and mtime_umbrales == anterior.mtime_umbrales:
+            optimos = anterior.optimos
+        else:
+            with open(RUTA_UMBRALES, 'r') as f:
+                optimos = json.load(f)
+
+        return _Estado(version, modelos, extractor, partidos, optimos,
+                       mtime_partidos, mtime_umbrales, self.tamano_cache)
+
+    def _refrescar(self):
+        """
+        Estado actual, recargando lo que haya cambiado en disco como mucho
+        cada REVISION_SEGUNDOS. La carga no toma el lock de las cachés: las
+        demás peticiones siguen sirviéndose con el estado anterior (y no
+        esperan si ya hay otro hilo recargando) hasta que se sustituye.
+        """
+        estado = self._estado
+        if estado is not None and time.monotonic() - self._revisado < REVISION_SEGUNDOS:
+            return estado
+        # Sin estado todavía hay que esperar a la primera carga
+        if not self._lock_recarga.acquire(blocking=estado is None):
+            return estado
+        try:
+            estado = self._estado
+            if estado is not None and time.monotonic() - self._revisado < REVISION_SEGUNDOS:
+                return estado  # Recargado por otro hilo mientras se esperaba
+            self._revisado = time.monotonic()
+            self._estado = self._cargar(estado)
+            return self._estado
+        finally:
+            self._lock_recarga.release()
+
+    # =================================================================
+    # PREDICCIÓN
+    # =================================================================
+
+    def predecir(self, id_partido, cuotas=None):
+        """
+        Predicción (mismo formato que predecir_partido) de un partido con
+        `cuotas` ({atributo de recomendaciones.CUOTAS: cuota}; None = las
+        de partidos.pkl).
+
+        Raises:
+            KeyError: si el partido no está en partidos.pkl
+        """
+        id_partido = int(id_partido)
+        estado = self._refrescar()
+        partido = estado.partidos[id_partido]
+        cuotas = cuotas or {c: getattr(partido, c) for c in recomendaciones.CUOTAS}
+        fila = np.array([[float(cuotas[c]) for c in recomendaciones.CUOTAS]])
+        clave = (id_partido, fila.tobytes())
+
+        with self._lock:
+            prediccion = estado.predicciones.get(clave)
+            if prediccion is not None:
+                self.aciertos += 1
+                return prediccion
+            self.fallos += 1
+            base = estado.base.get(id_partido)
+
+        # Inferencia fuera del lock (el estado no se modifica)
+        if base is None:
+            X, _ = estado.extractor.extraer_lote([partido])
+            base = predecir_base(X, *estado.modelos)
+            with self._lock:
+                estado.base.put(id_partido, base)
+
+        prediccion = recomendaciones.predicciones(*base, fila, estado.optimos)[0]
+        with self._lock:
+            estado.predicciones.put(clave, prediccion)
+        return prediccion
+
+    def estado(self):
+        estado = self._estado
+        with self._lock:
+            return {
+                'version': self.version,
+                'partidos': len(estado.partidos) if estado else 0,
+                'cache': len(estado.predicciones.datos) if estado else 0,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+            }
+
+
+# =====================================================================
+# INSTANCIA DEL PROCESO
+# =====================================================================
+
+_servidor = None
+_lock_servidor = threading.Lock()
+
+
+def obtener_servidor():
+    """Instancia única por proceso (se carga en la primera petición)."""
+    global _servidor
+    if _servidor is None:
+        with _lock_servidor:
+            if _servidor is None:
+                _servidor = ServidorModelos()
+    return _servidor
+
+
+def precargar():
+    """Carga modelos, historial y umbrales ya (p.ej. antes del fork de los workers)."""
+    servidor = obtener_servidor()
+    servidor._refrescar()
+    return servidor
@@ -205,9 +205,13 @@ def guardar_partidos_en_bd(partidos_legacy):
 def guardar_predicciones_en_bd(partidos_predichos):
     """
     Actualiza SOLO las cuotas y predicciones de partidos existentes.
+
+    Returns:
+        True si se han confirmado en SQL, False si no (sin contexto de
+        app o error)
     """
     if not current_app:
-        return
+        return False
 
     try:
         count = 0
@@ -239,7 +243,9 @@ def guardar_predicciones_en_bd(partidos_predichos):
         
         db.session.commit()
         logger.info(f"SQL Persistence: Updated {count} predictions.")
+        return True
 
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error saving predictions to SQL: {e}")
+        return False
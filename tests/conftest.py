@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Ejecutar desde cualquier directorio: la raíz del repo en sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
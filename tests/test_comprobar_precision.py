@@ -0,0 +1,136 @@
+import random
+
+import pytest
+
+pytest.importorskip('flask')
+
+from services.analysis.comprobar_precision import (
+    APUESTA_POR_PARTIDO, ESTRATEGIAS_LIBRO, MERCADOS_LIBRO,
+    _agregados_libro, _filas_libro, _resultados_libro, apuestas_partido, cuotas_validas,
+)
+
+
+# ============================================================
+# Referencia: el bucle de comprobar_partidos antes del libro de ROI,
+# sobre el dict de Partido.to_dict()
+# ============================================================
+
+def _to_dict(resultado, ambos_marcan, mas_2_5, cuotas, prediccion, info_extra):
+    c, i = cuotas or {}, info_extra or {}
+    return {
+        'cuota_local': c.get('1', -1), 'cuota_empate': c.get('X', -1),
+        'cuota_visitante': c.get('2', -1), 'cuota_over': c.get('O25', -1),
+        'cuota_under': c.get('U25', -1), 'cuota_btts': c.get('BTTS', -1),
+        'cuota_btts_no': c.get('BTTS_NO', -1),
+        'resultado': resultado if resultado is not None else -1,
+        'ambos_marcan': ambos_marcan if ambos_marcan is not None else i.get('ambos_marcan', -1),
+        'mas_2_5': mas_2_5 if mas_2_5 is not None else i.get('mas_2_5', -1),
+        'prediccion': prediccion,
+    }
+
+
+def _bucle_antiguo(partidos):
+    totales = {(m, e): [0, 0, 0.0] for m in MERCADOS_LIBRO for e, _ in ESTRATEGIAS_LIBRO}
+
+    def anotar(mercado, pred, acierto, cuota):
+        for estrategia, clave_rec in ESTRATEGIAS_LIBRO:
+            if pred.get('recomendacion').get(clave_rec) != 1:
+                continue
+            fila = totales[(mercado, estrategia)]
+            fila[0] += 1
+            if acierto:
+                fila[1] += 1
+                fila[2] += (float(cuota) - 1) * APUESTA_POR_PARTIDO
+            else:
+                fila[2] -= APUESTA_POR_PARTIDO
+
+    for _, *datos in partidos:
+        p = _to_dict(*datos)
+        prediccion = p['prediccion']
+
+        if cuotas_validas([p['cuota_local'], p['cuota_empate'], p['cuota_visitante']]):
+            pred = prediccion.get('resultado_1x2')
+            p_resultado = {'Local': 1, 'Empate': 0, 'Visitante': 2}.get(pred.get('prediccion'), -1)
+            cuota = p['cuota_local'] if p_resultado == 1 \
+                else p['cuota_empate'] if p_resultado == 0 \
+                else p['cuota_visitante']
+            anotar('resultado', pred, p_resultado == p['resultado'], cuota)
+
+        if cuotas_validas([p['cuota_btts'], p['cuota_btts_no']]):
+            pred = prediccion.get('btts')
+            p_btts = {'Sí': 1, 'No': 0}.get(pred.get('prediccion'), -1)
+            cuota = p['cuota_btts'] if p_btts == 1 else p['cuota_btts_no']
+            anotar('btts', pred, p_btts == p['ambos_marcan'], cuota)
+
+        if cuotas_validas([p['cuota_over'], p['cuota_under']]):
+            pred = prediccion.get('over25')
+            p_over = {'Over': 1, 'Under': 0}.get(pred.get('prediccion'), -1)
+            cuota = p['cuota_over'] if p_over == 1 else p['cuota_under']
+            anotar('over25', pred, p_over == p['mas_2_5'], cuota)
+    return totales
+
+
+def _partidos(n, semilla):
+    rng = random.Random(semilla)
+    opciones = {'resultado_1x2': ['Local', 'Empate', 'Visitante', None],
+                'btts': ['Sí', 'No', None], 'over25': ['Over', 'Under', None]}
+    partidos = []
+    for _ in range(n):
+        cuotas = {c: round(rng.uniform(1.05, 6.0), 2)
+                  for c in ('1', 'X', '2', 'BTTS', 'BTTS_NO', 'O25', 'U25')
+                  if rng.random() > 0.05}
+        if rng.random() < 0.05:
+            cuotas[rng.choice(list(cuotas) or ['1'])] = -1
+        prediccion = {
+            clave: {'prediccion': rng.choice(valores),
+                    'recomendacion': {r: rng.choice([0, 1, 1, None])
+                                      for r in ('moderada', 'conservadora', 'arriesgada')}}
+            for clave, valores in opciones.items()
+        }
+        ambos_marcan = rng.choice([0, 1, None])
+        mas_2_5 = rng.choice([0, 1, None])
+        info_extra = {'ambos_marcan': rng.choice([0, 1]), 'mas_2_5': rng.choice([0, 1])} \
+            if rng.random() < 0.5 else None
+        partidos.append((rng.randrange(10), rng.choice([0, 1, 2]), ambos_marcan, mas_2_5,
+                         cuotas, prediccion, info_extra))
+    return partidos
+
+
+# ============================================================
+# Tests
+# ============================================================
+
+@pytest.mark.parametrize('semilla', [0, 1, 2])
+def test_libro_igual_que_bucle_antiguo(semilla):
+    partidos = _partidos(2000, semilla)
+    libro, partidos_dia = _filas_libro(partidos)
+
+    totales = {(m, e): [0, 0, 0.0] for m in MERCADOS_LIBRO for e, _ in ESTRATEGIAS_LIBRO}
+    for (_, mercado, estrategia), (apuestas, aciertos, beneficio) in libro.items():
+        fila = totales[(mercado, estrategia)]
+        fila[0] += apuestas
+        fila[1] += aciertos
+        fila[2] += beneficio
+
+    esperado = _bucle_antiguo(partidos)
+    assert sum(partidos_dia.values()) == len(partidos)
+    for clave, (apuestas, aciertos, beneficio) in esperado.items():
+        assert totales[clave][:2] == [apuestas, aciertos], clave
+        assert totales[clave][2] == pytest.approx(beneficio), clave
+
+
+def test_resultados_sin_libro_igual_que_bucle_antiguo():
+    partidos = _partidos(2000, 3)
+    resultados = _resultados_libro(_agregados_libro(*_filas_libro(partidos)))
+
+    assert resultados['partidos_jugados'] == len(partidos)
+    for (mercado, estrategia), (apuestas, aciertos, beneficio) in _bucle_antiguo(partidos).items():
+        assert resultados[mercado][estrategia] == apuestas
+        assert resultados[mercado][f"aciertos_{estrategia}"] == aciertos
+        assert resultados['beneficio'][mercado][estrategia] == pytest.approx(beneficio, abs=1e-3)
+
+
+def test_cuota_nula_cuenta_como_sin_cuota():
+    prediccion = {'btts': {'prediccion': 'Sí', 'recomendacion': {'moderada': 1}}}
+    cuotas = {'BTTS': None, 'BTTS_NO': 1.8}
+    assert apuestas_partido(1, 1, 1, cuotas, prediccion) == []
@@ -0,0 +1,54 @@
+"""FeatureStore: invalidación parcial y paridad con la extracción directa."""
+
+import numpy as np
+
+from services.ml_v2.benchmark_features import generar_partidos
+from services.ml_v2.feature_store import FeatureStore
+from services.ml_v2.features import FeatureExtractor, _parse_fecha
+
+
+def test_store_en_caliente_no_recalcula(tmp_path):
+    partidos = generar_partidos(3000, semilla=1)
+    extractor = FeatureExtractor(partidos)
+    ruta = str(tmp_path / 'store.npz')
+
+    X = FeatureStore(ruta).matriz(extractor, partidos)
+    store = FeatureStore(ruta)
+    assert np.array_equal(store.matriz(extractor, partidos), X)
+    assert store.ultimas_calculadas == 0
+
+
+def test_correccion_invalida_solo_lo_posterior(tmp_path):
+    partidos = generar_partidos(3000, semilla=1)
+    ruta = str(tmp_path / 'store.npz')
+    FeatureStore(ruta).matriz(FeatureExtractor(partidos), partidos)
+
+    ft = [p for p in partidos if p.estado == "FT"]
+    corregido = ft[len(ft) // 2]
+    corregido.goles_local += 2
+    extractor = FeatureExtractor(partidos)
+
+    store = FeatureStore(ruta)
+    X = store.matriz(extractor, partidos)
+    X_ref, _ = extractor.extraer_lote(partidos)
+    assert np.array_equal(X, X_ref)
+
+    # Solo se recalculan partidos de esos equipos posteriores a la corrección
+    equipos = {corregido.equipo_local.id, corregido.equipo_visitante.id}
+    fecha = _parse_fecha(corregido.fecha)
+    afectados = sum(1 for p in partidos
+                    if _parse_fecha(p.fecha) > fecha
+                    and {p.equipo_local.id, p.equipo_visitante.id} & equipos)
+    assert 0 < store.ultimas_calculadas <= afectados
+
+
+def test_cambio_de_version_descarta_el_store(tmp_path):
+    partidos = generar_partidos(1000, semilla=2)
+    extractor = FeatureExtractor(partidos)
+    ruta = str(tmp_path / 'store.npz')
+    FeatureStore(ruta).matriz(extractor, partidos)
+
+    store = FeatureStore(ruta, version=-1)
+    assert store.filas == {}
+    store.matriz(extractor, partidos)
+    assert store.ultimas_calculadas == len(partidos)
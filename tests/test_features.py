@@ -0,0 +1,77 @@
+"""FeatureExtractor incremental: mismos índices y features que una construcción completa."""
+
+import copy
+import os
+import random
+
+import numpy as np
+import pytest
+
+from services.ml_v2.benchmark_features import generar_partidos
+from services.ml_v2.features import FeatureExtractor
+
+
+def _indices(extractor):
+    """Índices comparables por ids (los objetos pueden ser copias)."""
+    por_equipo = {k: [(f, int(p.id_partido), ub) for f, p, ub in v]
+                  for k, v in extractor.por_equipo.items() if v}
+    h2h = {k: [(f, int(p.id_partido)) for f, p in v]
+           for k, v in extractor.h2h_index.items() if v}
+    ft = sorted(int(p.id_partido) for p in extractor.partidos_ft)
+    return por_equipo, h2h, extractor.firmas_ft, sorted(extractor._indexados), ft
+
+
+@pytest.fixture
+def historial():
+    """(ayer, hoy): hoy tiene nuevos FT, un marcador corregido, un partido borrado y uno aplazado."""
+    hoy = generar_partidos(4000, semilla=3, jornadas_pendientes=2)
+    ayer = copy.deepcopy(hoy)
+    rnd = random.Random(5)
+    for p in ayer:
+        if p.estado == "FT" and rnd.random() < 0.03:
+            p.estado = "NS"
+    ft = [p for p in hoy if p.estado == "FT"]
+    ft[10].goles_local += 1
+    ft[20].estado = "NS"
+    hoy.remove(ft[30])
+    return ayer, hoy
+
+
+def test_sincronizar_igual_que_construir(historial):
+    ayer, hoy = historial
+    extractor = FeatureExtractor(ayer)
+    assert extractor.sincronizar(hoy) > 0
+
+    referencia = FeatureExtractor(hoy)
+    assert _indices(extractor) == _indices(referencia)
+    X, _ = extractor.extraer_lote(hoy)
+    X_ref, _ = referencia.extraer_lote(hoy)
+    assert X.tobytes() == X_ref.tobytes()
+
+
+def test_desde_estado_igual_que_construir(historial, tmp_path):
+    ayer, hoy = historial
+    ruta = str(tmp_path / 'indices.pkl')
+    FeatureExtractor.desde_estado(ayer, ruta)
+
+    extractor = FeatureExtractor.desde_estado(hoy, ruta)
+    referencia = FeatureExtractor(hoy)
+    assert _indices(extractor) == _indices(referencia)
+    X, _ = extractor.extraer_lote(hoy)
+    X_ref, _ = referencia.extraer_lote(hoy)
+    assert np.array_equal(X, X_ref)
+
+    # El estado reescrito sirve tal cual en la siguiente carga
+    assert _indices(FeatureExtractor.desde_estado(hoy, ruta)) == _indices(referencia)
+    assert os.listdir(tmp_path) == ['indices.pkl']
+
+
+def test_desde_estado_solo_lectura(historial, tmp_path):
+    ayer, hoy = historial
+    ruta = str(tmp_path / 'indices.pkl')
+    FeatureExtractor.desde_estado(ayer, ruta)
+    antes = open(ruta, 'rb').read()
+
+    extractor = FeatureExtractor.desde_estado(hoy, ruta, guardar=False)
+    assert _indices(extractor) == _indices(FeatureExtractor(hoy))
+    assert open(ruta, 'rb').read() == antes
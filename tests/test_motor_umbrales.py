@@ -0,0 +1,117 @@
+"""Optimizador exacto de umbrales frente a una búsqueda por fuerza bruta."""
+
+import numpy as np
+import pytest
+
+from services.ml_v2 import motor_umbrales
+
+ESTRATEGIAS = {
+    'agresivo': ((0.40, 0.60), (-0.05, 0.05), 10),
+    'moderado': ((0.50, 0.70), (0.00, 0.10), 8),
+    'conservador': ((0.55, 0.80), (0.025, 0.10), 5),
+}
+
+
+def _apuestas(n, semilla):
+    rng = np.random.default_rng(semilla)
+    prob = rng.uniform(0.35, 0.85, n)
+    cuota = np.round(rng.uniform(1.2, 3.5, n), 2)
+    acierto = rng.random(n) < prob
+    return prob, cuota, acierto
+
+
+def _simular(prob, cuota, acierto, umbral, margen):
+    """Apuestas, aciertos y beneficio apostando 1 a cada apuesta que pasa el filtro."""
+    apuestas = aciertos = 0
+    beneficio = 0.0
+    for p, c, a in zip(prob, cuota, acierto):
+        if p >= umbral and p - 1.0 / c >= margen:
+            apuestas += 1
+            aciertos += int(a)
+            beneficio += c - 1.0 if a else -1.0
+    return apuestas, aciertos, beneficio
+
+
+def _rejilla(desde, hasta):
+    """Todos los valores con DECIMALES de [desde, hasta]."""
+    escala = 10 ** motor_umbrales.DECIMALES
+    return np.arange(round(desde * escala), round(hasta * escala) + 1) / escala
+
+
+def _fuerza_bruta(prob, cuota, acierto, ventana_u, ventana_m, min_apuestas):
+    """Mejor ROI entre todos los umbrales y márgenes con DECIMALES de la ventana, celda a celda."""
+    value = prob - 1.0 / cuota
+    ganancia = np.where(acierto, cuota - 1.0, -1.0)
+    mejor = None
+    for u in _rejilla(*ventana_u):
+        for m in _rejilla(*ventana_m):
+            entra = (prob >= u) & (value >= m)
+            apuestas = int(entra.sum())
+            if apuestas >= min_apuestas:
+                roi = ganancia[entra].sum() / apuestas * 100
+                if mejor is None or roi > mejor[0] + 1e-9:
+                    mejor = (roi, u, m)
+    return mejor
+
+
+@pytest.mark.parametrize('semilla', [0, 1, 2])
+def test_optimo_igual_que_fuerza_bruta(semilla):
+    prob, cuota, acierto = _apuestas(150, semilla)
+    optimos = motor_umbrales.optimizar_estrategias(prob, cuota, acierto, ESTRATEGIAS)
+
+    for nombre, (ventana_u, ventana_m, min_apuestas) in ESTRATEGIAS.items():
+        referencia = _fuerza_bruta(prob, cuota, acierto, ventana_u, ventana_m, min_apuestas)
+        r = optimos[nombre]
+        if referencia is None:
+            assert r['umbral_prob'] is None
+            continue
+        # Varios cortes pueden dar las mismas apuestas: se compara el ROI
+        assert r['roi'] == pytest.approx(round(referencia[0], 2))
+        assert ventana_u[0] <= r['umbral_prob'] <= ventana_u[1]
+        assert ventana_m[0] <= r['margen'] <= ventana_m[1]
+        assert r['umbral_prob'] == round(r['umbral_prob'], motor_umbrales.DECIMALES)
+        assert r['margen'] == round(r['margen'], motor_umbrales.DECIMALES)
+        apuestas, aciertos, beneficio = _simular(prob, cuota, acierto, r['umbral_prob'], r['margen'])
+        assert (r['apuestas'], r['aciertos']) == (apuestas, aciertos)
+        assert r['beneficio'] == pytest.approx(round(beneficio, 2))
+
+
+def test_ninguna_rejilla_fija_mejora_el_optimo():
+    prob, cuota, acierto = _apuestas(300, 7)
+    ventana_u, ventana_m, min_apuestas = ESTRATEGIAS['moderado']
+    r = motor_umbrales.optimizar_estrategias(prob, cuota, acierto,
+                                             {'moderado': ESTRATEGIAS['moderado']})['moderado']
+    for u in np.linspace(*ventana_u, 41).round(3):
+        for m in np.linspace(*ventana_m, 41).round(3):
+            apuestas, _, beneficio = _simular(prob, cuota, acierto, u, m)
+            if apuestas >= min_apuestas:
+                assert beneficio / apuestas * 100 <= r['roi'] + 0.01
+
+
+def test_redondear_arriba_da_el_menor_corte():
+    prob, cuota, _ = _apuestas(500, 5)
+    value = prob - 1.0 / cuota
+    r = motor_umbrales.redondear_arriba(value)
+    assert np.array_equal(r, np.round(r, motor_umbrales.DECIMALES))
+    # El menor número con DECIMALES que deja dentro cada value
+    paso = 10.0 ** -motor_umbrales.DECIMALES
+    assert (r >= value).all()
+    assert (np.round(r - paso, motor_umbrales.DECIMALES) < value).all()
+
+
+def test_pesos_igual_que_remuestrear():
+    prob, cuota, acierto = _apuestas(120, 3)
+    umbrales = np.array([0.4, 0.5, 0.6])
+    margenes = np.array([-0.05, 0.0, 0.05])
+    pesos = motor_umbrales.pesos_bootstrap(len(prob), n_muestras=5, semilla=1)
+    t = motor_umbrales.evaluar_cortes(prob, cuota, acierto, umbrales, margenes, pesos)
+
+    for b in range(len(pesos)):
+        muestra = np.repeat(np.arange(len(prob)), pesos[b])
+        for i, u in enumerate(umbrales):
+            for j, m in enumerate(margenes):
+                apuestas, aciertos, beneficio = _simular(prob[muestra], cuota[muestra],
+                                                         acierto[muestra], u, m)
+                assert t['apuestas'][b, i, j] == apuestas
+                assert t['aciertos'][b, i, j] == aciertos
+                assert t['beneficio'][b, i, j] == pytest.approx(beneficio)
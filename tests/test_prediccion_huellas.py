@@ -0,0 +1,93 @@
+"""predecir_lista_partidos: solo se recalculan (y envían a SQL) los partidos cuya entrada cambió."""
+
+import numpy as np
+import pytest
+
+from services.ml_v2 import entrenar
+from services.ml_v2.benchmark_features import generar_partidos
+from services.ml_v2.feature_store import FeatureStore
+from services.ml_v2.features import FeatureExtractor
+
+OPTIMOS = {s: {m: {'umbral_prob': 0.4, 'margen': 0.0} for m in ('resultado', 'btts', 'over')}
+           for s in ('conservador', 'moderado', 'agresivo')}
+
+
+class _Modelo:
+    """Modelo de prueba determinista que cuenta las filas que predice."""
+
+    def __init__(self, n_clases):
+        self.n_clases = n_clases
+        self.filas = 0
+
+    def _z(self, X):
+        self.filas += len(X)
+        return np.tanh(X[:, :self.n_clases].astype(np.float64))
+
+    def predict(self, X):
+        return 1.0 + self._z(X)[:, 0]
+
+    def predict_proba(self, X):
+        e = np.exp(self._z(X))
+        return e / e.sum(axis=1, keepdims=True)
+
+
+@pytest.fixture
+def entorno(tmp_path, monkeypatch):
+    todos = generar_partidos(2000, semilla=4, jornadas_pendientes=2)
+    pendientes = [p for p in todos if p.estado != "FT"]
+    modelos = {'modelo_goles_local': _Modelo(1), 'modelo_goles_visitante': _Modelo(1),
+               'modelo_btts': _Modelo(2), 'modelo_over25': _Modelo(2),
+               'modelo_resultado': _Modelo(3)}
+    sql = {'enviados': [], 'ok': True}
+
+    def guardar(partidos, cambiados=None):
+        sql['enviados'].append([int(p.id_partido) for p in cambiados])
+        return sql['ok']
+
+    monkeypatch.setattr(entrenar, 'cargar_partidos', lambda: todos)
+    monkeypatch.setattr(entrenar, 'cargar_extractor', lambda t: FeatureExtractor(t))
+    monkeypatch.setattr(entrenar, 'FeatureStore', lambda: FeatureStore(str(tmp_path / 'store.npz')))
+    monkeypatch.setattr(entrenar, 'directorio_modelos', lambda: None)
+    monkeypatch.setattr(entrenar, 'cargar_modelo', lambda nombre, directorio=None: modelos[nombre])
+    monkeypatch.setattr(entrenar.registro, 'version_actual', lambda: 'v1')
+    monkeypatch.setattr(entrenar, 'RUTA_HUELLAS_PREDICCION', str(tmp_path / 'huellas.json'))
+    monkeypatch.setattr(entrenar, 'guardar_partidos_predecidos', guardar)
+    return pendientes, modelos, sql
+
+
+def test_sin_cambios_no_se_recalcula(entorno):
+    partidos, modelos, sql = entorno
+    assert entrenar.predecir_lista_partidos(partidos, OPTIMOS) == len(partidos)
+    antes = [p.prediccion for p in partidos]
+    filas = modelos['modelo_resultado'].filas
+
+    for p in partidos:
+        p.prediccion = None
+    assert entrenar.predecir_lista_partidos(partidos, OPTIMOS) == 0
+    assert [p.prediccion for p in partidos] == antes
+    assert modelos['modelo_resultado'].filas == filas
+    assert sql['enviados'][-1] == []
+
+    # Cambia una cuota: solo ese partido se recalcula y va a SQL
+    partidos[3].cuota_local += 0.5
+    assert entrenar.predecir_lista_partidos(partidos, OPTIMOS) == 1
+    assert sql['enviados'][-1] == [int(partidos[3].id_partido)]
+
+    # Umbrales distintos: todo se recalcula
+    otros = {s: {m: dict(v, margen=0.05) for m, v in d.items()} for s, d in OPTIMOS.items()}
+    assert entrenar.predecir_lista_partidos(partidos, otros) == len(partidos)
+
+
+def test_fallo_sql_no_marca_como_al_dia(entorno):
+    partidos, _, sql = entorno
+    entrenar.predecir_lista_partidos(partidos, OPTIMOS)
+
+    partidos[0].cuota_over += 0.3
+    sql['ok'] = False
+    assert entrenar.predecir_lista_partidos(partidos, OPTIMOS) == 1
+
+    # La escritura falló: el partido se vuelve a enviar en la siguiente pasada
+    sql['ok'] = True
+    assert entrenar.predecir_lista_partidos(partidos, OPTIMOS) == 1
+    assert sql['enviados'][-1] == [int(partidos[0].id_partido)]
+    assert entrenar.predecir_lista_partidos(partidos, OPTIMOS) == 0